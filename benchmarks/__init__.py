@@ -0,0 +1 @@
+"""бенчмарки горячих методов хранилища на сгенерированных базах (см. __main__.py)"""
@@ -0,0 +1,141 @@
+"""бенчмарк горячих методов хранилища: задержки p50/p90/p99 и пропускная способность
+
+Запуск: python -m benchmarks [--size 10k|1m|10m] [--calls 1000] [--concurrency 1,16] [--scenarios get_user,...]
+База нужного размера генерируется через database/fill_random.py в benchmarks/data и переиспользуется
+(10m - около 10 минут один раз). Хранилище берется из настроек, как у бота: STORAGE_BACKEND=memory,
+DB_SHARDS, DB_POOL_SIZE, DB_WRITE_BATCHING и другие переменные окружения учитываются; DB_PATH
+задается бенчмарком. Результаты пишутся в JSON (--output) вместе с настройками, описанием базы
+и, при DB_QUERY_STATS=1, самыми затратными запросами sqlite (queries, см. database/query_stats.py);
+два результата сравнивает python -m benchmarks.compare.
+
+Групповая фиксация сравнивается двумя запусками с DB_WRITE_BATCHING=0 и 1 при большой конкуренции
+(например, --scenarios add_transaction --concurrency 1,200) и python -m benchmarks.compare.
+add_transaction добавляет транзакции к сгенерированной базе: от запуска к запуску она немного растет.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from benchmarks.dataset import DATA_DIR, SIZES, dataset_path, discard_incomplete, prepare_dataset
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def _storage_settings() -> Dict[str, Any]:
+    """Настройки хранилища, от которых зависят результаты."""
+    from database import config
+
+    return {
+        "backend": config.STORAGE_BACKEND,
+        "shards": config.DB_SHARDS,
+        "pool_size": config.DB_POOL_SIZE,
+        "write_batching": config.DB_WRITE_BATCHING,
+        "user_cache_size": config.USER_CACHE_SIZE,
+        "archive_after_days": config.DB_ARCHIVE_AFTER_DAYS,
+        "pragmas": config.DB_PRAGMAS,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Хранилище читает настройки при импорте, поэтому импортируется после выбора DB_PATH
+    from benchmarks.runner import run_scenario
+    from benchmarks.scenarios import SCENARIOS, Context
+    from database import config, storage
+    from database.query_stats import query_stats
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        names = args.scenarios.split(",")
+        unknown = set(names) - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            raise SystemExit(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+
+    await storage.open_storage()
+    try:
+        info = await prepare_dataset(args.size, args.seed, config.STORAGE_BACKEND, config.DB_PATH, config.DB_SHARDS)
+        ctx = await Context.load(info)
+        # Замеры запросов - только за сценарии, без генерации базы
+        query_stats.reset()
+        results: List[Dict[str, Any]] = []
+        for concurrency in args.concurrency:
+            for scenario in scenarios:
+                calls = max(int(args.calls * scenario.share), 1)
+                result = await run_scenario(scenario, ctx, calls, concurrency, args.seed)
+                results.append({"scenario": scenario.name, "concurrency": concurrency, **result})
+                latency = result["latency_ms"]
+                print(f"{scenario.name:<30} x{concurrency:<4} p50 {latency['p50']:>9.3f} мс  "
+                      f"p99 {latency['p99']:>9.3f} мс  {result['throughput']:>9.1f} вызовов/с"
+                      + (f"  ошибок: {result['errors']}" if result["errors"] else ""))
+    finally:
+        await storage.close_storage()
+
+    return {
+        "started_at": args.started_at,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cpu_count": os.cpu_count(),
+        "storage": _storage_settings(),
+        "dataset": info,
+        "calls": args.calls,
+        "seed": args.seed,
+        "results": results,
+        "queries": query_stats.summary(20),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих методов хранилища")
+    parser.add_argument("--size", choices=list(SIZES), default="10k", help="размер сгенерированной базы")
+    parser.add_argument("--calls", type=int, default=1000, help="вызовов каждого сценария")
+    parser.add_argument("--concurrency", type=lambda value: [int(level) for level in value.split(",")],
+                        default=[1, 16], help="одновременных вызовов, через запятую для нескольких прогонов")
+    parser.add_argument("--scenarios", help="только эти сценарии, через запятую")
+    parser.add_argument("--seed", type=int, default=42, help="зерно генерации базы и аргументов вызовов")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="каталог сгенерированных баз")
+    parser.add_argument("--output", help="файл результатов JSON (по умолчанию benchmarks/results/...)")
+    args = parser.parse_args()
+    args.started_at = datetime.now().isoformat(timespec="seconds")
+
+    logging.basicConfig(level=logging.WARNING)
+    # Настройки из .env нужны до импорта хранилища, чтобы выбрать файл базы под DB_SHARDS
+    load_dotenv()
+    shards = int(os.getenv("DB_SHARDS", "1"))
+    if os.getenv("STORAGE_BACKEND", "sqlite") == "sqlite":
+        os.makedirs(args.data_dir, exist_ok=True)
+        os.environ["DB_PATH"] = dataset_path(args.size, args.seed, shards, args.data_dir)
+        discard_incomplete(os.environ["DB_PATH"], shards)
+
+    started = time.monotonic()
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{args.size}-{report['storage']['backend']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты: {output} ({time.monotonic() - started:.0f} с)")
+
+
+if __name__ == "__main__":
+    main()
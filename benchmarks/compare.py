@@ -0,0 +1,59 @@
+"""сравнение двух результатов бенчмарка
+
+Запуск: python -m benchmarks.compare старый.json новый.json
+Печатает p50, p99 и пропускную способность каждого сценария и изменение в процентах.
+Предупреждает, если результаты сняты на разных базах или с разными настройками хранилища.
+"""
+
+import argparse
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "    -"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Печать таблицы сравнения; сценарии сопоставляются по имени и числу одновременных вызовов."""
+    for key in ("dataset", "storage"):
+        if old.get(key) != new.get(key):
+            print(f"Внимание: различается {key}: {old.get(key)} -> {new.get(key)}")
+    print(f"{old.get('git_commit')} ({old.get('started_at')}) -> {new.get('git_commit')} ({new.get('started_at')})\n")
+
+    previous: Dict[Tuple[str, int], Dict[str, Any]] = {
+        (item["scenario"], item["concurrency"]): item for item in old["results"]
+    }
+    print(f"{'сценарий':<30} {'conc':>4} {'p50, мс':>21} {'p99, мс':>21} {'вызовов/с':>23}")
+    for item in new["results"]:
+        before: Optional[Dict[str, Any]] = previous.get((item["scenario"], item["concurrency"]))
+        if before is None:
+            print(f"{item['scenario']:<30} {item['concurrency']:>4}  нет в старом результате")
+            continue
+        cells = []
+        for old_value, new_value in (
+            (before["latency_ms"]["p50"], item["latency_ms"]["p50"]),
+            (before["latency_ms"]["p99"], item["latency_ms"]["p99"]),
+            (before["throughput"], item["throughput"]),
+        ):
+            cells.append(f"{new_value:>12.3f} {_change(old_value, new_value)}")
+        print(f"{item['scenario']:<30} {item['concurrency']:>4} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение двух результатов бенчмарка")
+    parser.add_argument("old", help="результат до изменения")
+    parser.add_argument("new", help="результат после изменения")
+    args = parser.parse_args()
+    compare(_load(args.old), _load(args.new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""сгенерированные базы для бенчмарков: размеры, пути к файлам и их подготовка"""
+
+import json
+import os
+import time
+from datetime import date
+from typing import Any, Dict, NamedTuple, Optional
+
+
+class DatasetSize(NamedTuple):
+    """Форма базы: users пользователей по transactions транзакций за months месяцев."""
+    users: int
+    transactions: int
+    months: int = 24
+
+
+SIZES: Dict[str, DatasetSize] = {
+    "10k": DatasetSize(users=10, transactions=1000),
+    "1m": DatasetSize(users=1000, transactions=1000),
+    "10m": DatasetSize(users=5000, transactions=2000),
+}
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+FIRST_ID = 1
+
+
+def dataset_path(size: str, seed: int, shards: int, data_dir: str = DATA_DIR, end: Optional[date] = None) -> str:
+    """
+    путь к базе (DB_PATH) для размера, зерна и числа шардов.
+
+    в имени есть месяц генерации: лимиты создаются на текущий месяц, и с его сменой
+    база генерируется заново, иначе get_violated_limits и check_limit_violation не нашли бы лимитов.
+    """
+    month = (end or date.today()).strftime("%Y-%m")
+    suffix = f"-{shards}shards" if shards > 1 else ""
+    return os.path.join(data_dir, f"{size}-seed{seed}-{month}{suffix}.db")
+
+
+def _info_path(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + ".json"
+
+
+def _remove_files(db_path: str, shards: int) -> None:
+    """Удаление файлов недогенерированной базы: шардов, их архивов и журналов WAL."""
+    from database.archive import archive_path
+    from database.shards import shard_paths
+
+    for path in shard_paths(db_path, shards):
+        for name in (path, archive_path(path)):
+            for file in (name, name + "-wal", name + "-shm"):
+                if os.path.exists(file):
+                    os.remove(file)
+
+
+async def prepare_dataset(size: str, seed: int, backend: str, db_path: Optional[str], shards: int) -> Dict[str, Any]:
+    """
+    подготовка базы для бенчмарка в хранилище, уже открытом open_storage.
+
+    база sqlite генерируется один раз и переиспользуется: готовность отмечает файл с описанием
+    рядом с базой, он пишется после успешной генерации. данные в памяти генерируются при каждом запуске.
+    файлы базы должны быть удалены до open_storage, см. discard_incomplete.
+
+    возвращает:
+        Dict[str, Any]: Описание базы: размер, зерно, число пользователей и транзакций, дата генерации.
+    """
+    from database.fill_random import fill
+
+    shape = SIZES[size]
+    if backend == "sqlite" and os.path.exists(_info_path(db_path)):
+        with open(_info_path(db_path), encoding="utf-8") as file:
+            return json.load(file)
+
+    print(f"Генерация базы {size}: {shape.users} пользователей по {shape.transactions} транзакций...")
+    started = time.monotonic()
+    stats = await fill(shape.users, shape.transactions, shape.months, seed, FIRST_ID)
+    info = {
+        "size": size,
+        "seed": seed,
+        "first_id": FIRST_ID,
+        "users": stats["users"],
+        "transactions": stats["transactions"],
+        "limits": stats["limits"],
+        "months": shape.months,
+        "generated_on": date.today().isoformat(),
+        "generation_seconds": round(time.monotonic() - started, 1),
+    }
+    if backend == "sqlite":
+        with open(_info_path(db_path), "w", encoding="utf-8") as file:
+            json.dump(info, file, ensure_ascii=False, indent=2)
+    return info
+
+
+def discard_incomplete(db_path: str, shards: int) -> None:
+    """Удаление файлов базы, генерация которой не завершилась (нет файла с описанием)."""
+    if not os.path.exists(_info_path(db_path)):
+        _remove_files(db_path, shards)
@@ -0,0 +1,69 @@
+"""замер задержек и пропускной способности сценария при одновременных вызовах из задач asyncio"""
+
+import asyncio
+import itertools
+import math
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.scenarios import Context, Scenario
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0-100) по ближайшему рангу; values отсортированы по возрастанию."""
+    if not values:
+        return 0.0
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+async def run_scenario(scenario: Scenario, ctx: Context, calls: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    """
+    выполнение calls вызовов сценария из concurrency одновременных задач.
+
+    перед замером выполняется прогрев (5% вызовов, не меньше одного) по одному вызову за раз:
+    кэши sqlite и пользователей заполняются одинаково при каждом запуске. у каждой задачи свой
+    генератор случайных чисел от seed, поэтому аргументы вызовов совпадают между запусками.
+
+    возвращает:
+        Dict[str, Any]: Количество вызовов и ошибок, вызовов в секунду (throughput)
+        и задержки в миллисекундах: p50, p90, p99, max, mean.
+    """
+    warmup = random.Random(seed)
+    for _ in range(max(calls // 20, 1)):
+        await scenario.call(ctx, warmup)
+
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(index: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        while next(counter) < calls:
+            started = time.perf_counter()
+            try:
+                await scenario.call(ctx, rng)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 3),
+            "p90": round(percentile(ms, 90), 3),
+            "p99": round(percentile(ms, 99), 3),
+            "max": round(ms[-1], 3) if ms else 0.0,
+            "mean": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        },
+    }
@@ -0,0 +1,126 @@
+"""сценарии бенчмарка: по одному вызову метода хранилища с правдоподобными аргументами"""
+
+import random
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple
+
+from database import storage
+from benchmarks.dataset import SIZES
+
+
+class Context:
+    """Пользователи базы и их категории, из которых сценарии выбирают аргументы."""
+
+    def __init__(self, info: Dict[str, Any], categories: Dict[int, List[str]]) -> None:
+        self.users = sorted(categories)
+        self.categories = categories
+        self.today = date.today()
+        # Первые числа месяцев, за которые сгенерированы транзакции
+        index = self.today.year * 12 + self.today.month - 1
+        self.months = [date((index - i) // 12, (index - i) % 12 + 1, 1) for i in range(SIZES[info["size"]].months)]
+
+    @classmethod
+    async def load(cls, info: Dict[str, Any]) -> "Context":
+        first = info["first_id"]
+        categories = {tg_id: await storage.get_categories(tg_id) for tg_id in range(first, first + info["users"])}
+        return cls(info, categories)
+
+    def user(self, rng: random.Random) -> int:
+        return rng.choice(self.users)
+
+    def category(self, rng: random.Random, tg_id: int) -> str:
+        return rng.choice(self.categories[tg_id])
+
+    def month(self, rng: random.Random) -> tuple:
+        """Случайный месяц данных: (первое число, первое число следующего) в формате ISO, как в отчете."""
+        start = rng.choice(self.months)
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return start.isoformat(), end.isoformat()
+
+
+class Scenario(NamedTuple):
+    """Сценарий: call(context, rng) выполняет один замеряемый вызов."""
+    name: str
+    call: Callable[[Context, random.Random], Awaitable[Any]]
+    share: float = 1.0  # Доля от --calls: запросы по всем пользователям выполняются реже
+    writes: bool = False  # Меняет базу (транзакции добавляются к сгенерированным)
+
+
+async def _get_user(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_user(ctx.user(rng))
+
+
+async def _add_transaction(ctx: Context, rng: random.Random) -> Any:
+    tg_id = ctx.user(rng)
+    return await storage.add_transaction(
+        tg_id, 1, round(rng.lognormvariate(6.5, 0.8), 2), ctx.category(rng, tg_id), "benchmark"
+    )
+
+
+async def _get_transactions(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_transactions(ctx.user(rng), 10)
+
+
+async def _get_transactions_by_period(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_transactions_by_period(ctx.user(rng), *ctx.month(rng))
+
+
+async def _get_transactions_by_category(ctx: Context, rng: random.Random) -> Any:
+    # Как в обработчике: первая страница и листание на две страницы вперед
+    tg_id = ctx.user(rng)
+    category = ctx.category(rng, tg_id)
+    page = await storage.get_transactions_by_category(tg_id, category, 5)
+    for _ in range(2):
+        if not page:
+            break
+        page = await storage.get_transactions_by_category(tg_id, category, 5, after_id=page[-1].transaction_id)
+    return page
+
+
+async def _iter_transactions(ctx: Context, rng: random.Random) -> Any:
+    # Вся история пользователя порциями, как при экспорте: выборка и создание записей Transaction
+    rows = 0
+    async for chunk in storage.iter_transactions(ctx.user(rng)):
+        rows += len(chunk)
+    return rows
+
+
+async def _get_period_totals(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_period_totals(ctx.user(rng), *ctx.month(rng))
+
+
+async def _get_balance(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_balance(ctx.user(rng), ctx.month(rng)[1])
+
+
+async def _check_limit_violation(ctx: Context, rng: random.Random) -> Any:
+    tg_id = ctx.user(rng)
+    return await storage.check_limit_violation(tg_id, ctx.category(rng, tg_id), round(rng.uniform(100, 5000), 2))
+
+
+async def _get_user_limits(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_user_limits(ctx.user(rng))
+
+
+async def _get_violated_limits(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_violated_limits()
+
+
+async def _get_expiring_limits(ctx: Context, rng: random.Random) -> Any:
+    return await storage.get_expiring_limits()
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("get_user", _get_user),
+    Scenario("add_transaction", _add_transaction, writes=True),
+    Scenario("get_transactions", _get_transactions),
+    Scenario("get_transactions_by_period", _get_transactions_by_period),
+    Scenario("get_transactions_by_category", _get_transactions_by_category),
+    Scenario("iter_transactions", _iter_transactions, share=0.1),
+    Scenario("get_period_totals", _get_period_totals),
+    Scenario("get_balance", _get_balance),
+    Scenario("check_limit_violation", _check_limit_violation),
+    Scenario("get_user_limits", _get_user_limits),
+    Scenario("get_violated_limits", _get_violated_limits, share=0.05),
+    Scenario("get_expiring_limits", _get_expiring_limits, share=0.05),
+]
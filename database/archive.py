@@ -0,0 +1,312 @@
+"""холодное хранение: перенос старых транзакций из основной базы в подключенную архивную базу
+
+Запуск: python -m database.archive [--days N] [--chunk-size N]
+Переносит транзакции старше DB_ARCHIVE_AFTER_DAYS дней (или --days) во всех шардах.
+Бот делает то же раз в сутки, если DB_ARCHIVE_AFTER_DAYS больше нуля.
+
+Архив каждого файла базы лежит рядом с ним (data.db -> data.archive.db) и подключается
+к каждому соединению как схема archive. Дневные итоги daily_rollup, баланс, счетчики категорий
+и spent лимитов при переносе не меняются: отчеты по итогам не обращаются к архиву вовсе,
+а выборки самих транзакций добавляют архив через UNION ALL, только если период заходит
+дальше границы archive_info.archived_before.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date, timedelta
+from typing import Optional
+
+import aiosqlite
+
+from database.config import DB_PATH, DB_SHARDS, DB_PRAGMAS, DB_ARCHIVE_AFTER_DAYS
+from database.pool import ConnectionPool
+from database.units import to_epoch, from_epoch
+
+logger = logging.getLogger(__name__)
+
+# Перенос порциями: строк в одной транзакции и пауза между порциями, сек,
+# чтобы записи бота успевали получить пишущее соединение
+ARCHIVE_CHUNK_SIZE = 5000
+ARCHIVE_CHUNK_PAUSE = 0.05
+
+ARCHIVE_COLUMNS = "transaction_id, tg_id, date_time, type, description, category_id, sum"
+
+# Граница архива в основной базе (шаг 5 в migrations.py). Транзакции старше archived_before
+# перенесены в архив; в основной таблице их может быть немного (импорт задним числом после
+# переноса) - их заберет следующий перенос. Строки архива с date_time >= archived_before -
+# копии, которые еще не удалены из основной таблицы (перенос прервался), читать их нельзя.
+# Триггеры удаления транзакций пересоздаются с проверкой bulk_load, как и триггеры вставки:
+# перенос удаляет строки при включенном признаке и оставляет итоги как есть.
+ARCHIVE_INFO_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_info (
+    archived_before INTEGER NOT NULL  -- секунды от эпохи
+);
+
+DROP TRIGGER IF EXISTS update_total_sum_after_delete;
+CREATE TRIGGER update_total_sum_after_delete
+AFTER DELETE ON transactions
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE users
+    SET total_sum = total_sum -
+        CASE OLD.type
+            WHEN 0 THEN OLD.sum
+            WHEN 1 THEN -OLD.sum
+        END
+    WHERE tg_id = OLD.tg_id;
+END;
+
+DROP TRIGGER IF EXISTS category_count_after_delete;
+CREATE TRIGGER category_count_after_delete
+AFTER DELETE ON transactions
+WHEN OLD.category_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE categories
+    SET transaction_count = transaction_count - 1
+    WHERE category_id = OLD.category_id;
+END;
+
+DROP TRIGGER IF EXISTS daily_rollup_after_delete;
+CREATE TRIGGER daily_rollup_after_delete
+AFTER DELETE ON transactions
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE daily_rollup
+    SET total = total - OLD.sum,
+        count = count - 1
+    WHERE tg_id = OLD.tg_id
+    AND day = OLD.day
+    AND category_id = COALESCE(OLD.category_id, 0)
+    AND type = OLD.type;
+
+    DELETE FROM daily_rollup
+    WHERE tg_id = OLD.tg_id
+    AND day = OLD.day
+    AND category_id = COALESCE(OLD.category_id, 0)
+    AND type = OLD.type
+    AND count <= 0;
+END;
+
+DROP TRIGGER IF EXISTS limit_spent_after_delete;
+CREATE TRIGGER limit_spent_after_delete
+AFTER DELETE ON transactions
+WHEN OLD.type = 1 AND OLD.category_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE limits
+    SET spent = spent - OLD.sum
+    WHERE category_id = OLD.category_id
+    AND start_date <= OLD.day
+    AND end_date >= OLD.day;
+END;
+"""
+
+# Таблица архива: те же колонки без внешних ключей (категории остаются в основной базе)
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive.transactions (
+    transaction_id INTEGER PRIMARY KEY,
+    tg_id INTEGER NOT NULL,
+    date_time INTEGER NOT NULL,  -- секунды от эпохи
+    type INTEGER NOT NULL,
+    description TEXT,
+    category_id INTEGER,
+    sum INTEGER NOT NULL  -- копейки
+);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_tg_id ON transactions(tg_id, date_time);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_category ON transactions(category_id, date_time);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_date_time ON transactions(date_time);
+"""
+
+# Все транзакции соединения: основная таблица и архив (для пересчета итогов по сырым данным)
+ALL_TRANSACTIONS_VIEW = f"""
+CREATE TEMP VIEW IF NOT EXISTS all_transactions AS
+SELECT {ARCHIVE_COLUMNS}, day FROM main.transactions
+UNION ALL
+SELECT {ARCHIVE_COLUMNS}, date(date_time, 'unixepoch') AS day FROM archive.transactions
+WHERE date_time < (SELECT archived_before FROM main.archive_info);
+"""
+
+
+def archive_path(db_path: str) -> str:
+    """Путь к архиву файла базы: database/data.db -> database/data.archive.db."""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.archive{ext or '.db'}"
+
+
+def archive_boundary(days: int, today: Optional[date] = None) -> int:
+    """
+    граница переноса: начало месяца, в который попадает дата days дней назад.
+
+    граница по целым месяцам, чтобы месячные отчеты читали либо только основную таблицу,
+    либо архив целиком за месяц.
+    """
+    day = (today or date.today()) - timedelta(days=days)
+    return to_epoch(day.replace(day=1).isoformat())
+
+
+async def prepare_archive(db: aiosqlite.Connection, enabled: bool) -> None:
+    """
+    создание таблиц архива в подключенной схеме archive или проверка, что архива нет.
+
+    исключения:
+        RuntimeError: если архивирование выключено, а часть транзакций уже перенесена в архив.
+    """
+    if enabled:
+        await db.executescript(ARCHIVE_SCHEMA)
+        return
+    cursor = await db.execute("SELECT archived_before FROM archive_info")
+    row = await cursor.fetchone()
+    if row is not None:
+        raise RuntimeError(
+            f"транзакции до {from_epoch(row[0])} перенесены в архив, а DB_ARCHIVE_AFTER_DAYS=0: "
+            f"без архива они пропадут из выборок"
+        )
+
+
+async def attach_archive(db: aiosqlite.Connection, db_path: str) -> str:
+    """
+    подключение архива файла базы к отдельному соединению (скрипты обслуживания).
+
+    возвращает:
+        str: Источник всех транзакций для запросов: all_transactions, если архив есть, иначе transactions.
+    """
+    path = archive_path(db_path)
+    if not os.path.exists(path):
+        return "transactions"
+    await db.execute("ATTACH DATABASE ? AS archive", (path,))
+    await db.executescript(ARCHIVE_SCHEMA + ALL_TRANSACTIONS_VIEW)
+    return "all_transactions"
+
+
+async def archived_before(db: aiosqlite.Connection) -> Optional[int]:
+    """
+    граница архива в секундах или None, если ничего не переносилось.
+
+    начинает транзакцию чтения: выборки после этого вызова видят основную базу на момент
+    чтения границы, а архив - не раньше, поэтому строка, перенесенная до этой границы,
+    видна ровно в одном из источников. соединение пула откатывает транзакцию при возврате.
+    """
+    await db.execute("BEGIN")
+    cursor = await db.execute("SELECT archived_before FROM archive_info")
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def archive_chunk(db: aiosqlite.Connection, before: int, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> int:
+    """
+    перенос очередной порции самых старых транзакций с date_time < before.
+
+    строки сначала копируются в архив отдельной транзакцией и только потом удаляются из
+    основной базы вместе с подъемом границы: в режиме WAL транзакция по двум файлам
+    атомарна для каждого файла, но не для обоих вместе, поэтому сбой между шагами оставляет
+    копию (ее скрывает граница), а не теряет строки. удаляются только строки, уже лежащие в архиве.
+
+    аргументы:
+        db (aiosqlite.Connection): Пишущее соединение с подключенным архивом.
+        before (int): Граница переноса в секундах от эпохи.
+        chunk_size (int): Примерное количество строк в порции.
+
+    возвращает:
+        int: Количество перенесенных строк; 0 - переносить больше нечего.
+    """
+    cursor = await db.execute(
+        "SELECT MIN(date_time) FROM main.transactions WHERE date_time < ?", (before,)
+    )
+    first = (await cursor.fetchone())[0]
+    if first is None:
+        return 0
+    # Граница порции - время (chunk_size + 1)-й строки, чтобы все строки с одним временем
+    # попадали в одну порцию
+    cursor = await db.execute(
+        "SELECT date_time FROM main.transactions WHERE date_time < ? ORDER BY date_time LIMIT 1 OFFSET ?",
+        (before, chunk_size)
+    )
+    row = await cursor.fetchone()
+    bound = row[0] if row else before
+    if bound <= first:
+        bound = first + 1
+
+    await db.execute("BEGIN IMMEDIATE")
+    await db.execute(
+        f"""
+        INSERT OR REPLACE INTO archive.transactions ({ARCHIVE_COLUMNS})
+        SELECT {ARCHIVE_COLUMNS} FROM main.transactions WHERE date_time < ?
+        """,
+        (bound,)
+    )
+    await db.commit()
+
+    await db.execute("BEGIN IMMEDIATE")
+    await db.execute("INSERT INTO bulk_load (tg_id) VALUES (0)")
+    cursor = await db.execute(
+        """
+        DELETE FROM main.transactions
+        WHERE date_time < ?
+        AND transaction_id IN (SELECT transaction_id FROM archive.transactions WHERE date_time < ?)
+        """,
+        (bound, bound)
+    )
+    moved = cursor.rowcount
+    cursor = await db.execute("SELECT archived_before FROM archive_info")
+    row = await cursor.fetchone()
+    if row is None:
+        await db.execute("INSERT INTO archive_info (archived_before) VALUES (?)", (bound,))
+    elif row[0] < bound:
+        await db.execute("UPDATE archive_info SET archived_before = ?", (bound,))
+    await db.execute("DELETE FROM bulk_load")
+    await db.commit()
+    return moved
+
+
+async def archive_shard(pool: ConnectionPool, before: int, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> int:
+    """
+    перенос всех транзакций с date_time < before порциями; между порциями соединение возвращается в пул.
+
+    аргументы:
+        pool (ConnectionPool): Пул пишущего соединения файла базы с подключенным архивом.
+        before (int): Граница переноса в секундах от эпохи.
+        chunk_size (int): Примерное количество строк в порции.
+
+    возвращает:
+        int: Количество перенесенных строк.
+    """
+    moved = 0
+    while True:
+        async with pool.acquire() as db:
+            count = await archive_chunk(db, before, chunk_size)
+        if not count:
+            return moved
+        moved += count
+        await asyncio.sleep(ARCHIVE_CHUNK_PAUSE)
+
+
+async def main():
+    # Импорт здесь: migrations сам импортирует схему архива из этого модуля
+    from database.migrations import apply_migrations
+    from database.shards import shard_paths
+
+    parser = argparse.ArgumentParser(description="Перенос старых транзакций в архивную базу")
+    parser.add_argument("--days", type=int, default=DB_ARCHIVE_AFTER_DAYS,
+                        help="переносить транзакции старше стольких дней (до начала месяца)")
+    parser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE)
+    args = parser.parse_args()
+    if args.days <= 0:
+        parser.error("укажите --days или DB_ARCHIVE_AFTER_DAYS больше нуля")
+
+    logging.basicConfig(level=logging.INFO)
+    before = archive_boundary(args.days)
+    for path in shard_paths(DB_PATH, DB_SHARDS):
+        pool = ConnectionPool(path, size=1, pragmas=DB_PRAGMAS, attach={"archive": archive_path(path)})
+        try:
+            async with pool.acquire() as db:
+                await apply_migrations(db)
+                await prepare_archive(db, enabled=True)
+            moved = await archive_shard(pool, before, args.chunk_size)
+        finally:
+            await pool.close()
+        print(f"{path}: перенесено в архив {moved} транзакций старше {from_epoch(before)[:10]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,187 @@
+"""дневные итоги по категориям (daily_rollup): схема, триггеры и разовое заполнение по существующим транзакциям
+
+Запуск: python -m database.backfill_rollup [путь_к_базе]
+Создает таблицу и триггеры, если их еще нет, и пересчитывает daily_rollup по всем транзакциям.
+"""
+
+import asyncio
+import sys
+import time
+
+import aiosqlite
+
+from database.archive import attach_archive
+from database.config import DB_PATH
+
+# Пересчет без остановки бота: пользователей в одной транзакции и пауза между транзакциями, сек.
+# Пауза нужна, чтобы ожидающие блокировку записи (busy_timeout) успели ее получить.
+ROLLUP_USERS_PER_CHUNK = 50
+ROLLUP_CHUNK_PAUSE = 0.05
+
+# Схема итогов. category_id = 0 означает "без категории" (NULL нельзя использовать в ключе).
+ROLLUP_SCHEMA = """
+-- Дневные итоги по категориям
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    tg_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    category_id INTEGER NOT NULL DEFAULT 0,
+    type INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,  -- копейки
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tg_id, day, category_id, type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_daily_rollup_category ON daily_rollup(tg_id, category_id, type, day, total);
+
+-- Триггеры для daily_rollup (при массовой загрузке, см. bulk_load, итоги пересчитывает импорт)
+CREATE TRIGGER IF NOT EXISTS daily_rollup_after_insert
+AFTER INSERT ON transactions
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+    VALUES (NEW.tg_id, NEW.day, COALESCE(NEW.category_id, 0), NEW.type, NEW.sum, 1)
+    ON CONFLICT (tg_id, day, category_id, type) DO UPDATE
+    SET total = total + excluded.total,
+        count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS daily_rollup_after_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE daily_rollup
+    SET total = total - OLD.sum,
+        count = count - 1
+    WHERE tg_id = OLD.tg_id
+    AND day = OLD.day
+    AND category_id = COALESCE(OLD.category_id, 0)
+    AND type = OLD.type;
+
+    DELETE FROM daily_rollup
+    WHERE tg_id = OLD.tg_id
+    AND day = OLD.day
+    AND category_id = COALESCE(OLD.category_id, 0)
+    AND type = OLD.type
+    AND count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS daily_rollup_after_update
+AFTER UPDATE ON transactions
+BEGIN
+    UPDATE daily_rollup
+    SET total = total - OLD.sum,
+        count = count - 1
+    WHERE tg_id = OLD.tg_id
+    AND day = OLD.day
+    AND category_id = COALESCE(OLD.category_id, 0)
+    AND type = OLD.type;
+
+    DELETE FROM daily_rollup
+    WHERE tg_id = OLD.tg_id
+    AND day = OLD.day
+    AND category_id = COALESCE(OLD.category_id, 0)
+    AND type = OLD.type
+    AND count <= 0;
+
+    INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+    VALUES (NEW.tg_id, NEW.day, COALESCE(NEW.category_id, 0), NEW.type, NEW.sum, 1)
+    ON CONFLICT (tg_id, day, category_id, type) DO UPDATE
+    SET total = total + excluded.total,
+        count = count + 1;
+END;
+"""
+
+
+async def rebuild_rollup(db: aiosqlite.Connection, source: str = "transactions") -> int:
+    """
+    создание daily_rollup (если нужно) и полный пересчет итогов по таблице transactions.
+
+    пересчет выполняется в одной транзакции, поэтому триггеры не могут разойтись с ним по данным.
+    остатки на конец месяца (balance_checkpoints), если они есть, пересчитываются вместе с итогами.
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+        source (str): Таблица транзакций; all_transactions - вместе с архивом (см. archive.attach_archive).
+
+    возвращает:
+        int: Количество строк в daily_rollup после пересчета.
+    """
+    await db.executescript(ROLLUP_SCHEMA)
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'balance_checkpoints'")
+    checkpoints = await cursor.fetchone() is not None
+    await db.execute("BEGIN IMMEDIATE")
+    if checkpoints:
+        # Без остатков триггеры balance_checkpoints при удалении итогов ничего не обновляют,
+        # а при вставке собирают остатки заново
+        await db.execute("DELETE FROM balance_checkpoints")
+    await db.execute("DELETE FROM daily_rollup")
+    await db.execute(
+        """
+        INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+        SELECT tg_id, day, COALESCE(category_id, 0), type, SUM(sum), COUNT(*)
+        FROM {source}
+        GROUP BY tg_id, day, COALESCE(category_id, 0), type
+        """.format(source=source)
+    )
+    await db.commit()
+    cursor = await db.execute("SELECT COUNT(*) FROM daily_rollup")
+    return (await cursor.fetchone())[0]
+
+
+async def rebuild_rollup_online(db: aiosqlite.Connection, users_per_chunk: int = ROLLUP_USERS_PER_CHUNK) -> int:
+    """
+    пересчет daily_rollup порциями по пользователям, не останавливая запись в базу.
+
+    триггеры должны быть уже созданы: итоги каждой порции пользователей удаляются и собираются
+    заново в отдельной короткой транзакции, после чего их поддерживают триггеры. между порциями
+    блокировка записи освобождается, и бот продолжает сохранять транзакции. пока пересчет идет,
+    итоги еще не пересчитанных пользователей могут быть неточными.
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+        users_per_chunk (int): Количество пользователей в одной транзакции пересчета.
+
+    возвращает:
+        int: Количество пересчитанных пользователей.
+    """
+    last_id = -2**63  # меньше любого tg_id
+    done = 0
+    while True:
+        cursor = await db.execute(
+            "SELECT tg_id FROM users WHERE tg_id > ? ORDER BY tg_id LIMIT ?", (last_id, users_per_chunk)
+        )
+        tg_ids = [row[0] for row in await cursor.fetchall()]
+        if not tg_ids:
+            return done
+        placeholders = ", ".join("?" * len(tg_ids))
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute(f"DELETE FROM daily_rollup WHERE tg_id IN ({placeholders})", tg_ids)
+        await db.execute(
+            f"""
+            INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+            SELECT tg_id, day, COALESCE(category_id, 0), type, SUM(sum), COUNT(*)
+            FROM transactions
+            WHERE tg_id IN ({placeholders})
+            GROUP BY tg_id, day, COALESCE(category_id, 0), type
+            """,
+            tg_ids
+        )
+        await db.commit()
+        done += len(tg_ids)
+        last_id = tg_ids[-1]
+        await asyncio.sleep(ROLLUP_CHUNK_PAUSE)
+
+
+async def backfill_rollup(db_path: str = DB_PATH) -> int:
+    """Разовое заполнение daily_rollup в базе по указанному пути (см. rebuild_rollup), с учетом архива."""
+    async with aiosqlite.connect(db_path) as db:
+        return await rebuild_rollup(db, await attach_archive(db, db_path))
+
+
+async def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    started = time.monotonic()
+    rows = await backfill_rollup(db_path)
+    print(f"daily_rollup заполнена: {rows} строк за {time.monotonic() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
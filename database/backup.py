@@ -0,0 +1,172 @@
+"""резервные копии базы без остановки бота: online backup API sqlite, сжатые снимки с ротацией и проверкой
+
+Запуск: python -m database.backup [--dir DIR] [--keep N]
+Снимает копию каждого файла базы (шарды и архивы) в DB_BACKUP_DIR. Бот делает то же
+каждые DB_BACKUP_INTERVAL_HOURS часов.
+
+Восстановление: остановить бота, распаковать снимок (gunzip) на место файла базы.
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import urllib.parse
+from datetime import datetime
+from typing import List, Optional
+
+import aiosqlite
+
+from database.config import (
+    DB_PATH, DB_SHARDS, DB_BACKUP_DIR, DB_BACKUP_KEEP, DB_BACKUP_PAGES_PER_STEP, DB_BACKUP_STEP_PAUSE_MS
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = ".db.gz"
+COMPRESS_LEVEL = 6
+
+
+class BackupVerificationError(Exception):
+    """Снимок не прошел PRAGMA integrity_check."""
+
+
+def _snapshot_name(db_path: str, stamp: str) -> str:
+    """Имя снимка: data.0.db -> data.0-20250131-080000.db.gz."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return f"{stem}-{stamp}{SNAPSHOT_SUFFIX}"
+
+
+def _snapshots(backup_dir: str, db_path: str) -> List[str]:
+    """Снимки файла базы от старых к новым (метка времени в имени сортируется как строка)."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    pattern = os.path.join(glob.escape(backup_dir), f"{glob.escape(stem)}-*{SNAPSHOT_SUFFIX}")
+    # data-*.db.gz подходит и к снимкам data.archive.db, поэтому метка проверяется точно
+    return sorted(
+        path for path in glob.glob(pattern)
+        if len(os.path.basename(path)) == len(_snapshot_name(db_path, "00000000-000000"))
+    )
+
+
+def latest_snapshot_age(backup_dir: str, db_path: str) -> Optional[float]:
+    """Сколько секунд назад сделан последний снимок файла базы; None - снимков нет."""
+    snapshots = _snapshots(backup_dir, db_path)
+    if not snapshots:
+        return None
+    return time.time() - os.path.getmtime(snapshots[-1])
+
+
+def _verify(path: str) -> None:
+    """Проверка копии PRAGMA integrity_check (выполняется в отдельном потоке)."""
+    db = sqlite3.connect(path)
+    try:
+        result = [row[0] for row in db.execute("PRAGMA integrity_check")]
+    finally:
+        db.close()
+    if result != ["ok"]:
+        raise BackupVerificationError(f"{path}: {'; '.join(result[:5])}")
+
+
+def _compress(source: str, target: str) -> None:
+    """Сжатие копии в gzip через временный файл, чтобы в каталоге не оставалось оборванного снимка."""
+    partial = target + ".partial"
+    with open(source, "rb") as src, gzip.open(partial, "wb", compresslevel=COMPRESS_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(partial, target)
+
+
+def _rotate(backup_dir: str, db_path: str, keep: int) -> None:
+    """Удаление старых снимков файла базы сверх keep последних."""
+    for path in _snapshots(backup_dir, db_path)[:-keep] if keep > 0 else []:
+        os.remove(path)
+
+
+async def backup_file(db_path: str, backup_dir: str = DB_BACKUP_DIR, keep: int = DB_BACKUP_KEEP,
+                      pages_per_step: int = DB_BACKUP_PAGES_PER_STEP,
+                      step_pause_ms: float = DB_BACKUP_STEP_PAUSE_MS) -> str:
+    """
+    сжатый снимок одного файла базы.
+
+    копия снимается online backup API небольшими шагами по pages_per_step страниц с паузой
+    между шагами, в рабочем потоке отдельного соединения только для чтения: цикл событий
+    не блокируется, а записи бота идут как обычно. соединение держит открытой транзакцию
+    чтения, поэтому все шаги копируют один снимок WAL: без нее каждая запись бота заставляла
+    бы копирование начинаться заново. затем копия проверяется integrity_check и сжимается
+    в отдельном потоке, старые снимки сверх keep удаляются.
+
+    аргументы:
+        db_path (str): Путь к файлу базы.
+        backup_dir (str): Каталог снимков.
+        keep (int): Сколько последних снимков файла хранить.
+        pages_per_step (int): Страниц базы за один шаг копирования.
+        step_pause_ms (float): Пауза между шагами, мс.
+
+    возвращает:
+        str: Путь к сжатому снимку.
+
+    исключения:
+        BackupVerificationError: если копия не прошла проверку; снимок при этом не сохраняется.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    snapshot = os.path.join(backup_dir, _snapshot_name(db_path, stamp))
+    copy_path = snapshot[:-len(".gz")] + ".partial"
+    started = time.monotonic()
+
+    def pause(status: int, remaining: int, total: int) -> None:
+        # Вызывается в рабочем потоке после каждого шага: отдаем процессор обработчикам
+        time.sleep(step_pause_ms / 1000)
+
+    try:
+        source = await aiosqlite.connect(f"file:{urllib.parse.quote(db_path)}?mode=ro", uri=True)
+        try:
+            await source.execute("BEGIN")
+            await (await source.execute("SELECT COUNT(*) FROM sqlite_master")).fetchone()
+            # Соединение с копией используется в рабочем потоке source
+            target = sqlite3.connect(copy_path, check_same_thread=False)
+            try:
+                await source.backup(target, pages=pages_per_step, progress=pause)
+            finally:
+                target.close()
+        finally:
+            await source.close()
+        await asyncio.to_thread(_verify, copy_path)
+        await asyncio.to_thread(_compress, copy_path, snapshot)
+    finally:
+        if os.path.exists(copy_path):
+            os.remove(copy_path)
+
+    _rotate(backup_dir, db_path, keep)
+    logger.info("Backup of %s: %s (%.1f MiB) in %.1f s", db_path, snapshot,
+                os.path.getsize(snapshot) / 1024 / 1024, time.monotonic() - started)
+    return snapshot
+
+
+async def backup_files(paths: List[str], backup_dir: str = DB_BACKUP_DIR, keep: int = DB_BACKUP_KEEP) -> List[str]:
+    """Снимки нескольких файлов по очереди (чтобы не нагружать диск одновременно); возвращает пути снимков."""
+    return [await backup_file(path, backup_dir, keep) for path in paths]
+
+
+async def main():
+    from database.archive import archive_path
+    from database.shards import shard_paths
+
+    parser = argparse.ArgumentParser(description="Резервная копия базы без остановки бота")
+    parser.add_argument("--dir", default=DB_BACKUP_DIR, help="каталог снимков")
+    parser.add_argument("--keep", type=int, default=DB_BACKUP_KEEP, help="сколько последних снимков хранить")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    paths = shard_paths(DB_PATH, DB_SHARDS)
+    paths += [archive_path(path) for path in paths if os.path.exists(archive_path(path))]
+    for snapshot in await backup_files(paths, args.dir, args.keep):
+        print(snapshot)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+"""остатки на конец месяца (balance_checkpoints): схема, триггеры и проверка расхождений
+
+Запуск: python -m database.balance_checkpoints [путь_к_базе] [--fix]
+Пересчитывает остатки с нуля по daily_rollup и печатает месяцы, у которых сохраненный остаток
+разошелся с фактическим. С флагом --fix остатки пересчитываются заново.
+
+Баланс на дату - остаток на конец предыдущего месяца плюс дневные итоги текущего месяца до
+этой даты (см. get_balance в db_methods.py), поэтому не зависит от длины истории пользователя.
+"""
+
+import asyncio
+import sys
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+from database.config import DB_PATH
+from database.units import from_minor
+
+# Строка месяца есть, если в нем или раньше были транзакции; у месяцев без транзакций строки
+# может не быть - их остаток равен остатку ближайшего предыдущего месяца.
+# Триггеры читают изменения daily_rollup, а не транзакций, поэтому остатки правятся и при
+# задним числом добавленных, измененных или удаленных транзакциях: сдвигаются все месяцы
+# начиная с месяца изменения. Ключ строки итогов не меняется (перенос итогов между категориями -
+# вставка и удаление), поэтому при обновлении учитывается только изменение total.
+BALANCE_CHECKPOINTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS balance_checkpoints (
+    tg_id INTEGER NOT NULL,
+    month TEXT NOT NULL,  -- YYYY-MM
+    closing_balance INTEGER NOT NULL,  -- копейки, все доходы минус все расходы по конец месяца
+    PRIMARY KEY (tg_id, month)
+) WITHOUT ROWID;
+
+-- Триггеры для balance_checkpoints (при массовой загрузке, см. bulk_load, остатки пересчитывает импорт)
+CREATE TRIGGER IF NOT EXISTS balance_checkpoints_after_rollup_insert
+AFTER INSERT ON daily_rollup
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    -- Первая транзакция месяца: строка с остатком предыдущего месяца
+    INSERT INTO balance_checkpoints (tg_id, month, closing_balance)
+    VALUES (
+        NEW.tg_id,
+        substr(NEW.day, 1, 7),
+        COALESCE((
+            SELECT closing_balance FROM balance_checkpoints
+            WHERE tg_id = NEW.tg_id AND month < substr(NEW.day, 1, 7)
+            ORDER BY month DESC LIMIT 1
+        ), 0)
+    )
+    ON CONFLICT (tg_id, month) DO NOTHING;
+
+    UPDATE balance_checkpoints
+    SET closing_balance = closing_balance + CASE NEW.type WHEN 0 THEN NEW.total ELSE -NEW.total END
+    WHERE tg_id = NEW.tg_id
+    AND month >= substr(NEW.day, 1, 7);
+END;
+
+CREATE TRIGGER IF NOT EXISTS balance_checkpoints_after_rollup_update
+AFTER UPDATE OF total ON daily_rollup
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE balance_checkpoints
+    SET closing_balance = closing_balance
+        + CASE NEW.type WHEN 0 THEN NEW.total - OLD.total ELSE OLD.total - NEW.total END
+    WHERE tg_id = NEW.tg_id
+    AND month >= substr(NEW.day, 1, 7);
+END;
+
+CREATE TRIGGER IF NOT EXISTS balance_checkpoints_after_rollup_delete
+AFTER DELETE ON daily_rollup
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE balance_checkpoints
+    SET closing_balance = closing_balance - CASE OLD.type WHEN 0 THEN OLD.total ELSE -OLD.total END
+    WHERE tg_id = OLD.tg_id
+    AND month >= substr(OLD.day, 1, 7);
+END;
+"""
+
+# Остатки на конец каждого месяца с транзакциями, посчитанные заново по daily_rollup ({where} -
+# условие на пользователя или пустая строка)
+_CLOSING_BALANCES_QUERY = """
+    SELECT tg_id, month, SUM(net) OVER (PARTITION BY tg_id ORDER BY month) AS closing_balance
+    FROM (
+        SELECT tg_id, substr(day, 1, 7) AS month, SUM(CASE type WHEN 0 THEN total ELSE -total END) AS net
+        FROM daily_rollup
+        {where}
+        GROUP BY tg_id, month
+    )
+"""
+
+
+async def rebuild_checkpoints(db: aiosqlite.Connection, tg_id: Optional[int] = None) -> None:
+    """
+    пересчет остатков по daily_rollup (без commit).
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+        tg_id (Optional[int]): Пересчитать только этого пользователя; None - всех.
+    """
+    if tg_id is None:
+        await db.execute("DELETE FROM balance_checkpoints")
+        await db.execute(
+            "INSERT INTO balance_checkpoints (tg_id, month, closing_balance)" + _CLOSING_BALANCES_QUERY.format(where="")
+        )
+    else:
+        await db.execute("DELETE FROM balance_checkpoints WHERE tg_id = ?", (tg_id,))
+        await db.execute(
+            "INSERT INTO balance_checkpoints (tg_id, month, closing_balance)"
+            + _CLOSING_BALANCES_QUERY.format(where="WHERE tg_id = ?"),
+            (tg_id,)
+        )
+
+
+async def verify_checkpoints(db: aiosqlite.Connection, fix: bool = False) -> List[Dict[str, Any]]:
+    """
+    пересчет остатков с нуля по daily_rollup и поиск расхождений с сохраненными.
+
+    сравниваются месяцы с транзакциями; лишние строки месяцев без транзакций не ошибка,
+    если их остаток равен остатку предыдущего месяца.
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+        fix (bool): Пересчитать все остатки заново, если есть расхождения.
+
+    возвращает:
+        List[Dict[str, Any]]: Месяцы с расхождением: tg_id, month, closing_balance, actual и drift
+        (суммы в копейках, closing_balance - сохраненный остаток на конец месяца или на конец
+        ближайшего предыдущего, если строки месяца нет).
+    """
+    db.row_factory = aiosqlite.Row
+    cursor = await db.execute(
+        f"""
+        SELECT a.tg_id, a.month, a.closing_balance AS actual,
+            (
+                SELECT c.closing_balance FROM balance_checkpoints c
+                WHERE c.tg_id = a.tg_id AND c.month <= a.month
+                ORDER BY c.month DESC LIMIT 1
+            ) AS closing_balance
+        FROM ({_CLOSING_BALANCES_QUERY.format(where="")}) a
+        """
+    )
+    drifted = []
+    for row in await cursor.fetchall():
+        item = dict(row)
+        item["closing_balance"] = item["closing_balance"] or 0
+        item["drift"] = item["closing_balance"] - item["actual"]
+        if item["drift"]:
+            drifted.append(item)
+    db.row_factory = None
+
+    if fix and drifted:
+        await db.execute("BEGIN IMMEDIATE")
+        await rebuild_checkpoints(db)
+        await db.commit()
+    return drifted
+
+
+async def main():
+    from database.migrations import apply_migrations
+
+    args = [arg for arg in sys.argv[1:] if arg != "--fix"]
+    fix = "--fix" in sys.argv[1:]
+    db_path = args[0] if args else DB_PATH
+
+    async with aiosqlite.connect(db_path) as db:
+        await apply_migrations(db)
+        drifted = await verify_checkpoints(db, fix=fix)
+
+    for item in drifted:
+        print(
+            f"tg_id={item['tg_id']} {item['month']}: остаток {from_minor(item['closing_balance']):.2f}, "
+            f"по итогам {from_minor(item['actual']):.2f}, расхождение {from_minor(item['drift']):+.2f}"
+        )
+    if not drifted:
+        print("Расхождений не найдено")
+    elif fix:
+        print(f"Остатки пересчитаны, исправлено месяцев: {len(drifted)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""проверка планов запросов (EXPLAIN QUERY PLAN) для горячих запросов лимитов и транзакций
+
+Запуск: python -m database.check_query_plans [путь_к_базе]
+Без аргумента проверяется пустая база в памяти, созданная по схеме из migrations.py.
+Завершается с кодом 1, если запрос перестал использовать ожидаемый индекс.
+Те же проверки выполняет тест tests/test_query_plans.py.
+"""
+
+import asyncio
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from database.archive import ARCHIVE_SCHEMA
+from database.db_methods import (
+    ACTIVE_LIMIT_QUERY, BALANCE_QUERY, EXPIRING_LIMITS_QUERY, LIMIT_USAGE_QUERY, VIOLATED_LIMITS_QUERY, transactions_query
+)
+from database.migrations import apply_migrations
+
+# Страница транзакций категории после граничной транзакции
+CATEGORY_PAGE = "t.category_id = :category_id AND (t.date_time, t.transaction_id) < (:key_time, :key_id)"
+CATEGORY_PAGE_PARAMS = {"category_id": 1, "key_time": 100, "key_id": 5, "limit": 5, "archived_before": 200}
+
+# (название, запрос, параметры, подстрока, которая должна быть в плане)
+CHECKS: List[Tuple[str, str, Any, str]] = [
+    (
+        "limit usage",
+        LIMIT_USAGE_QUERY,
+        (1, "Еда", "2025-01-01", "2025-01-31"),
+        "USING COVERING INDEX idx_daily_rollup_category",
+    ),
+    (
+        "active limit",
+        ACTIVE_LIMIT_QUERY,
+        (1, "Еда", "2025-01-15", "2025-01-15"),
+        "USING INDEX idx_limits_category",
+    ),
+    (
+        "category page",
+        transactions_query(CATEGORY_PAGE, "DESC", None, limit=True),
+        CATEGORY_PAGE_PARAMS,
+        "USING INDEX idx_transactions_category",
+    ),
+    (
+        "category page with archive",
+        transactions_query(CATEGORY_PAGE, "DESC", 200, limit=True),
+        CATEGORY_PAGE_PARAMS,
+        "USING INDEX idx_archive_category",
+    ),
+    (
+        "balance",
+        BALANCE_QUERY,
+        {"tg_id": 1, "month": "2025-01", "month_start": "2025-01-01", "end": "2025-01-15"},
+        "SEARCH balance_checkpoints USING PRIMARY KEY (tg_id=? AND month<?)",
+    ),
+    (
+        "expiring limits",
+        EXPIRING_LIMITS_QUERY,
+        (),
+        "USING INDEX idx_limits_end_date",
+    ),
+    (
+        "violated limits",
+        VIOLATED_LIMITS_QUERY,
+        {"today": "2025-01-15", "after_id": 0, "chunk_size": 500},
+        "SEARCH l USING INTEGER PRIMARY KEY (rowid>?)",
+    ),
+]
+
+
+# Запросы, в которых сортируются только части, уже ограниченные LIMIT по индексу (слияние с архивом):
+# сканирование подзапроса и временное дерево для них - не больше :limit строк
+BOUNDED_SORT = {"category page with archive"}
+
+
+async def explain(db: aiosqlite.Connection, query: str, params: Any) -> List[str]:
+    """Получение строк плана выполнения запроса."""
+    cursor = await db.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row[3] for row in await cursor.fetchall()]
+
+
+def plan_ok(name: str, plan: List[str], expected: str) -> bool:
+    """
+    соответствие плана ожиданию: в нем есть expected и нет полного сканирования таблиц.
+
+    сортировка во временном дереве тоже означает, что индекс не подходит, кроме запросов
+    из BOUNDED_SORT (SCAN CONSTANT ROW - запрос из одних скалярных подзапросов, без таблицы).
+    """
+    plan_text = "; ".join(plan)
+    bounded = name in BOUNDED_SORT
+    scans = [line for line in plan if line.startswith("SCAN") and line != "SCAN CONSTANT ROW"
+             and not (bounded and line.startswith("SCAN (subquery"))]
+    return expected in plan_text and not scans and ("USE TEMP B-TREE" not in plan_text or bounded)
+
+
+async def collect_plans(db_path: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    планы всех запросов из CHECKS.
+
+    аргументы:
+        db_path (Optional[str]): Путь к проверяемой базе. None - пустая база в памяти по текущей схеме.
+
+    возвращает:
+        Dict[str, List[str]]: Строки плана по названию проверки.
+    """
+    async with aiosqlite.connect(db_path or ":memory:") as db:
+        if db_path is None:
+            await apply_migrations(db)
+        # Архив для планов запросов с UNION ALL (у проверяемой базы - пустой, в памяти)
+        await db.execute("ATTACH DATABASE ':memory:' AS archive")
+        await db.executescript(ARCHIVE_SCHEMA)
+        return {name: await explain(db, query, params) for name, query, params, _expected in CHECKS}
+
+
+async def check_query_plans(db_path: Optional[str] = None) -> bool:
+    """
+    проверка, что запросы лимитов выполняются поиском по индексу, а не полным сканированием.
+
+    аргументы:
+        db_path (Optional[str]): Путь к проверяемой базе. None - пустая база в памяти по текущей схеме.
+
+    возвращает:
+        bool: True, если все планы соответствуют ожиданиям.
+    """
+    ok = True
+    plans = await collect_plans(db_path)
+    for name, _query, _params, expected in CHECKS:
+        plan_text = "; ".join(plans[name])
+        if plan_ok(name, plans[name], expected):
+            print(f"OK   {name}: {plan_text}")
+        else:
+            ok = False
+            print(f"FAIL {name}: {plan_text} (ожидалось: {expected})")
+    return ok
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    sys.exit(0 if asyncio.run(check_query_plans(path)) else 1)
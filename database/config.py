@@ -0,0 +1,62 @@
+"""настройки хранилища, читаемые из переменных окружения (.env)"""
+
+import os
+from dotenv import load_dotenv
+
+# загрузка переменных из .env
+load_dotenv()
+
+# Хранилище: "sqlite" - база на диске (db_methods.py), "memory" - данные в памяти процесса
+# (memory_repository.py, для нагрузочных тестов и бенчмарков; при остановке бота данные теряются)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+# Путь к базе данных
+DB_PATH = os.getenv("DB_PATH", "database/data.db")
+# Количество файлов базы (шардов); пользователи распределяются по ним по хэшу tg_id.
+# При значении больше 1 файлы называются data.0.db, data.1.db, ... рядом с DB_PATH.
+# Меняется только вместе с переносом данных: при запуске проверяется, что файлы созданы для того же числа
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+
+# Настройки пула соединений
+# Записи каждого шарда идут через одно пишущее соединение, чтения - через отдельные соединения только для чтения
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # Количество соединений для чтения на шард
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))  # Сколько секунд ждать свободное соединение
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "60"))  # Проверка соединения после простоя, сек
+
+# Групповая фиксация вставок транзакций: одна транзакция sqlite на пачку вызовов add_transaction
+DB_WRITE_BATCHING = os.getenv("DB_WRITE_BATCHING", "0") == "1"  # По умолчанию каждый вызов фиксируется сам
+DB_BATCH_MAX_ROWS = int(os.getenv("DB_BATCH_MAX_ROWS", "100"))  # Максимум записей в пачке
+DB_BATCH_MAX_DELAY_MS = float(os.getenv("DB_BATCH_MAX_DELAY_MS", "20"))  # Сколько мс ждать попутные записи
+
+# Холодное хранение (database/archive.py): транзакции старше стольких дней (до начала месяца)
+# раз в сутки переносятся в архивную базу рядом с основной (data.archive.db), 0 - не переносить.
+# После первого переноса выключать нельзя: при запуске проверяется, что архив подключен
+DB_ARCHIVE_AFTER_DAYS = int(os.getenv("DB_ARCHIVE_AFTER_DAYS", "0"))
+
+# Резервные копии (database/backup.py): сжатые снимки всех файлов базы, снимаемые без остановки бота
+DB_BACKUP_DIR = os.getenv("DB_BACKUP_DIR", "database/backups")
+DB_BACKUP_INTERVAL_HOURS = float(os.getenv("DB_BACKUP_INTERVAL_HOURS", "24"))  # Как часто снимать копию, 0 - не снимать
+DB_BACKUP_KEEP = int(os.getenv("DB_BACKUP_KEEP", "7"))  # Сколько последних снимков каждого файла хранить
+DB_BACKUP_PAGES_PER_STEP = int(os.getenv("DB_BACKUP_PAGES_PER_STEP", "256"))  # Страниц за шаг копирования
+DB_BACKUP_STEP_PAUSE_MS = float(os.getenv("DB_BACKUP_STEP_PAUSE_MS", "10"))  # Пауза между шагами, мс
+
+# Замер запросов (database/query_stats.py): время и число строк по каждому запросу, сводка при остановке.
+# По умолчанию выключен: замер опирается на внутренние методы aiosqlite закрепленной версии
+DB_QUERY_STATS = os.getenv("DB_QUERY_STATS", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))  # Запросы дольше стольких мс пишутся в лог, 0 - не писать
+
+# Кэш записей пользователей (get_user, is_registered, get_categories)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))  # Максимум пользователей в кэше, 0 - кэш выключен
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # Время жизни записи, сек
+
+# Профиль хранилища: PRAGMA, применяемые к каждому соединению пула.
+# Порядок важен: busy_timeout ставится первым, чтобы смена journal_mode подождала чужую блокировку.
+DB_PRAGMAS = {
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT", "5000")),  # мс ожидания блокировки вместо "database is locked"
+    "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),  # WAL: чтения не блокируются записью
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),  # в режиме WAL fsync только при checkpoint
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", "-20000")),  # отрицательное значение - размер в КиБ
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),  # байт файла, читаемых через mmap
+    "temp_store": os.getenv("DB_TEMP_STORE", "MEMORY"),  # временные таблицы и сортировки в памяти
+    "foreign_keys": "ON",  # каскадное удаление категорий и их лимитов держится на внешних ключах
+}
@@ -2,12 +2,297 @@
 
 import aiosqlite
 import json
-from typing import Optional, Dict, Any, List
+import logging
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 from datetime import datetime
 from aiogram import Bot
 
-# Путь к базе данных
-DB_PATH = "database/data.db"
+from database.config import (
+    DB_PATH, DB_SHARDS, DB_POOL_SIZE, DB_ACQUIRE_TIMEOUT, DB_HEALTH_CHECK_INTERVAL, DB_PRAGMAS,
+    DB_WRITE_BATCHING, DB_BATCH_MAX_ROWS, DB_BATCH_MAX_DELAY_MS, USER_CACHE_SIZE, USER_CACHE_TTL,
+    DB_ARCHIVE_AFTER_DAYS, DB_BACKUP_DIR, DB_BACKUP_KEEP, DB_QUERY_STATS, DB_SLOW_QUERY_MS
+)
+from database.archive import archive_boundary, archive_shard, archived_before, prepare_archive
+from database.backup import backup_files
+from database.balance_checkpoints import rebuild_checkpoints
+from database.limit_alerts import notify_limit
+from database.migrations import apply_migrations
+from database.pool import ConnectionPool
+from database.query_stats import query_stats
+from database.records import Transaction, TransactionPage, transaction_factory
+from database.shards import ShardedPool, shard_paths, merge_streams
+from database.units import to_minor, from_minor, to_epoch
+from database.user_cache import MISSING, UserCache
+from database.write_batcher import WriteBatcher
+
+logger = logging.getLogger(__name__)
+
+# Пулы соединений по файлам базы (шардам, см. DB_SHARDS); запросы пользователя идут в его шард:
+# записи через единственное пишущее соединение шарда pool.acquire(tg_id), чтения через соединения
+# только для чтения pool.read(tg_id). Открываются при старте бота (main.py) и закрываются при остановке
+pool = ShardedPool(
+    shard_paths(DB_PATH, DB_SHARDS),
+    size=DB_POOL_SIZE,
+    acquire_timeout=DB_ACQUIRE_TIMEOUT,
+    health_check_interval=DB_HEALTH_CHECK_INTERVAL,
+    pragmas=DB_PRAGMAS,
+    archive=DB_ARCHIVE_AFTER_DAYS > 0,
+    instrument=DB_QUERY_STATS
+)
+# Замеры запросов всех соединений пула: query_stats.summary(), медленные запросы пишутся в лог
+query_stats.slow_ms = DB_SLOW_QUERY_MS
+
+# Кэш записей пользователей для get_user/is_registered; сбрасывается всеми методами,
+# меняющими пользователя, его категории или баланс. Счетчики попаданий: user_cache.stats()
+user_cache = UserCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Колонки лимита для выборок: суммы хранятся в копейках, наружу отдаются в рублях
+LIMIT_COLUMNS = (
+    "l.limit_id, l.tg_id, l.start_date, l.end_date, l.category_id, "
+    "l.limit_sum / 100.0 AS limit_sum, l.spent / 100.0 AS spent, c.name AS category"
+)
+
+# Активный лимит пользователя по категории на дату (YYYY-MM-DD) вместе с накопленными
+# расходами spent - одна точечная выборка по индексу idx_limits_category.
+# Колонки сравниваются без обертки в date(), чтобы работали индексы.
+ACTIVE_LIMIT_QUERY = f"""
+    SELECT {LIMIT_COLUMNS}
+    FROM categories c
+    JOIN limits l ON l.category_id = c.category_id
+    WHERE c.tg_id = ? 
+    AND c.name = ? 
+    AND l.start_date <= ? AND l.end_date >= ?
+"""
+
+# Сумма расходов по категории за период по дневным итогам daily_rollup (границы включительно).
+# Стоимость зависит от числа дней в периоде, а не от числа транзакций;
+# индекс idx_daily_rollup_category покрывает запрос целиком.
+LIMIT_USAGE_QUERY = """
+    SELECT COALESCE(SUM(r.total), 0) / 100.0 as total
+    FROM categories c
+    JOIN daily_rollup r ON r.tg_id = c.tg_id AND r.category_id = c.category_id
+    WHERE c.tg_id = ? 
+    AND c.name = ?
+    AND r.type = 1
+    AND r.day >= ? AND r.day <= ?
+"""
+
+# Активные на дату :today (YYYY-MM-DD) лимиты, расходы по которым превысили limit_sum.
+# Расходы берутся из limits.spent, который ведут триггеры (см. limit_spent.py), - как в check_limit_violation.
+# Читается порциями по :chunk_size после limit_id = :after_id: порядок по первичному ключу не требует
+# сортировки, и каждая порция - короткий запрос, сколько бы лимитов ни было нарушено.
+VIOLATED_LIMITS_QUERY = f"""
+    SELECT {LIMIT_COLUMNS}, u.tg_username
+    FROM limits l
+    JOIN users u ON l.tg_id = u.tg_id
+    JOIN categories c ON c.category_id = l.category_id
+    WHERE l.start_date <= :today AND l.end_date >= :today
+    AND l.spent > l.limit_sum
+    AND l.limit_id > :after_id
+    ORDER BY l.limit_id
+    LIMIT :chunk_size
+"""
+VIOLATED_LIMITS_CHUNK = 500
+
+# Лимиты, которые истекают завтра, - поиск по индексу idx_limits_end_date
+EXPIRING_LIMITS_QUERY = f"""
+    SELECT {LIMIT_COLUMNS}, u.tg_username
+    FROM limits l
+    JOIN users u ON l.tg_id = u.tg_id
+    JOIN categories c ON c.category_id = l.category_id
+    WHERE l.end_date = date('now', '+1 day')
+"""
+
+# Баланс до даты (YYYY-MM-DD, не включительно) в копейках: остаток на конец последнего месяца
+# перед месяцем даты из balance_checkpoints и дневные итоги этого месяца до даты. Читается
+# одна строка остатков и не больше месяца daily_rollup, сколько бы лет ни было истории.
+BALANCE_QUERY = """
+    SELECT
+        COALESCE((
+            SELECT closing_balance FROM balance_checkpoints
+            WHERE tg_id = :tg_id AND month < :month
+            ORDER BY month DESC LIMIT 1
+        ), 0)
+        + COALESCE((
+            SELECT SUM(CASE type WHEN 0 THEN total ELSE -total END)
+            FROM daily_rollup
+            WHERE tg_id = :tg_id AND day >= :month_start AND day < :end
+        ), 0)
+"""
+
+# Колонки транзакции для выборок в порядке полей records.Transaction; время и сумма
+# переводятся из секунд и копеек в ISO-строку и рубли, название категории берется из categories
+TRANSACTION_COLUMNS = (
+    "t.transaction_id, strftime('%Y-%m-%dT%H:%M:%S', t.date_time, 'unixepoch'), "
+    "t.type, t.description, c.name, t.sum / 100.0"
+)
+
+
+def transactions_query(where: str, order: str, boundary: Optional[int], limit: bool = False) -> str:
+    """
+    выборка транзакций с условием where по основной таблице или, если нужен архив, по обеим.
+
+    where - условие на "t" с именованными параметрами; строки упорядочены по (date_time,
+    transaction_id) в направлении order, при limit=True их не больше :limit. если boundary
+    не None, добавляются строки архива старше :archived_before (см. archive.py): каждая часть
+    сортируется и ограничивается по своему индексу, затем результаты сливаются.
+    """
+    tail = f"ORDER BY t.date_time {order}, t.transaction_id {order}" + (" LIMIT :limit" if limit else "")
+    select = (
+        f"SELECT {TRANSACTION_COLUMNS} FROM {{source}} t "
+        f"LEFT JOIN categories c ON c.category_id = t.category_id WHERE {where}"
+    )
+    hot = f"{select.format(source='transactions')} {tail}"
+    if boundary is None:
+        return hot
+    archived = f"{select.format(source='archive.transactions')} AND t.date_time < :archived_before {tail}"
+    # Во внешнем ORDER BY - номера колонок: время ISO-строкой сортируется так же, как секунды
+    return (
+        f"SELECT * FROM ({hot}) UNION ALL SELECT * FROM ({archived}) "
+        f"ORDER BY 2 {order}, 1 {order}" + (" LIMIT :limit" if limit else "")
+    )
+
+
+async def _archive_boundary(db: aiosqlite.Connection) -> Optional[int]:
+    """Граница архива (см. archive.archived_before) или None, если архивирование выключено."""
+    if DB_ARCHIVE_AFTER_DAYS <= 0:
+        return None
+    return await archived_before(db)
+
+
+async def _page_key(db: aiosqlite.Connection, transaction_id: int, boundary: Optional[int]) -> Tuple[int, int]:
+    """Ключ постраничного вывода (date_time, transaction_id) граничной транзакции из основной таблицы или архива."""
+    cursor = await db.execute("SELECT date_time FROM transactions WHERE transaction_id = ?", (transaction_id,))
+    row = await cursor.fetchone()
+    if row is None and boundary is not None:
+        cursor = await db.execute(
+            "SELECT date_time FROM archive.transactions WHERE transaction_id = ?", (transaction_id,)
+        )
+        row = await cursor.fetchone()
+    # Удаленная граничная транзакция: ключ, с которым страница выйдет пустой, как и раньше
+    return (row[0] if row else None), transaction_id
+
+
+async def open_storage() -> None:
+    """
+    открытие пулов соединений, проверка PRAGMA и применение миграций схемы в каждом шарде.
+
+    вызывается при старте бота до приема первых апдейтов; при ошибке пулы закрываются.
+    """
+    await pool.open()
+    try:
+        # Проверка, что профиль PRAGMA действительно применился
+        await pool.verify_pragmas()
+        # Создание или обновление схемы каждого файла базы до последней версии
+        for shard in pool.pools:
+            async with shard.acquire() as db:
+                await apply_migrations(db)
+        # Проверка, что файлы созданы для текущего количества шардов
+        await pool.check_layout()
+        # Таблицы архива (или проверка, что архив не выключили после переноса транзакций)
+        for shard in pool.pools:
+            async with shard.acquire() as db:
+                await prepare_archive(db, enabled=DB_ARCHIVE_AFTER_DAYS > 0)
+    except Exception:
+        await pool.close()
+        raise
+
+
+async def close_storage() -> None:
+    """Фиксация записей из очередей групповой фиксации и закрытие пулов соединений."""
+    for write_batcher in write_batchers:
+        await write_batcher.close()
+    logger.info("Connection pools: %s", pool.stats())
+    await pool.close()
+    logger.info("User cache: %s", user_cache.stats())
+    query_stats.log_summary()
+
+
+def _today() -> str:
+    """Текущая дата в формате YYYY-MM-DD."""
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+async def _category_id(db: aiosqlite.Connection, tg_id: int, category: Optional[str]) -> Optional[int]:
+    """
+    Получение ID категории пользователя по названию (поиск по уникальному индексу).
+
+    Исключения:
+        ValueError: если у пользователя нет такой категории.
+    """
+    if category is None:
+        return None
+    cursor = await db.execute(
+        "SELECT category_id FROM categories WHERE tg_id = ? AND name = ?",
+        (tg_id, category)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        raise ValueError("Category not found in user categories")
+    return row[0]
+
+
+async def _fetch_categories(db: aiosqlite.Connection, tg_id: int) -> List[str]:
+    """Названия категорий пользователя в порядке отображения."""
+    cursor = await db.execute(
+        "SELECT name FROM categories WHERE tg_id = ? ORDER BY position, category_id",
+        (tg_id,)
+    )
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def _replace_categories(db: aiosqlite.Connection, tg_id: int, categories: List[str]) -> None:
+    """
+    Приведение справочника категорий пользователя к переданному списку (без commit).
+
+    Удаленные категории стираются из справочника: их транзакции остаются без категории
+    (ON DELETE SET NULL, в архиве - явным UPDATE), а лимиты по ним удаляются (ON DELETE CASCADE).
+    """
+    if DB_ARCHIVE_AFTER_DAYS > 0:
+        await db.execute(
+            """
+            UPDATE archive.transactions SET category_id = NULL
+            WHERE tg_id = ? AND category_id IN (
+                SELECT category_id FROM main.categories
+                WHERE tg_id = ? AND name NOT IN (SELECT value FROM json_each(?))
+            )
+            """,
+            (tg_id, tg_id, json.dumps(categories, ensure_ascii=False))
+        )
+    await db.execute(
+        "DELETE FROM categories WHERE tg_id = ? AND name NOT IN (SELECT value FROM json_each(?))",
+        (tg_id, json.dumps(categories, ensure_ascii=False))
+    )
+    await db.executemany(
+        """
+        INSERT INTO categories (tg_id, name, position) VALUES (?, ?, ?)
+        ON CONFLICT (tg_id, name) DO UPDATE SET position = excluded.position
+        """,
+        [(tg_id, name, position) for position, name in enumerate(categories)]
+    )
+    if DB_ARCHIVE_AFTER_DAYS > 0:
+        # Итоги транзакций из основной таблицы перенесли триггеры SET NULL; оставшиеся итоги
+        # удаленных категорий - по архивным транзакциям, переносим их в "без категории" (0)
+        await db.execute(
+            """
+            INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+            SELECT tg_id, day, 0, type, total, count FROM daily_rollup
+            WHERE tg_id = ? AND category_id != 0
+            AND category_id NOT IN (SELECT category_id FROM categories WHERE tg_id = ?)
+            ON CONFLICT (tg_id, day, category_id, type) DO UPDATE
+            SET total = total + excluded.total,
+                count = count + excluded.count
+            """,
+            (tg_id, tg_id)
+        )
+        await db.execute(
+            """
+            DELETE FROM daily_rollup
+            WHERE tg_id = ? AND category_id != 0
+            AND category_id NOT IN (SELECT category_id FROM categories WHERE tg_id = ?)
+            """,
+            (tg_id, tg_id)
+        )
 
 
 async def add_user(tg_id: int, tg_username: Optional[str] = None) -> None:
@@ -18,13 +303,13 @@ async def add_user(tg_id: int, tg_username: Optional[str] = None) -> None:
         tg_id (int): Уникальный Telegram ID пользователя.
         tg_username (Optional[str]): Имя пользователя в Telegram (без @), может быть None.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        default_categories = json.dumps([], ensure_ascii=False)
+    async with pool.acquire(tg_id) as db:
         await db.execute(
-            "INSERT OR IGNORE INTO users (tg_id, tg_username, categories, total_sum) VALUES (?, ?, ?, 0.0)",
-            (tg_id, tg_username, default_categories)
+            "INSERT OR IGNORE INTO users (tg_id, tg_username, total_sum) VALUES (?, ?, 0)",
+            (tg_id, tg_username)
         )
         await db.commit()
+    user_cache.invalidate(tg_id)
 
 
 async def update_user(tg_id: int, **kwargs: Any) -> None:
@@ -35,23 +320,32 @@ async def update_user(tg_id: int, **kwargs: Any) -> None:
         tg_id (int): Telegram ID пользователя.
         **kwargs: Произвольные поля для обновления (name, tg_username, total_sum, categories).
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.acquire(tg_id) as db:
         if not kwargs:
             return
 
-        if "categories" in kwargs and not isinstance(kwargs["categories"], str):
-            kwargs["categories"] = json.dumps(kwargs["categories"], ensure_ascii=False)
-
-        fields = ", ".join(f"{key} = ?" for key in kwargs.keys())
-        values = list(kwargs.values()) + [tg_id]
-        query = f"UPDATE users SET {fields} WHERE tg_id = ?"
-        await db.execute(query, values)
+        # Категории хранятся в отдельной таблице
+        categories = kwargs.pop("categories", None)
+        if categories is not None:
+            if isinstance(categories, str):
+                categories = json.loads(categories)
+            await _replace_categories(db, tg_id, categories)
+
+        if "total_sum" in kwargs:
+            kwargs["total_sum"] = to_minor(kwargs["total_sum"])
+
+        if kwargs:
+            fields = ", ".join(f"{key} = ?" for key in kwargs.keys())
+            values = list(kwargs.values()) + [tg_id]
+            query = f"UPDATE users SET {fields} WHERE tg_id = ?"
+            await db.execute(query, values)
         await db.commit()
+    user_cache.invalidate(tg_id)
 
 
 async def get_user(tg_id: int) -> Optional[Dict[str, Any]]:
     """
-    получение информации о пользователе по tg_id.
+    получение информации о пользователе по tg_id. запись берется из user_cache, если она там есть.
 
     аргументы:
         tg_id (int): Telegram ID пользователя.
@@ -59,21 +353,30 @@ async def get_user(tg_id: int) -> Optional[Dict[str, Any]]:
     возвращает:
         Dict[str, Any]: Словарь с данными пользователя или None, если пользователь не найден.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT tg_id, categories, tg_username, name, total_sum FROM users WHERE tg_id = ?",
-            (tg_id,)
-        )
-        row = await cursor.fetchone()
-        if row:
-            return {
-                "tg_id": row[0],
-                "categories": json.loads(row[1]),
-                "tg_username": row[2],
-                "name": row[3],
-                "total_sum": row[4]
-            }
+    user = user_cache.get(tg_id)
+    if user is MISSING:
+        generation = user_cache.generation
+        user = None
+        async with pool.read(tg_id) as db:
+            cursor = await db.execute(
+                "SELECT tg_id, tg_username, name, total_sum FROM users WHERE tg_id = ?",
+                (tg_id,)
+            )
+            row = await cursor.fetchone()
+            if row:
+                user = {
+                    "tg_id": row[0],
+                    "categories": await _fetch_categories(db, tg_id),
+                    "tg_username": row[1],
+                    "name": row[2],
+                    "total_sum": from_minor(row[3])
+                }
+        user_cache.put(tg_id, user, generation)
+
+    # Копия, чтобы изменения у вызывающего не попали в кэш
+    if user is None:
         return None
+    return dict(user, categories=list(user["categories"]))
 
 
 async def delete_user(tg_id: int) -> bool:
@@ -87,19 +390,37 @@ async def delete_user(tg_id: int) -> bool:
         bool: True, если удаление прошло успешно, False в противном случае.
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with pool.acquire(tg_id) as db:
+            if DB_ARCHIVE_AFTER_DAYS > 0:
+                # Сначала архив: при сбое между фиксациями пользователь остается и удаление можно повторить
+                await db.execute('DELETE FROM archive.transactions WHERE tg_id = ?', (tg_id,))
+                await db.commit()
+
+            # Сначала остатки на конец месяца: без них триггеры итогов не пересчитывают их
+            # при удалении каждой транзакции
+            await db.execute('DELETE FROM balance_checkpoints WHERE tg_id = ?', (tg_id,))
+
             # Удаляем транзакции пользователя
             await db.execute('DELETE FROM transactions WHERE tg_id = ?', (tg_id,))
             
             # Удаляем лимиты пользователя
             await db.execute('DELETE FROM limits WHERE tg_id = ?', (tg_id,))
             
-            # Очищаем данные пользователя (оставляем запись, но сбрасываем поля)
+            # Удаляем категории пользователя
+            await db.execute('DELETE FROM categories WHERE tg_id = ?', (tg_id,))
+
+            # Итоги по перенесенным в архив транзакциям триггеры не трогали
+            await db.execute('DELETE FROM daily_rollup WHERE tg_id = ?', (tg_id,))
+
+            # Загруженные выписки: после удаления транзакций их можно импортировать снова
+            await db.execute('DELETE FROM statement_imports WHERE tg_id = ?', (tg_id,))
+            
+            # Очищаем данные пользователя (оставляем запись, но сбрасываем поля);
+            # без имени пользователь считается незарегистрированным (is_registered)
             await db.execute('''
                 UPDATE users 
                 SET name = NULL, 
-                    total_sum = NULL, 
-                    categories = '[]' 
+                    total_sum = 0 
                 WHERE tg_id = ?
             ''', (tg_id,))
             
@@ -108,6 +429,27 @@ async def delete_user(tg_id: int) -> bool:
     except Exception as e:
         print(f"Error in delete_user: {e}")
         return False
+    finally:
+        user_cache.invalidate(tg_id)
+
+
+async def _insert_transaction(db: aiosqlite.Connection, tg_id: int, date_time: int, type_: int,
+                              description: Optional[str], category: Optional[str], sum_: int) -> int:
+    """Вставка транзакции без commit (время в секундах, сумма в копейках); возвращает ID транзакции."""
+    category_id = await _category_id(db, tg_id, category)
+    cursor = await db.execute(
+        "INSERT INTO transactions (tg_id, date_time, type, description, category_id, sum) VALUES (?, ?, ?, ?, ?, ?)",
+        (tg_id, date_time, type_, description, category_id, sum_)
+    )
+    return cursor.lastrowid
+
+
+# Групповая фиксация вставок add_transaction (включается DB_WRITE_BATCHING=1), своя очередь
+# на каждый шард; останавливается при остановке бота (main.py) до закрытия пула
+write_batchers = [
+    WriteBatcher(shard, _insert_transaction, max_rows=DB_BATCH_MAX_ROWS, max_delay_ms=DB_BATCH_MAX_DELAY_MS)
+    for shard in pool.pools
+] if DB_WRITE_BATCHING else []
 
 
 async def add_transaction(tg_id: int, type_: int, sum_: float, category: Optional[str] = None,
@@ -119,130 +461,262 @@ async def add_transaction(tg_id: int, type_: int, sum_: float, category: Optiona
         tg_id (int): Telegram ID пользователя.
         type_ (int): Тип транзакции (0 = доход, 1 = расход).
         sum_ (float): Сумма транзакции (положительное число).
-        category (Optional[str]): Категория транзакции, должна быть в users.categories или None.
+        category (Optional[str]): Категория транзакции, должна быть среди категорий пользователя или None.
         description (Optional[str]): Описание транзакции, может быть None.
         bot (Optional[Bot]): Экземпляр бота для отправки уведомлений о лимитах.
 
     возвращает:
         int: ID добавленной транзакции.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Сначала добавляем транзакцию
-        date_time = datetime.now().isoformat()
-        cursor = await db.execute(
-            "INSERT INTO transactions (tg_id, date_time, type, description, category, sum) VALUES (?, ?, ?, ?, ?, ?)",
-            (tg_id, date_time, type_, description, category, sum_)
-        )
-        await db.commit()
-        transaction_id = cursor.lastrowid
+    limit = None
+    row = (tg_id, to_epoch(datetime.now()), type_, description, category, to_minor(sum_))
+    if write_batchers:
+        # Вставка уходит в общую пачку своего шарда; ID приходит после commit всей пачки
+        transaction_id = await write_batchers[pool.index(tg_id)].submit(*row)
+    else:
+        async with pool.acquire(tg_id) as db:
+            transaction_id = await _insert_transaction(db, *row)
+            await db.commit()
+    # total_sum пересчитан триггером, кэшированная запись устарела
+    user_cache.invalidate(tg_id)
 
-        # Проверяем лимиты только для расходов
-        if type_ == 1 and category and bot:
+    # Проверяем лимиты только для расходов
+    if type_ == 1 and category and bot:
+        async with pool.read(tg_id) as db:
             # Получаем активный лимит для категории
             db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
+            today = _today()
+            cursor = await db.execute(ACTIVE_LIMIT_QUERY, (tg_id, category, today, today))
+            limit = await cursor.fetchone()
+
+    # Уведомления отправляем уже после возврата соединения в пул;
+    # spent уже учитывает новую транзакцию: его обновил триггер при вставке
+    if limit:
+        await notify_limit(bot, tg_id, category, limit)
+
+    return transaction_id
+
+
+async def import_transactions(tg_id: int, rows: List[Tuple[Any, int, float, Optional[str], Optional[str]]],
+                              statement: Optional[str] = None) -> Dict[str, int]:
+    """
+    Массовая вставка пачки транзакций пользователя (импорт выписки) одной транзакцией sqlite.
+
+    Строки вставляются через executemany при включенном признаке bulk_load, поэтому построчные
+    триггеры не трогают агрегаты; total_sum, daily_rollup, счетчики категорий и spent лимитов
+    пересчитываются один раз на пачку. Уведомления о лимитах не отправляются.
+
+    Аргументы:
+        tg_id (int): Telegram ID пользователя.
+        rows: Строки (date_time, type_, sum_, category, description): время - datetime или ISO-строка,
+            сумма в рублях. Категория сопоставляется с категориями пользователя без учета регистра,
+            неизвестная категория не проставляется.
+        statement (Optional[str]): Хэш файла выписки; если задан, счетчик загруженных строк выписки
+            (см. get_statement_import) увеличивается в той же транзакции, что и вставка пачки.
+
+    Возвращает:
+        Dict[str, int]: Количество вставленных строк (imported) и строк без категории (uncategorized).
+    """
+    async with pool.acquire(tg_id) as db:
+        cursor = await db.execute("SELECT name, category_id FROM categories WHERE tg_id = ?", (tg_id,))
+        category_ids = {name.lower(): category_id for name, category_id in await cursor.fetchall()}
+
+        values = []
+        uncategorized = 0
+        for date_time, type_, sum_, category, description in rows:
+            category_id = category_ids.get(category.lower()) if category else None
+            if category_id is None:
+                uncategorized += 1
+            values.append((tg_id, to_epoch(date_time), type_, description, category_id, to_minor(sum_)))
+
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute("INSERT INTO bulk_load (tg_id) VALUES (?)", (tg_id,))
+        # Пока держим блокировку записи, новые строки получают ID больше текущего максимума
+        cursor = await db.execute("SELECT COALESCE(MAX(transaction_id), 0) FROM transactions")
+        last_id = (await cursor.fetchone())[0]
+        await db.executemany(
+            "INSERT INTO transactions (tg_id, date_time, type, description, category_id, sum) VALUES (?, ?, ?, ?, ?, ?)",
+            values
+        )
+
+        # Агрегаты по всей пачке вместо построчных триггеров
+        await db.execute(
+            """
+            UPDATE users
+            SET total_sum = total_sum + (
+                SELECT COALESCE(SUM(CASE type WHEN 0 THEN sum ELSE -sum END), 0)
+                FROM transactions WHERE transaction_id > ?
+            )
+            WHERE tg_id = ?
+            """,
+            (last_id, tg_id)
+        )
+        await db.execute(
+            """
+            INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+            SELECT tg_id, day, COALESCE(category_id, 0), type, SUM(sum), COUNT(*)
+            FROM transactions
+            WHERE transaction_id > ?
+            GROUP BY tg_id, day, COALESCE(category_id, 0), type
+            ON CONFLICT (tg_id, day, category_id, type) DO UPDATE
+            SET total = total + excluded.total,
+                count = count + excluded.count
+            """,
+            (last_id,)
+        )
+        await db.execute(
+            """
+            UPDATE categories
+            SET transaction_count = transaction_count + (
+                SELECT COUNT(*) FROM transactions
+                WHERE transaction_id > ? AND category_id = categories.category_id
+            )
+            WHERE tg_id = ?
+            """,
+            (last_id, tg_id)
+        )
+        # Остатки на конец месяца: пачка выписки обычно задним числом, пересчитываем пользователя целиком
+        await rebuild_checkpoints(db, tg_id)
+        await db.execute(
+            """
+            UPDATE limits
+            SET spent = (
+                SELECT COALESCE(SUM(r.total), 0)
+                FROM daily_rollup r
+                WHERE r.tg_id = limits.tg_id
+                AND r.category_id = limits.category_id
+                AND r.type = 1
+                AND r.day >= limits.start_date AND r.day <= limits.end_date
+            )
+            WHERE tg_id = ?
+            """,
+            (tg_id,)
+        )
+        if statement:
+            await db.execute(
                 """
-                SELECT * FROM limits 
-                WHERE tg_id = ? 
-                AND category = ? 
-                AND date('now') BETWEEN date(start_date) AND date(end_date)
+                INSERT INTO statement_imports (tg_id, file_hash, imported) VALUES (?, ?, ?)
+                ON CONFLICT (tg_id, file_hash) DO UPDATE SET imported = imported + excluded.imported
                 """,
-                (tg_id, category)
+                (tg_id, statement, len(values))
             )
-            limit = await cursor.fetchone()
+        await db.execute("DELETE FROM bulk_load")
+        await db.commit()
+    user_cache.invalidate(tg_id)
+    return {"imported": len(values), "uncategorized": uncategorized}
 
-            if limit:
-                # Получаем сумму расходов за период лимита
-                cursor = await db.execute(
-                    """
-                    SELECT COALESCE(SUM(sum), 0) as total
-                    FROM transactions
-                    WHERE tg_id = ? 
-                    AND category = ?
-                    AND type = 1
-                    AND date(date_time) BETWEEN date(?) AND date(?)
-                    """,
-                    (tg_id, category, limit['start_date'], limit['end_date'])
-                )
-                current_spent = float((await cursor.fetchone())[0])
-                limit_sum = float(limit['limit_sum'])
-                
-                # Проверяем превышение лимита
-                if current_spent > limit_sum:
-                    over_limit = current_spent - limit_sum
-                    # Отправляем уведомление о превышении лимита
-                    await bot.send_message(
-                        tg_id,
-                        f"🚨 <b>Внимание! Превышен лимит расходов!</b>\n\n"
-                        f"Категория: {category}\n"
-                        f"Установленный лимит: {limit_sum:,.2f}₽\n"
-                        f"Текущие расходы: {current_spent:,.2f}₽\n"
-                        f"Превышение: {over_limit:,.2f}₽\n"
-                        f"Период: {limit['start_date']} - {limit['end_date']}",
-                        parse_mode="HTML"
-                    )
-                elif (current_spent / limit_sum) >= 0.9:  # 90% и более
-                    remaining = limit_sum - current_spent
-                    # Отправляем уведомление о приближении к лимиту
-                    await bot.send_message(
-                        tg_id,
-                        f"⚠️ <b>Внимание! Вы приближаетесь к лимиту расходов!</b>\n\n"
-                        f"Категория: {category}\n"
-                        f"Установленный лимит: {limit_sum:,.2f}₽\n"
-                        f"Текущие расходы: {current_spent:,.2f}₽\n"
-                        f"Остаток: {remaining:,.2f}₽\n"
-                        f"Использовано: {(current_spent / limit_sum * 100):.1f}%\n"
-                        f"Период: {limit['start_date']} - {limit['end_date']}",
-                        parse_mode="HTML"
-                    )
-
-        return transaction_id
-
-
-async def get_transactions(tg_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+
+async def get_statement_import(tg_id: int, statement: str) -> Optional[Dict[str, int]]:
     """
-    получение списка последних транзакций пользователя.
+    ход импорта выписки пользователя.
 
     аргументы:
         tg_id (int): Telegram ID пользователя.
-        limit (int): Максимальное количество возвращаемых транзакций (по умолчанию 10).
+        statement (str): Хэш файла выписки, переданный в import_transactions.
 
     возвращает:
-        List[Dict[str, Any]]: Список словарей с данными о транзакциях.
+        Optional[Dict[str, int]]: Количество уже загруженных строк выписки (imported) и признак
+            завершенного импорта (done) или None, если выписка еще не загружалась.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.read(tg_id) as db:
         cursor = await db.execute(
-            "SELECT transaction_id, date_time, type, description, category, sum "
-            "FROM transactions WHERE tg_id = ? ORDER BY date_time DESC LIMIT ?",
-            (tg_id, limit)
+            "SELECT imported, done FROM statement_imports WHERE tg_id = ? AND file_hash = ?",
+            (tg_id, statement)
         )
+        row = await cursor.fetchone()
+    return {"imported": row[0], "done": bool(row[1])} if row else None
+
+
+async def finish_statement_import(tg_id: int, statement: str) -> None:
+    """
+    отметка о полностью загруженной выписке: повторная отправка того же файла не импортирует его заново.
+
+    аргументы:
+        tg_id (int): Telegram ID пользователя.
+        statement (str): Хэш файла выписки, переданный в import_transactions.
+    """
+    async with pool.acquire(tg_id) as db:
+        await db.execute(
+            """
+            INSERT INTO statement_imports (tg_id, file_hash, done) VALUES (?, ?, 1)
+            ON CONFLICT (tg_id, file_hash) DO UPDATE SET done = 1
+            """,
+            (tg_id, statement)
+        )
+        await db.commit()
+
+
+async def get_transactions(tg_id: int, limit: int = 10) -> List[Transaction]:
+    """
+    получение списка последних транзакций пользователя.
+
+    аргументы:
+        tg_id (int): Telegram ID пользователя.
+        limit (int): Максимальное количество возвращаемых транзакций (по умолчанию 10).
+
+    возвращает:
+        List[Transaction]: Список транзакций (поля доступны и как t["sum"], и как t.sum).
+    """
+    async with pool.read(tg_id) as db:
+        boundary = await _archive_boundary(db)
+        db.row_factory = transaction_factory
+        params = {"tg_id": tg_id, "limit": limit, "archived_before": boundary}
+        cursor = await db.execute(transactions_query("t.tg_id = :tg_id", "DESC", None, limit=True), params)
         rows = await cursor.fetchall()
-        return [
-            {
-                "transaction_id": row[0],
-                "date_time": row[1],
-                "type": row[2],
-                "description": row[3],
-                "category": row[4],
-                "sum": row[5]
-            }
-            for row in rows
-        ]
+        # Архив нужен, только если последних транзакций в основной таблице не хватило
+        if boundary is not None and (len(rows) < limit or to_epoch(rows[-1].date_time) < boundary):
+            cursor = await db.execute(transactions_query("t.tg_id = :tg_id", "DESC", boundary, limit=True), params)
+            rows = await cursor.fetchall()
+        return rows
+
+
+async def iter_transactions(tg_id: int, chunk_size: int = 1000) -> AsyncIterator[List[Transaction]]:
+    """
+    Потоковое чтение всей истории транзакций пользователя порциями, от старых к новым.
+
+    Каждая порция - отдельный запрос по курсору (date_time, transaction_id) через индекс
+    idx_transactions_tg_id (и индекс архива, если часть истории перенесена туда), соединение
+    возвращается в пул между порциями. В памяти одновременно находится не больше chunk_size записей.
+
+    Аргументы:
+        tg_id (int): Telegram ID пользователя.
+        chunk_size (int): Количество транзакций в порции.
+    """
+    params = {"tg_id": tg_id, "limit": chunk_size, "after_time": None, "after_id": None}
+    while True:
+        async with pool.read(tg_id) as db:
+            boundary = await _archive_boundary(db)
+            params["archived_before"] = boundary
+            db.row_factory = transaction_factory
+            where = "t.tg_id = :tg_id"
+            if params["after_id"] is not None:
+                where += " AND (t.date_time, t.transaction_id) > (:after_time, :after_id)"
+            cursor = await db.execute(transactions_query(where, "ASC", boundary, limit=True), params)
+            chunk = await cursor.fetchall()
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        params["after_time"] = to_epoch(chunk[-1].date_time)
+        params["after_id"] = chunk[-1].transaction_id
 
 
 async def add_limit(tg_id: int, start_date: str, end_date: str, category: str, limit_sum: float) -> bool:
     """Добавление нового лимита для пользователя"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with pool.acquire(tg_id) as db:
+            category_id = await _category_id(db, tg_id, category)
+
             # Проверяем, нет ли уже активного лимита для этой категории
+            today = _today()
             cursor = await db.execute(
                 """
                 SELECT COUNT(*) FROM limits 
-                WHERE tg_id = ? 
-                AND category = ? 
-                AND date('now') BETWEEN date(start_date) AND date(end_date)
+                WHERE category_id = ? 
+                AND start_date <= ? AND end_date >= ?
                 """,
-                (tg_id, category)
+                (category_id, today, today)
             )
             count = (await cursor.fetchone())[0]
             if count > 0:
@@ -251,15 +725,15 @@ async def add_limit(tg_id: int, start_date: str, end_date: str, category: str, l
                     """
                     UPDATE limits 
                     SET limit_sum = ?, start_date = ?, end_date = ?
-                    WHERE tg_id = ? AND category = ? AND date('now') BETWEEN date(start_date) AND date(end_date)
+                    WHERE category_id = ? AND start_date <= ? AND end_date >= ?
                     """,
-                    (limit_sum, start_date, end_date, tg_id, category)
+                    (to_minor(limit_sum), start_date, end_date, category_id, today, today)
                 )
             else:
                 # Добавляем новый лимит
                 await db.execute(
-                    "INSERT INTO limits (tg_id, start_date, end_date, category, limit_sum) VALUES (?, ?, ?, ?, ?)",
-                    (tg_id, start_date, end_date, category, limit_sum)
+                    "INSERT INTO limits (tg_id, start_date, end_date, category_id, limit_sum) VALUES (?, ?, ?, ?, ?)",
+                    (tg_id, start_date, end_date, category_id, to_minor(limit_sum))
                 )
             
             await db.commit()
@@ -270,10 +744,15 @@ async def add_limit(tg_id: int, start_date: str, end_date: str, category: str, l
 
 async def get_user_limits(tg_id: int) -> list:
     """Получение всех активных лимитов пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.read(tg_id) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
-            "SELECT * FROM limits WHERE tg_id = ? AND end_date >= date('now')",
+            f"""
+            SELECT {LIMIT_COLUMNS}
+            FROM limits l
+            JOIN categories c ON c.category_id = l.category_id
+            WHERE l.tg_id = ? AND l.end_date >= date('now')
+            """,
             (tg_id,)
         )
         return [dict(row) for row in await cursor.fetchall()]
@@ -282,7 +761,7 @@ async def get_user_limits(tg_id: int) -> list:
 async def delete_limit(limit_id: int, tg_id: int) -> bool:
     """Удаление лимита по его ID"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with pool.acquire(tg_id) as db:
             await db.execute(
                 "DELETE FROM limits WHERE limit_id = ? AND tg_id = ?",
                 (limit_id, tg_id)
@@ -294,23 +773,20 @@ async def delete_limit(limit_id: int, tg_id: int) -> bool:
         return False
 
 
+async def _limit_usage(db: aiosqlite.Connection, tg_id: int, category: str, start_date: str, end_date: str) -> float:
+    """Сумма расходов по категории за период (границы включительно) на уже полученном соединении"""
+    cursor = await db.execute(
+        LIMIT_USAGE_QUERY,
+        (tg_id, category, start_date[:10], end_date[:10])
+    )
+    result = await cursor.fetchone()
+    return float(result[0])
+
+
 async def get_limit_usage(tg_id: int, category: str, start_date: str, end_date: str) -> float:
     """Получение суммы расходов по категории за период"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            """
-            SELECT COALESCE(SUM(sum), 0) as total
-            FROM transactions
-            WHERE tg_id = ? 
-            AND category = ?
-            AND type = 1
-            AND date(date_time) BETWEEN date(?) AND date(?)
-            """,
-            (tg_id, category, start_date, end_date)
-        )
-        result = await cursor.fetchone()
-        total = float(result[0])
-        return total
+    async with pool.read(tg_id) as db:
+        return await _limit_usage(db, tg_id, category, start_date, end_date)
 
 
 async def is_registered(tg_id: int) -> bool:
@@ -331,22 +807,29 @@ async def is_registered(tg_id: int) -> bool:
 
 async def add_category(tg_id: int, category: str) -> None:
     """
-    Добавление новой категории в список категорий пользователя.
+    Добавление новой категории в конец списка категорий пользователя.
 
     Аргументы:
         tg_id (int): Telegram ID пользователя.
         category (str): Название новой категории.
     """
-    user = await get_user(tg_id)
-    if not user:
-        raise ValueError("Пользователь не найден")
+    async with pool.acquire(tg_id) as db:
+        cursor = await db.execute("SELECT 1 FROM users WHERE tg_id = ?", (tg_id,))
+        if not await cursor.fetchone():
+            raise ValueError("Пользователь не найден")
 
-    categories = user["categories"]
-    if category not in categories:
-        categories.append(category)
-        await update_user(tg_id, categories=categories)
-    else:
-        raise ValueError("Категория уже существует")
+        try:
+            await db.execute(
+                """
+                INSERT INTO categories (tg_id, name, position)
+                VALUES (?, ?, (SELECT COALESCE(MAX(position) + 1, 0) FROM categories WHERE tg_id = ?))
+                """,
+                (tg_id, category, tg_id)
+            )
+        except aiosqlite.IntegrityError:
+            raise ValueError("Категория уже существует")
+        await db.commit()
+    user_cache.invalidate(tg_id)
 
 
 async def get_categories(tg_id: int) -> List[str]:
@@ -369,18 +852,22 @@ async def update_categories(tg_id: int, new_categories: List[str]) -> None:
     """
     Полное замещение списка категорий пользователя новым списком.
 
+    Транзакции удаленных категорий остаются без категории, лимиты по ним удаляются.
+
     Аргументы:
         tg_id (int): Telegram ID пользователя.
         new_categories (List[str]): Новый список категорий.
     """
-    user = await get_user(tg_id)
-    if not user:
-        raise ValueError("Пользователь не найден")
-    categories_json = json.dumps(new_categories, ensure_ascii=False)
-    await update_user(tg_id, categories=categories_json)
+    async with pool.acquire(tg_id) as db:
+        cursor = await db.execute("SELECT 1 FROM users WHERE tg_id = ?", (tg_id,))
+        if not await cursor.fetchone():
+            raise ValueError("Пользователь не найден")
+        await _replace_categories(db, tg_id, new_categories)
+        await db.commit()
+    user_cache.invalidate(tg_id)
 
 
-async def get_transactions_by_period(tg_id: int, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+async def get_transactions_by_period(tg_id: int, start_date: str, end_date: str) -> List[Transaction]:
     """
     Получение списка транзакций пользователя за указанный период.
 
@@ -390,29 +877,82 @@ async def get_transactions_by_period(tg_id: int, start_date: str, end_date: str)
         end_date (str): Конечная дата периода в формате ISO (например, "2023-10-31").
 
     Возвращает:
-        List[Dict[str, Any]]: Список словарей с данными о транзакциях.
-    """
-    async with aiosqlite.connect(DB_PATH) as db:
-        query = """
-            SELECT transaction_id, date_time, type, description, category, sum 
-            FROM transactions 
-            WHERE tg_id = ? AND date_time >= ? AND date_time < ? 
-            ORDER BY date_time DESC
-        """
-        cursor = await db.execute(query, (tg_id, start_date, end_date))
+        List[Transaction]: Список транзакций (поля доступны и как t["sum"], и как t.sum).
+    """
+    start, end = to_epoch(start_date), to_epoch(end_date)
+    async with pool.read(tg_id) as db:
+        boundary = await _archive_boundary(db)
+        db.row_factory = transaction_factory
+        # Архив подключается, только если период начинается раньше его границы
+        query = transactions_query(
+            "t.tg_id = :tg_id AND t.date_time >= :start AND t.date_time < :end",
+            "DESC",
+            boundary if boundary is not None and start < boundary else None
+        )
+        cursor = await db.execute(query, {"tg_id": tg_id, "start": start, "end": end, "archived_before": boundary})
+        return await cursor.fetchall()
+
+
+async def get_period_totals(tg_id: int, start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    Получение итогов за период по дневным итогам daily_rollup, без чтения самих транзакций.
+
+    Аргументы:
+        tg_id (int): Telegram ID пользователя.
+        start_date (str): Начальная дата периода в формате ISO (включительно).
+        end_date (str): Конечная дата периода в формате ISO (не включительно), как в get_transactions_by_period.
+
+    Возвращает:
+        Dict[str, Any]: Доход (income), расход (expenses) и расходы по категориям (expenses_by_category,
+        ключ None - расходы без категории), категории упорядочены по убыванию суммы.
+    """
+    async with pool.read(tg_id) as db:
+        cursor = await db.execute(
+            """
+            SELECT c.name, r.type, SUM(r.total)
+            FROM daily_rollup r
+            LEFT JOIN categories c ON c.category_id = r.category_id
+            WHERE r.tg_id = ? AND r.day >= ? AND r.day < ?
+            GROUP BY r.category_id, r.type
+            ORDER BY SUM(r.total) DESC
+            """,
+            (tg_id, start_date[:10], end_date[:10])
+        )
         rows = await cursor.fetchall()
-        result = [
-            {
-                "transaction_id": row[0],
-                "date_time": row[1],
-                "type": row[2],
-                "description": row[3],
-                "category": row[4],
-                "sum": row[5]
-            }
-            for row in rows
-        ]
-        return result
+
+    # Складываем копейки и переводим в рубли в конце, чтобы итоги были точными
+    income = expenses = 0
+    expenses_by_category = {}
+    for category, type_, total in rows:
+        if type_ == 0:
+            income += total
+        else:
+            expenses += total
+            expenses_by_category[category or None] = from_minor(total)
+    return {"income": from_minor(income), "expenses": from_minor(expenses), "expenses_by_category": expenses_by_category}
+
+
+async def get_balance(tg_id: int, end_date: str) -> float:
+    """
+    Получение баланса по всем транзакциям пользователя до указанной даты.
+
+    Баланс берется из остатка на конец предыдущего месяца (balance_checkpoints) и итогов
+    текущего месяца, поэтому время запроса не зависит от длины истории.
+
+    Аргументы:
+        tg_id (int): Telegram ID пользователя.
+        end_date (str): Дата в формате ISO (не включительно).
+
+    Возвращает:
+        float: Сумма доходов минус сумма расходов до end_date.
+    """
+    end = end_date[:10]
+    async with pool.read(tg_id) as db:
+        cursor = await db.execute(
+            BALANCE_QUERY,
+            {"tg_id": tg_id, "month": end[:7], "month_start": end[:7] + "-01", "end": end}
+        )
+        return from_minor((await cursor.fetchone())[0])
 
 
 async def check_limit_violation(tg_id: int, category: str, amount: float) -> Optional[Dict[str, Any]]:
@@ -425,39 +965,20 @@ async def check_limit_violation(tg_id: int, category: str, amount: float) -> Opt
         - status: "violated" если лимит превышен
         - status: "approaching" если использовано более 90% лимита
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.read(tg_id) as db:
         db.row_factory = aiosqlite.Row
         
         # Получаем текущую дату в формате YYYY-MM-DD
-        current_date = datetime.now().strftime("%Y-%m-%d")
+        current_date = _today()
         
-        cursor = await db.execute(
-            """
-            SELECT * FROM limits 
-            WHERE tg_id = ? 
-            AND category = ? 
-            AND date(?) BETWEEN date(start_date) AND date(end_date)
-            """,
-            (tg_id, category, current_date)
-        )
+        cursor = await db.execute(ACTIVE_LIMIT_QUERY, (tg_id, category, current_date, current_date))
         limit = await cursor.fetchone()
         
         if not limit:
             return None
             
-        # Получаем сумму расходов за период лимита
-        cursor = await db.execute(
-            """
-            SELECT COALESCE(SUM(sum), 0) as total
-            FROM transactions
-            WHERE tg_id = ? 
-            AND category = ?
-            AND type = 1
-            AND date(date_time) BETWEEN date(?) AND date(?)
-            """,
-            (tg_id, category, limit["start_date"], limit["end_date"])
-        )
-        current_spent = float((await cursor.fetchone())[0])
+        # Расходы за период лимита поддерживаются триггерами в limits.spent
+        current_spent = float(limit["spent"])
         
         # Проверяем, не будет ли превышен лимит после новой транзакции
         new_total = current_spent + amount
@@ -496,164 +1017,158 @@ async def check_limit_violation(tg_id: int, category: str, amount: float) -> Opt
 async def get_expiring_limits() -> List[Dict[str, Any]]:
     """
     Получение списка лимитов, которые истекают завтра.
+
+    Запрос выполняется на всех шардах одновременно, результаты объединяются.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT l.*, u.tg_username 
-            FROM limits l
-            JOIN users u ON l.tg_id = u.tg_id
-            WHERE l.end_date = date('now', '+1 day')
-            """
-        )
-        return [dict(row) for row in await cursor.fetchall()]
+    async def shard_limits(shard: ConnectionPool) -> List[Dict[str, Any]]:
+        async with shard.acquire() as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(EXPIRING_LIMITS_QUERY)
+            return [dict(row) for row in await cursor.fetchall()]
+
+    return [limit for limits in await pool.fan_out(shard_limits, pool.readers) for limit in limits]
+
+
+async def iter_violated_limits() -> AsyncIterator[Dict[str, Any]]:
+    """
+    Потоковая выдача нарушенных лимитов (где текущие расходы превышают установленный лимит).
+
+    Нарушенные лимиты отбираются по limits.spent прямо в запросе, порциями по VIOLATED_LIMITS_CHUNK.
+    Соединение берется на время чтения одной порции и возвращается в пул до выдачи строк, поэтому
+    медленный потребитель (рассылка уведомлений) не держит транзакцию чтения и снимок WAL.
+    Шарды читаются одновременно, строки выдаются по мере готовности (см. merge_streams).
+    """
+    today = _today()
+
+    async def shard_limits(shard: ConnectionPool) -> AsyncIterator[Dict[str, Any]]:
+        after_id = 0
+        while True:
+            async with shard.acquire() as db:
+                db.row_factory = aiosqlite.Row
+                cursor = await db.execute(
+                    VIOLATED_LIMITS_QUERY,
+                    {"today": today, "after_id": after_id, "chunk_size": VIOLATED_LIMITS_CHUNK}
+                )
+                rows = [dict(row) for row in await cursor.fetchall()]
+            for row in rows:
+                yield row
+            if len(rows) < VIOLATED_LIMITS_CHUNK:
+                return
+            after_id = rows[-1]["limit_id"]
+
+    async for limit in merge_streams(shard_limits(shard) for shard in pool.readers):
+        yield limit
+
+
+async def archive_transactions(days: int = DB_ARCHIVE_AFTER_DAYS) -> int:
+    """
+    перенос транзакций старше days дней (до начала месяца) в архивы всех шардов.
+
+    перенос идет порциями через пишущее соединение шарда, между порциями записи пользователей
+    успевают его получить. итоги и балансы не меняются (см. archive.py).
+
+    возвращает:
+        int: Количество перенесенных транзакций; 0, если архивирование выключено.
+    """
+    if days <= 0 or DB_ARCHIVE_AFTER_DAYS <= 0:
+        return 0
+    before = archive_boundary(days)
+    moved = 0
+    for shard in pool.pools:
+        moved += await archive_shard(shard, before)
+    logger.info("Archived %d transactions older than %s", moved, before)
+    return moved
+
+
+async def backup_storage() -> List[str]:
+    """
+    резервная копия всех файлов базы: шардов и их архивов (см. backup.py).
+
+    копии снимаются по очереди без остановки бота: записи пользователей идут как обычно.
+
+    возвращает:
+        List[str]: Пути к сжатым снимкам.
+    """
+    paths = []
+    for shard in pool.pools:
+        paths.append(shard.path)
+        paths.extend(shard.attach.values())
+    return await backup_files(paths, DB_BACKUP_DIR, DB_BACKUP_KEEP)
 
 
 async def get_violated_limits() -> List[Dict[str, Any]]:
     """
     Получение списка нарушенных лимитов (где текущие расходы превышают установленный лимит).
     """
-    violated_limits = []
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT l.*, u.tg_username 
-            FROM limits l
-            JOIN users u ON l.tg_id = u.tg_id
-            WHERE date('now') BETWEEN l.start_date AND l.end_date
-            """
-        )
-        active_limits = await cursor.fetchall()
-        
-        for limit in active_limits:
-            current_spent = await get_limit_usage(
-                limit["tg_id"],
-                limit["category"],
-                limit["start_date"],
-                limit["end_date"]
-            )
-            if current_spent > limit["limit_sum"]:
-                limit_dict = dict(limit)
-                limit_dict["current_spent"] = current_spent
-                violated_limits.append(limit_dict)
-                
-        return violated_limits
+    return [limit async for limit in iter_violated_limits()]
 
 
-async def get_transactions_by_category(tg_id: int, category: str, page: int = 0, items_per_page: int = 5) -> List[Dict[str, Any]]:
+async def get_transactions_by_category(
+    tg_id: int,
+    category: str,
+    items_per_page: int = 5,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None
+) -> TransactionPage:
     """
-    Получение списка транзакций пользователя по категории с поддержкой пагинации.
+    Получение страницы транзакций пользователя по категории, от новых к старым.
+
+    Постраничный вывод по курсору (date_time, transaction_id) вместо OFFSET: страница
+    берется поиском по индексу idx_transactions_category от граничной транзакции, поэтому
+    любая страница стоит столько же, сколько первая. Архив читается, только когда страница
+    до него доходит. Общее количество читается из счетчика categories.transaction_count,
+    который поддерживается триггерами и включает перенесенные в архив транзакции.
 
     Аргументы:
         tg_id (int): Telegram ID пользователя.
         category (str): Категория транзакций.
-        page (int): Номер страницы (начиная с 0).
         items_per_page (int): Количество элементов на странице.
+        after_id (Optional[int]): ID последней транзакции предыдущей страницы - следующая страница.
+        before_id (Optional[int]): ID первой транзакции следующей страницы - предыдущая страница.
+        Без курсора возвращается первая страница.
 
     Возвращает:
-        List[Dict[str, Any]]: Список словарей с данными о транзакциях и общее количество транзакций.
+        TransactionPage: Список транзакций страницы; общее количество в атрибуте total_count.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Получаем общее количество транзакций для этой категории
+    async with pool.read(tg_id) as db:
+        boundary = await _archive_boundary(db)
         cursor = await db.execute(
-            "SELECT COUNT(*) FROM transactions WHERE tg_id = ? AND category = ?",
+            "SELECT category_id, transaction_count FROM categories WHERE tg_id = ? AND name = ?",
             (tg_id, category)
         )
-        total_count = (await cursor.fetchone())[0]
-
-        # Получаем транзакции с пагинацией
-        offset = page * items_per_page
-        cursor = await db.execute(
-            """
-            SELECT transaction_id, date_time, type, description, category, sum 
-            FROM transactions 
-            WHERE tg_id = ? AND category = ? 
-            ORDER BY date_time DESC
-            LIMIT ? OFFSET ?
-            """,
-            (tg_id, category, items_per_page, offset)
-        )
+        row = await cursor.fetchone()
+        if not row:
+            return TransactionPage([], 0)
+        category_id, total_count = row
+
+        # Граница страницы сравнивается как пара (date_time, transaction_id), чтобы
+        # транзакции с одинаковым временем не терялись и не повторялись
+        where = "t.category_id = :category_id"
+        params = {"category_id": category_id, "limit": items_per_page, "archived_before": boundary}
+        if after_id is not None:
+            where += " AND (t.date_time, t.transaction_id) < (:key_time, :key_id)"
+            order = "DESC"
+            params["key_time"], params["key_id"] = await _page_key(db, after_id, boundary)
+        elif before_id is not None:
+            where += " AND (t.date_time, t.transaction_id) > (:key_time, :key_id)"
+            order = "ASC"
+            params["key_time"], params["key_id"] = await _page_key(db, before_id, boundary)
+        else:
+            order = "DESC"
+
+        db.row_factory = transaction_factory
+        cursor = await db.execute(transactions_query(where, order, None, limit=True), params)
         rows = await cursor.fetchall()
-        transactions = [
-            {
-                "transaction_id": row[0],
-                "date_time": row[1],
-                "type": row[2],
-                "description": row[3],
-                "category": row[4],
-                "sum": row[5],
-                "total_count": total_count
-            }
-            for row in rows
-        ]
-        return transactions
-
-
-async def check_limit(tg_id: int, category: str, bot: Bot) -> None:
-    """
-    Проверка лимитов после добавления транзакции и отправка уведомлений.
-    
-    Аргументы:
-        tg_id (int): Telegram ID пользователя
-        category (str): Категория транзакции
-        bot (Bot): Экземпляр бота для отправки сообщений
-    """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        
-        # Получаем активный лимит для категории
-        cursor = await db.execute(
-            """
-            SELECT * FROM limits 
-            WHERE tg_id = ? 
-            AND category = ? 
-            AND date('now') BETWEEN start_date AND end_date
-            """,
-            (tg_id, category)
-        )
-        limit = await cursor.fetchone()
-        
-        if not limit:
-            return  # Нет активного лимита для этой категории
-            
-        # Получаем сумму расходов за период лимита
-        current_spent = await get_limit_usage(
-            tg_id, 
-            category, 
-            limit["start_date"], 
-            limit["end_date"]
-        )
-        
-        limit_sum = limit["limit_sum"]
-        usage_percent = (current_spent / limit_sum) * 100
-        
-        # Формируем сообщения в зависимости от процента использования
-        if current_spent > limit_sum:
-            # Лимит превышен
-            over_limit = current_spent - limit_sum
-            await bot.send_message(
-                tg_id,
-                f"🚨 <b>Внимание! Превышен лимит расходов!</b>\n\n"
-                f"Категория: {category}\n"
-                f"Установленный лимит: {limit_sum:,.2f}₽\n"
-                f"Текущие расходы: {current_spent:,.2f}₽\n"
-                f"Превышение: {over_limit:,.2f}₽\n"
-                f"Период: с {limit['start_date']} по {limit['end_date']}",
-                parse_mode="HTML"
-            )
-        elif usage_percent >= 90:
-            # Приближаемся к лимиту (90% и более)
-            remaining = limit_sum - current_spent
-            await bot.send_message(
-                tg_id,
-                f"⚠️ <b>Внимание! Вы приближаетесь к лимиту расходов!</b>\n\n"
-                f"Категория: {category}\n"
-                f"Установленный лимит: {limit_sum:,.2f}₽\n"
-                f"Текущие расходы: {current_spent:,.2f}₽\n"
-                f"Остаток: {remaining:,.2f}₽\n"
-                f"Использовано: {usage_percent:.1f}%\n"
-                f"Период: с {limit['start_date']} по {limit['end_date']}",
-                parse_mode="HTML"
-            )
+        if boundary is not None:
+            # Страница доходит до архива: к старым - если основной таблицы не хватило,
+            # к новым - если граничная транзакция старше границы архива
+            if order == "DESC":
+                reaches_back = len(rows) < items_per_page or to_epoch(rows[-1].date_time) < boundary
+            else:
+                reaches_back = params["key_time"] is not None and params["key_time"] < boundary
+            if reaches_back:
+                cursor = await db.execute(transactions_query(where, order, boundary, limit=True), params)
+                rows = await cursor.fetchall()
+        if order == "ASC":
+            rows.reverse()
+        return TransactionPage(rows, total_count)
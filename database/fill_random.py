@@ -1,168 +1,249 @@
-"""Скрипт для заполнения базы данных тестовыми данными с сохранением существующих данных"""
+"""генератор синтетических данных для нагрузочных тестов: пользователи, категории, лимиты и транзакции
 
-import aiosqlite
+Запуск: python -m database.fill_random [--users 1000] [--transactions 1000] [--months 24] [--seed 42]
+Пишет в хранилище из настроек (STORAGE_BACKEND, DB_PATH, DB_SHARDS) через те же методы, что и бот:
+пользователи регистрируются, транзакции загружаются пачками через import_transactions (executemany
+в одной транзакции sqlite на пачку, агрегаты пересчитываются один раз на пачку).
+
+Данные похожи на настоящие: у каждого пользователя свой набор категорий и свой уровень трат,
+траты чаще в выходные и в декабре, подарки - к праздникам, путешествия - летом, зарплата
+приходит 5 и 20 числа. С одним и тем же --seed получается одна и та же база.
+Пользователи получают tg_id начиная с --first-id; уже зарегистрированные ID не перезаписываются.
+"""
+
+import argparse
 import asyncio
-import json
+import calendar
 import random
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-
-# Конфигурация
-DB_PATH = "data.db"  # База данных находится в той же директории, что и скрипт
-TG_ID = 294057781  # ID пользователя для тестовых данных
-
-# Настройки генерации данных
-NUM_TRANSACTIONS = 25  # Сколько транзакций генерировать
-MIN_AMOUNT = 100  # Минимальная сумма транзакции
-MAX_AMOUNT = 10000  # Максимальная сумма транзакции
-DAYS_BACK = 60  # За сколько дней генерировать транзакции
-
-# Пул возможных категорий для добавления
-AVAILABLE_CATEGORIES = [
-    "продукты", "кафе", "транспорт", "такси", "развлечения",
-    "одежда", "техника", "здоровье", "спорт", "подарки",
-    "путешествия", "образование", "дом", "красота", "хобби"
-]
-
-async def get_user_data(db: aiosqlite.Connection, tg_id: int) -> Optional[Dict]:
-    """Получение данных пользователя из БД"""
-    async with db.execute(
-        "SELECT tg_id, categories, name, total_sum FROM users WHERE tg_id = ?",
-        (tg_id,)
-    ) as cursor:
-        row = await cursor.fetchone()
-        if row:
-            return {
-                "tg_id": row[0],
-                "categories": json.loads(row[1]) if row[1] else [],
-                "name": row[2],
-                "total_sum": row[3] or 0.0
-            }
-        return None
-
-async def update_user_categories(
-    db: aiosqlite.Connection,
-    tg_id: int,
-    current_categories: List[str]
-) -> List[str]:
-    """Обновление категорий пользователя, добавление новых случайных категорий"""
-    # Находим категории, которых еще нет у пользователя
-    new_categories = [cat for cat in AVAILABLE_CATEGORIES if cat not in current_categories]
-    
-    if new_categories:
-        # Добавляем от 2 до 4 новых случайных категорий
-        num_new_categories = min(random.randint(2, 4), len(new_categories))
-        selected_new_categories = random.sample(new_categories, num_new_categories)
-        
-        # Объединяем текущие и новые категории
-        updated_categories = current_categories + selected_new_categories
-
-        # Сохраняем обновленный список категорий в БД
-        categories_json = json.dumps(updated_categories, ensure_ascii=False)
-        await db.execute(
-            "UPDATE users SET categories = ? WHERE tg_id = ?",
-            (categories_json, tg_id)
-        )
-        await db.commit()
-
-        print(f"Добавлены новые категории: {selected_new_categories}")
-        return updated_categories
-    
-    print("Новые категории не добавлены")
-    return current_categories
-
-async def generate_random_transactions(
-    db: aiosqlite.Connection,
-    tg_id: int,
-    categories: List[str],
-    num_transactions: int
-) -> None:
-    """Генерация случайных транзакций"""
-    # Определяем временной период
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=DAYS_BACK)
-        time_delta = end_date - start_date
-
-    # Счетчики для статистики
-    added_transactions = 0
-    total_income = 0
-    total_expenses = 0
-    
-    for i in range(num_transactions):
-        try:
-            # Генерируем случайную дату
-            random_seconds = random.randint(0, int(time_delta.total_seconds()))
-            transaction_date = start_date + timedelta(seconds=random_seconds)
-            date_time = transaction_date.strftime("%Y-%m-%d %H:%M:%S")
-
-            # Генерируем данные транзакции
-            trans_type = random.randint(0, 1)  # 0=доход, 1=расход
-            amount = round(random.uniform(MIN_AMOUNT, MAX_AMOUNT), 2)
-            
-            # Для расходов указываем категорию, для доходов - нет
-            category = random.choice(categories) if trans_type == 1 else None
-            description = (
-                f"Тестовый доход {i+1}" if trans_type == 0
-                else f"Тестовый расход {i+1} - {category}"
-            )
-            
-            # Добавляем транзакцию
-            await db.execute("""
-                INSERT INTO transactions (tg_id, date_time, type, description, category, sum)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (tg_id, date_time, trans_type, description, category, amount))
-            
-            # Обновляем счетчики
-            added_transactions += 1
-            if trans_type == 0:
-                total_income += amount
-            else:
-                total_expenses += amount
-                
-            print(f"Добавлена транзакция: тип={'доход' if trans_type == 0 else 'расход'}, "
-                  f"сумма={amount:.2f}, категория={category or 'нет'}, дата={date_time}")
-            
-        except Exception as e:
-            print(f"Ошибка при добавлении транзакции {i+1}: {str(e)}")
-            continue
-
-        await db.commit()
-    
-    # Выводим итоговую статистику
-    print(f"\nИтоги генерации данных:")
-    print(f"Добавлено транзакций: {added_transactions}")
-    print(f"Общий доход: {total_income:.2f} руб.")
-    print(f"Общие расходы: {total_expenses:.2f} руб.")
-    print(f"Баланс за период: {(total_income - total_expenses):.2f} руб.")
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from database.storage import (
+    add_limit, add_user, close_storage, import_transactions, is_registered, open_storage, update_user
+)
+
+
+class CategoryProfile(NamedTuple):
+    """Модель трат по категории."""
+    weight: float  # Доля трат по числу покупок
+    median: float  # Типичная сумма покупки, руб.
+    spread: float  # Разброс суммы (sigma логнормального распределения)
+    weekend: float  # Во сколько раз чаще покупки в выходные
+    months: Dict[int, float] = {}  # Сезонные множители частоты по номеру месяца
+
+
+CATEGORIES: Dict[str, CategoryProfile] = {
+    "продукты": CategoryProfile(30, 900, 0.6, 1.3),
+    "кафе": CategoryProfile(12, 650, 0.5, 1.8),
+    "транспорт": CategoryProfile(14, 70, 0.4, 0.6),
+    "такси": CategoryProfile(6, 450, 0.5, 1.5),
+    "развлечения": CategoryProfile(5, 1200, 0.7, 2.2, {12: 1.5}),
+    "одежда": CategoryProfile(3, 3500, 0.8, 1.6, {3: 1.5, 9: 1.5, 11: 1.8, 12: 1.4}),
+    "техника": CategoryProfile(1, 12000, 1.0, 1.4, {11: 2.5, 12: 1.5}),
+    "здоровье": CategoryProfile(3, 1500, 0.8, 0.8, {1: 1.3, 2: 1.3}),
+    "спорт": CategoryProfile(2, 2500, 0.6, 1.2, {1: 1.8, 9: 1.3}),
+    "подарки": CategoryProfile(2, 2500, 0.8, 1.3, {12: 4.0, 2: 2.0, 3: 2.0}),
+    "путешествия": CategoryProfile(1, 25000, 0.9, 1.5, {6: 3.0, 7: 4.0, 8: 3.0, 1: 1.5}),
+    "образование": CategoryProfile(1, 8000, 0.7, 0.7, {9: 3.5, 10: 1.5}),
+    "дом": CategoryProfile(4, 2000, 0.9, 1.5, {4: 1.3, 5: 1.3}),
+    "красота": CategoryProfile(2, 2000, 0.6, 1.2, {3: 1.3, 12: 1.3}),
+    "хобби": CategoryProfile(2, 1500, 0.8, 1.6),
+}
+BASIC_CATEGORIES = ["продукты", "кафе", "транспорт"]  # Есть почти у всех
+
+# Общая активность по месяцам (январь - декабрь) и дням недели (понедельник - воскресенье)
+MONTH_FACTORS = [0.85, 0.85, 0.95, 1.0, 1.05, 1.1, 1.15, 1.1, 1.0, 1.0, 1.05, 1.45]
+WEEKDAY_FACTORS = [0.9, 0.9, 0.95, 1.0, 1.2, 1.35, 1.1]
+# Час покупки: с 7 до 23, чаще в обед и вечером
+HOURS = list(range(7, 24))
+HOUR_WEIGHTS = [2, 4, 4, 3, 4, 6, 6, 4, 4, 5, 7, 8, 8, 6, 4, 3, 2]
+
+SALARY_DAYS = (5, 20)
+LIMITS_PER_USER = (0, 3)  # Сколько лимитов на текущий месяц (от и до)
+BATCH_SIZE = 5000  # Транзакций в одной пачке import_transactions
+
+
+def _month_start(end: date, months: int) -> date:
+    """Первое число месяца, с которого months месяцев заканчиваются месяцем end."""
+    index = end.year * 12 + end.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _months(start: date, end: date) -> List[date]:
+    """Первые числа месяцев от start до end включительно."""
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+class Generator:
+    """
+    генерация данных одного пользователя за период.
+
+    дни и категории выбираются по накопленным весам (random.choices с cum_weights), таблицы весов
+    считаются один раз на пользователя, поэтому выбор строки - несколько обращений к random.
+    """
+
+    def __init__(self, rng: random.Random, end: date, months: int) -> None:
+        self.rng = rng
+        self.end = end
+        self.start = _month_start(end, months)
+        self.days = [self.start + timedelta(days=i) for i in range((end - self.start).days + 1)]
+        self.day_weights = list(accumulate(
+            MONTH_FACTORS[day.month - 1] * WEEKDAY_FACTORS[day.weekday()] for day in self.days
+        ))
+        self.hour_weights = list(accumulate(HOUR_WEIGHTS))
+
+    def categories(self) -> List[str]:
+        """Набор категорий пользователя: основные и от 3 до 9 случайных, в порядке популярности."""
+        rng = self.rng
+        names = [name for name in BASIC_CATEGORIES if rng.random() < 0.9]
+        extra = [name for name in CATEGORIES if name not in names]
+        names += rng.sample(extra, rng.randint(3, min(9, len(extra))))
+        return sorted(names, key=lambda name: -CATEGORIES[name].weight)
+
+    def _category_tables(self, names: List[str]) -> Dict[Tuple[int, bool], List[float]]:
+        """Накопленные веса категорий пользователя по (месяц, выходной)."""
+        # Личные предпочтения: одна и та же категория у разных людей весит по-разному
+        taste = {name: CATEGORIES[name].weight * self.rng.uniform(0.5, 1.5) for name in names}
+        return {
+            (month, weekend): list(accumulate(
+                taste[name] * CATEGORIES[name].months.get(month, 1.0) * (CATEGORIES[name].weekend if weekend else 1.0)
+                for name in names
+            ))
+            for month in range(1, 13) for weekend in (False, True)
+        }
+
+    def transactions(self, names: List[str], count: int) -> List[Tuple[datetime, int, float, Optional[str], Optional[str]]]:
+        """
+        транзакции пользователя в виде строк import_transactions: (время, тип, сумма, категория, описание).
+
+        расходы распределены по дням с учетом сезона и дня недели; доход - зарплата дважды в месяц,
+        в сумме немного больше расходов месяца, чтобы баланс был правдоподобным.
+        """
+        rng = self.rng
+        months = _months(self.start, self.end)
+        salaries = [month.replace(day=day) for month in months for day in SALARY_DAYS
+                    if month.replace(day=day) <= self.end]
+        expenses = max(count - len(salaries), 0)
+        salaries = salaries[:count]
+
+        level = rng.lognormvariate(0, 0.4)  # Уровень трат пользователя относительно типичного
+        tables = self._category_tables(names)
+        # Дни выбираются сразу для всех расходов, категории - сразу для всех дней с одинаковой таблицей весов
+        by_table: Dict[Tuple[int, bool], List[date]] = {}
+        for day in rng.choices(self.days, cum_weights=self.day_weights, k=expenses):
+            by_table.setdefault((day.month, day.weekday() >= 5), []).append(day)
+        hours = iter(rng.choices(HOURS, cum_weights=self.hour_weights, k=expenses))
+        rows = []
+        spent: Dict[Tuple[int, int], float] = {}
+        for key, days in by_table.items():
+            for day, name in zip(days, rng.choices(names, cum_weights=tables[key], k=len(days))):
+                profile = CATEGORIES[name]
+                amount = round(max(profile.median * level * rng.lognormvariate(0, profile.spread), 10), 2)
+                second = rng.randrange(3600)
+                moment = datetime(day.year, day.month, day.day, next(hours), second // 60, second % 60)
+                rows.append((moment, 1, amount, name, None))
+                month = (day.year, day.month)
+                spent[month] = spent.get(month, 0) + amount
+
+        # Месяц без трат (мало транзакций на пользователя) получает среднюю зарплату
+        average = sum(spent.values()) / max(len(spent), 1)
+        for day in salaries:
+            amount = spent.get((day.year, day.month), average) / len(SALARY_DAYS) * rng.uniform(1.0, 1.25)
+            moment = datetime(day.year, day.month, day.day, 10, 0, 0)
+            rows.append((moment, 0, round(max(amount, 1000), -2), None, "зарплата"))
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def limits(self, names: List[str], rows: list) -> List[Tuple[str, str, str, float]]:
+        """Лимиты на текущий месяц: (начало, конец, категория, сумма) около средних трат категории за месяц."""
+        rng = self.rng
+        months = len(_months(self.start, self.end))
+        monthly: Dict[str, float] = {}
+        for _, type_, amount, category, _ in rows:
+            if type_ == 1:
+                monthly[category] = monthly.get(category, 0) + amount / months
+        first = self.end.replace(day=1)
+        last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+        chosen = rng.sample(names, min(rng.randint(*LIMITS_PER_USER), len(names)))
+        return [
+            (first.isoformat(), last.isoformat(), name,
+             float(max(round(monthly.get(name, 1000) * rng.uniform(0.8, 1.3), -2), 100)))
+            for name in chosen
+        ]
+
+
+async def fill(users: int, transactions: int, months: int, seed: int, first_id: int,
+               end: Optional[date] = None) -> Dict[str, int]:
+    """
+    генерация users пользователей по transactions транзакций за months месяцев по дату end.
+
+    аргументы:
+        users (int): Сколько пользователей создать.
+        transactions (int): Транзакций на пользователя.
+        months (int): За сколько месяцев, считая месяц end.
+        seed (int): Зерно генератора случайных чисел.
+        first_id (int): tg_id первого пользователя.
+        end (Optional[date]): Последний день данных; по умолчанию сегодня.
+
+    возвращает:
+        Dict[str, int]: Количество созданных пользователей, транзакций и лимитов.
+    """
+    rng = random.Random(seed)
+    generator = Generator(rng, end or date.today(), months)
+    stats = {"users": 0, "transactions": 0, "limits": 0}
+    started = last_report = time.monotonic()
+    for tg_id in range(first_id, first_id + users):
+        if await is_registered(tg_id):
+            raise RuntimeError(f"Пользователь {tg_id} уже есть в базе, выберите другой --first-id")
+        names = generator.categories()
+        rows = generator.transactions(names, transactions)
+
+        await add_user(tg_id, f"user{tg_id}")
+        await update_user(tg_id, name=f"Пользователь {tg_id}", categories=names)
+        for i in range(0, len(rows), BATCH_SIZE):
+            await import_transactions(tg_id, rows[i:i + BATCH_SIZE])
+        for start_date, end_date, category, limit_sum in generator.limits(names, rows):
+            stats["limits"] += await add_limit(tg_id, start_date, end_date, category, limit_sum)
+
+        stats["users"] += 1
+        stats["transactions"] += len(rows)
+        if time.monotonic() - last_report >= 10:
+            last_report = time.monotonic()
+            print(f"Пользователей: {stats['users']}/{users}, транзакций: {stats['transactions']} "
+                  f"({stats['transactions'] / (last_report - started):.0f} в секунду)")
+    return stats
+
 
 async def main():
-    """Основная функция скрипта"""
+    parser = argparse.ArgumentParser(description="Заполнение базы синтетическими данными для нагрузочных тестов")
+    parser.add_argument("--users", type=int, default=1000, help="сколько пользователей создать")
+    parser.add_argument("--transactions", type=int, default=1000, help="транзакций на пользователя")
+    parser.add_argument("--months", type=int, default=24, help="за сколько последних месяцев")
+    parser.add_argument("--seed", type=int, default=42, help="зерно генератора случайных чисел")
+    parser.add_argument("--first-id", type=int, default=1, help="tg_id первого пользователя")
+    parser.add_argument("--end", type=date.fromisoformat, default=None,
+                        help="последний день данных YYYY-MM-DD (по умолчанию сегодня; для одинаковых баз)")
+    args = parser.parse_args()
+    if args.months < 1:
+        parser.error("--months должно быть положительным")
+
+    started = time.monotonic()
+    await open_storage()
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            # Получаем данные пользователя
-            user_data = await get_user_data(db, TG_ID)
-            if not user_data:
-                print(f"Ошибка: пользователь {TG_ID} не найден в базе")
-                return
-                
-            print(f"\nТекущие данные пользователя:")
-            print(f"Имя: {user_data['name']}")
-            print(f"Баланс: {user_data['total_sum']:.2f} руб.")
-            print(f"Категории: {user_data['categories']}")
-            
-            # Обновляем категории пользователя
-            updated_categories = await update_user_categories(
-                db, TG_ID, user_data['categories']
-            )
-            
-            # Генерируем новые транзакции
-            print(f"\nНачинаем генерацию {NUM_TRANSACTIONS} транзакций...")
-            await generate_random_transactions(
-                db, TG_ID, updated_categories, NUM_TRANSACTIONS
-            )
-            
-    except Exception as e:
-        print(f"Произошла ошибка: {str(e)}")
+        stats = await fill(args.users, args.transactions, args.months, args.seed, args.first_id, args.end)
+    finally:
+        await close_storage()
+    elapsed = time.monotonic() - started
+    print(f"Создано пользователей: {stats['users']}, транзакций: {stats['transactions']}, "
+          f"лимитов: {stats['limits']} за {elapsed:.1f} с ({stats['transactions'] / elapsed:.0f} транзакций в секунду)")
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""уведомления пользователю о превышении лимита расходов и о приближении к нему"""
+
+from typing import Any, Mapping
+
+from aiogram import Bot
+
+
+async def notify_limit(bot: Bot, tg_id: int, category: str, limit: Mapping[str, Any]) -> None:
+    """
+    отправка уведомления по активному лимиту после добавления расхода.
+
+    аргументы:
+        bot (Bot): Экземпляр бота для отправки сообщений.
+        tg_id (int): Telegram ID пользователя.
+        category (str): Категория расхода.
+        limit (Mapping[str, Any]): Лимит с полями limit_sum, spent (в рублях, spent уже учитывает
+            новый расход), start_date и end_date.
+    """
+    current_spent = float(limit['spent'])
+    limit_sum = float(limit['limit_sum'])
+
+    # Проверяем превышение лимита
+    if current_spent > limit_sum:
+        over_limit = current_spent - limit_sum
+        # Отправляем уведомление о превышении лимита
+        await bot.send_message(
+            tg_id,
+            f"🚨 <b>Внимание! Превышен лимит расходов!</b>\n\n"
+            f"Категория: {category}\n"
+            f"Установленный лимит: {limit_sum:,.2f}₽\n"
+            f"Текущие расходы: {current_spent:,.2f}₽\n"
+            f"Превышение: {over_limit:,.2f}₽\n"
+            f"Период: {limit['start_date']} - {limit['end_date']}",
+            parse_mode="HTML"
+        )
+    elif (current_spent / limit_sum) >= 0.9:  # 90% и более
+        remaining = limit_sum - current_spent
+        # Отправляем уведомление о приближении к лимиту
+        await bot.send_message(
+            tg_id,
+            f"⚠️ <b>Внимание! Вы приближаетесь к лимиту расходов!</b>\n\n"
+            f"Категория: {category}\n"
+            f"Установленный лимит: {limit_sum:,.2f}₽\n"
+            f"Текущие расходы: {current_spent:,.2f}₽\n"
+            f"Остаток: {remaining:,.2f}₽\n"
+            f"Использовано: {(current_spent / limit_sum * 100):.1f}%\n"
+            f"Период: {limit['start_date']} - {limit['end_date']}",
+            parse_mode="HTML"
+        )
@@ -0,0 +1,196 @@
+"""накопленные расходы по лимитам (limits.spent): триггеры и проверка расхождений
+
+Запуск: python -m database.limit_spent [путь_к_базе] [--fix]
+Добавляет колонку и триггеры, если их еще нет, пересчитывает spent с нуля по транзакциям
+и печатает лимиты, у которых сохраненное значение разошлось с фактическим.
+С флагом --fix расхождения исправляются.
+"""
+
+import asyncio
+import sys
+from typing import Any, Dict, List
+
+import aiosqlite
+
+from database.archive import attach_archive
+from database.backfill_rollup import rebuild_rollup
+from database.config import DB_PATH
+from database.units import from_minor
+
+# Триггеры поддерживают spent при изменении транзакций; при создании лимита или смене его
+# окна spent пересчитывается по daily_rollup, поэтому таблица итогов должна уже существовать.
+LIMIT_SPENT_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_limits_category ON limits(category_id, start_date, end_date);
+
+-- Триггеры для limits.spent (при массовой загрузке, см. bulk_load, spent пересчитывает импорт)
+CREATE TRIGGER IF NOT EXISTS limit_spent_after_insert
+AFTER INSERT ON transactions
+WHEN NEW.type = 1 AND NEW.category_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE limits
+    SET spent = spent + NEW.sum
+    WHERE category_id = NEW.category_id
+    AND start_date <= NEW.day
+    AND end_date >= NEW.day;
+END;
+
+CREATE TRIGGER IF NOT EXISTS limit_spent_after_delete
+AFTER DELETE ON transactions
+WHEN OLD.type = 1 AND OLD.category_id IS NOT NULL
+BEGIN
+    UPDATE limits
+    SET spent = spent - OLD.sum
+    WHERE category_id = OLD.category_id
+    AND start_date <= OLD.day
+    AND end_date >= OLD.day;
+END;
+
+CREATE TRIGGER IF NOT EXISTS limit_spent_after_update
+AFTER UPDATE OF date_time, type, category_id, sum ON transactions
+BEGIN
+    UPDATE limits
+    SET spent = spent - OLD.sum
+    WHERE OLD.type = 1
+    AND category_id = OLD.category_id
+    AND start_date <= OLD.day
+    AND end_date >= OLD.day;
+
+    UPDATE limits
+    SET spent = spent + NEW.sum
+    WHERE NEW.type = 1
+    AND category_id = NEW.category_id
+    AND start_date <= NEW.day
+    AND end_date >= NEW.day;
+END;
+
+CREATE TRIGGER IF NOT EXISTS limit_spent_after_limit_insert
+AFTER INSERT ON limits
+BEGIN
+    UPDATE limits
+    SET spent = (
+        SELECT COALESCE(SUM(total), 0)
+        FROM daily_rollup
+        WHERE tg_id = NEW.tg_id
+        AND category_id = NEW.category_id
+        AND type = 1
+        AND day >= NEW.start_date
+        AND day <= NEW.end_date
+    )
+    WHERE limit_id = NEW.limit_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS limit_spent_after_limit_update
+AFTER UPDATE OF category_id, start_date, end_date ON limits
+BEGIN
+    UPDATE limits
+    SET spent = (
+        SELECT COALESCE(SUM(total), 0)
+        FROM daily_rollup
+        WHERE tg_id = NEW.tg_id
+        AND category_id = NEW.category_id
+        AND type = 1
+        AND day >= NEW.start_date
+        AND day <= NEW.end_date
+    )
+    WHERE limit_id = NEW.limit_id;
+END;
+"""
+
+# Фактические расходы по каждому лимиту, посчитанные заново по сырым транзакциям ({source} -
+# transactions или all_transactions вместе с архивом)
+_ACTUAL_SPENT_QUERY = """
+    SELECT l.limit_id, l.tg_id, c.name AS category, l.start_date, l.end_date, l.spent,
+        (
+            SELECT COALESCE(SUM(t.sum), 0)
+            FROM {source} t
+            WHERE t.tg_id = l.tg_id
+            AND t.category_id = l.category_id
+            AND t.type = 1
+            AND t.date_time >= CAST(strftime('%s', l.start_date) AS INTEGER)
+            AND t.date_time < CAST(strftime('%s', l.end_date, '+1 day') AS INTEGER)
+        ) AS actual
+    FROM limits l
+    JOIN categories c ON c.category_id = l.category_id
+"""
+
+
+async def ensure_limit_spent(db: aiosqlite.Connection) -> None:
+    """
+    установка колонки limits.spent и триггеров в существующую базу.
+
+    если колонки не было, spent заполняется по текущим транзакциям. триггеры лимитов читают
+    daily_rollup, поэтому при ее отсутствии она сначала создается и заполняется.
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+    """
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollup'")
+    if not await cursor.fetchone():
+        await rebuild_rollup(db)
+
+    cursor = await db.execute("PRAGMA table_info(limits)")
+    columns = [row[1] for row in await cursor.fetchall()]
+    if "spent" not in columns:
+        await db.execute("ALTER TABLE limits ADD COLUMN spent INTEGER NOT NULL DEFAULT 0")
+        await db.commit()
+        await verify_limit_spent(db, fix=True)
+    await db.executescript(LIMIT_SPENT_SCHEMA)
+
+
+async def verify_limit_spent(db: aiosqlite.Connection, fix: bool = False,
+                             source: str = "transactions") -> List[Dict[str, Any]]:
+    """
+    пересчет spent с нуля по транзакциям и поиск расхождений с сохраненным значением.
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+        fix (bool): Записать пересчитанные значения для лимитов с расхождением.
+        source (str): Таблица транзакций; all_transactions - вместе с архивом (см. archive.attach_archive).
+
+    возвращает:
+        List[Dict[str, Any]]: Лимиты с расхождением: limit_id, tg_id, category, период, spent, actual и drift
+        (суммы в копейках).
+    """
+    db.row_factory = aiosqlite.Row
+    cursor = await db.execute(_ACTUAL_SPENT_QUERY.format(source=source))
+    drifted = []
+    for row in await cursor.fetchall():
+        drift = row["spent"] - row["actual"]
+        if drift:
+            item = dict(row)
+            item["drift"] = drift
+            drifted.append(item)
+    db.row_factory = None
+
+    if fix and drifted:
+        await db.executemany(
+            "UPDATE limits SET spent = ? WHERE limit_id = ?",
+            [(item["actual"], item["limit_id"]) for item in drifted]
+        )
+        await db.commit()
+    return drifted
+
+
+async def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--fix"]
+    fix = "--fix" in sys.argv[1:]
+    db_path = args[0] if args else DB_PATH
+
+    async with aiosqlite.connect(db_path) as db:
+        await ensure_limit_spent(db)
+        drifted = await verify_limit_spent(db, fix=fix, source=await attach_archive(db, db_path))
+
+    for item in drifted:
+        print(
+            f"limit_id={item['limit_id']} tg_id={item['tg_id']} {item['category']} "
+            f"{item['start_date']}..{item['end_date']}: spent={from_minor(item['spent']):.2f}, "
+            f"по транзакциям {from_minor(item['actual']):.2f}, расхождение {from_minor(item['drift']):+.2f}"
+        )
+    if not drifted:
+        print("Расхождений не найдено")
+    elif fix:
+        print(f"Исправлено лимитов: {len(drifted)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
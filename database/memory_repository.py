@@ -0,0 +1,517 @@
+"""хранилище в памяти процесса с той же семантикой, что и db_methods: для нагрузочных тестов и бенчмарков
+
+данные не сохраняются между запусками. индексы повторяют индексы sqlite: транзакции пользователя
+и транзакции категории хранятся отсортированными списками ключей (date_time, transaction_id),
+поэтому выборки по периоду и постраничный вывод - двоичный поиск, а не перебор всей истории.
+"""
+
+import bisect
+import itertools
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+from database.limit_alerts import notify_limit
+from database.records import Transaction, TransactionPage
+from database.units import to_minor, from_minor, to_epoch, from_epoch
+
+DAY = 24 * 60 * 60
+
+# Ключ сортировки транзакций, как в индексах sqlite
+Key = Tuple[int, int]
+
+
+class _Transaction:
+    __slots__ = ("transaction_id", "tg_id", "date_time", "type", "description", "category_id", "sum")
+
+    def __init__(self, transaction_id: int, tg_id: int, date_time: int, type_: int,
+                 description: Optional[str], category_id: Optional[int], sum_: int) -> None:
+        self.transaction_id = transaction_id
+        self.tg_id = tg_id
+        self.date_time = date_time  # секунды от эпохи
+        self.type = type_
+        self.description = description
+        self.category_id = category_id
+        self.sum = sum_  # копейки
+
+    @property
+    def key(self) -> Key:
+        return self.date_time, self.transaction_id
+
+
+class _Category:
+    __slots__ = ("category_id", "tg_id", "name", "position", "keys")
+
+    def __init__(self, category_id: int, tg_id: int, name: str, position: int) -> None:
+        self.category_id = category_id
+        self.tg_id = tg_id
+        self.name = name
+        self.position = position
+        self.keys: List[Key] = []  # транзакции категории; len(keys) - transaction_count
+
+
+class _Limit:
+    __slots__ = ("limit_id", "tg_id", "start_date", "end_date", "category_id", "limit_sum")
+
+    def __init__(self, limit_id: int, tg_id: int, start_date: str, end_date: str, category_id: int,
+                 limit_sum: int) -> None:
+        self.limit_id = limit_id
+        self.tg_id = tg_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.category_id = category_id
+        self.limit_sum = limit_sum  # копейки
+
+
+class _User:
+    __slots__ = ("tg_id", "tg_username", "name", "total_sum", "categories", "keys", "limits", "statements")
+
+    def __init__(self, tg_id: int, tg_username: Optional[str]) -> None:
+        self.tg_id = tg_id
+        self.tg_username = tg_username
+        self.name: Optional[str] = None
+        self.total_sum = 0  # копейки
+        self.categories: Dict[str, _Category] = {}
+        self.keys: List[Key] = []  # все транзакции пользователя
+        self.limits: Dict[int, _Limit] = {}
+        self.statements: Dict[str, Dict[str, int]] = {}  # ход импорта выписок по хэшу файла
+
+
+def _today() -> str:
+    """Текущая дата в формате YYYY-MM-DD (местное время бота, как _today в db_methods)."""
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _utc_date(days: int = 0) -> str:
+    """Дата по UTC со сдвигом, как date('now', ...) в запросах sqlite."""
+    return (datetime.now(timezone.utc) + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _day_range(start_day: str, end_day: str) -> Tuple[int, int]:
+    """Полуинтервал секунд [начало start_day, конец end_day] для дат YYYY-MM-DD включительно."""
+    return to_epoch(start_day[:10]), to_epoch(end_day[:10]) + DAY
+
+
+def _slice(keys: List[Key], start: int, end: int) -> List[Key]:
+    """Ключи с date_time в полуинтервале [start, end)."""
+    return keys[bisect.bisect_left(keys, (start,)):bisect.bisect_left(keys, (end,))]
+
+
+class MemoryRepository:
+    """
+    хранилище в памяти: пользователи, категории, транзакции и лимиты в словарях с индексами.
+
+    агрегаты, которые в sqlite поддерживают триггеры, здесь обновляются в тех же методах:
+    total_sum при каждой записи транзакции, количество транзакций категории - длиной ее индекса,
+    spent лимита считается по индексу категории в окне лимита. проверки категорий и ошибки
+    те же, что и в db_methods.
+    """
+
+    def __init__(self) -> None:
+        self._users: Dict[int, _User] = {}
+        self._categories: Dict[int, _Category] = {}
+        self._transactions: Dict[int, _Transaction] = {}
+        self._limits: Dict[int, _Limit] = {}
+        self._category_ids = itertools.count(1)
+        self._transaction_ids = itertools.count(1)
+        self._limit_ids = itertools.count(1)
+
+    async def open_storage(self) -> None:
+        pass
+
+    async def close_storage(self) -> None:
+        pass
+
+    # Вспомогательные методы
+
+    def _user(self, tg_id: int) -> _User:
+        user = self._users.get(tg_id)
+        if user is None:
+            raise ValueError("Пользователь не найден")
+        return user
+
+    def _category(self, user: _User, category: Optional[str]) -> Optional[_Category]:
+        """Категория пользователя по названию; ValueError, если ее нет (как _category_id в db_methods)."""
+        if category is None:
+            return None
+        found = user.categories.get(category)
+        if found is None:
+            raise ValueError("Category not found in user categories")
+        return found
+
+    def _record(self, transaction: _Transaction) -> Transaction:
+        category = self._categories.get(transaction.category_id)
+        return Transaction(
+            transaction.transaction_id, from_epoch(transaction.date_time), transaction.type,
+            transaction.description, category.name if category else None, transaction.sum / 100.0
+        )
+
+    def _records(self, keys: List[Key]) -> List[Transaction]:
+        return [self._record(self._transactions[transaction_id]) for _, transaction_id in keys]
+
+    def _insert(self, user: _User, date_time: int, type_: int, description: Optional[str],
+                category: Optional[_Category], sum_: int) -> int:
+        """Вставка транзакции с обновлением индексов и баланса (как триггеры sqlite)."""
+        transaction = _Transaction(next(self._transaction_ids), user.tg_id, date_time, type_, description,
+                                   category.category_id if category else None, sum_)
+        self._transactions[transaction.transaction_id] = transaction
+        bisect.insort(user.keys, transaction.key)
+        if category is not None:
+            bisect.insort(category.keys, transaction.key)
+        user.total_sum += sum_ if type_ == 0 else -sum_
+        return transaction.transaction_id
+
+    def _spent(self, limit: _Limit) -> int:
+        """Расходы по лимиту в копейках: транзакции категории в окне лимита."""
+        category = self._categories[limit.category_id]
+        start, end = _day_range(limit.start_date, limit.end_date)
+        return sum(
+            self._transactions[transaction_id].sum
+            for _, transaction_id in _slice(category.keys, start, end)
+            if self._transactions[transaction_id].type == 1
+        )
+
+    def _limit_dict(self, limit: _Limit, **extra: Any) -> Dict[str, Any]:
+        """Лимит в виде строки LIMIT_COLUMNS из db_methods."""
+        return dict(
+            limit_id=limit.limit_id, tg_id=limit.tg_id, start_date=limit.start_date, end_date=limit.end_date,
+            category_id=limit.category_id, limit_sum=limit.limit_sum / 100.0, spent=self._spent(limit) / 100.0,
+            category=self._categories[limit.category_id].name, **extra
+        )
+
+    def _active_limit(self, user: _User, category: str, day: str) -> Optional[Dict[str, Any]]:
+        found = user.categories.get(category)
+        if found is None:
+            return None
+        for limit in user.limits.values():
+            if limit.category_id == found.category_id and limit.start_date <= day <= limit.end_date:
+                return self._limit_dict(limit)
+        return None
+
+    def _drop_category(self, user: _User, category: _Category) -> None:
+        """Удаление категории: транзакции остаются без категории, лимиты по ней удаляются."""
+        for _, transaction_id in category.keys:
+            self._transactions[transaction_id].category_id = None
+        for limit_id in [limit.limit_id for limit in user.limits.values() if limit.category_id == category.category_id]:
+            del user.limits[limit_id]
+            del self._limits[limit_id]
+        del user.categories[category.name]
+        del self._categories[category.category_id]
+
+    def _replace_categories(self, user: _User, categories: List[str]) -> None:
+        for category in [c for name, c in user.categories.items() if name not in categories]:
+            self._drop_category(user, category)
+        for position, name in enumerate(categories):
+            if name in user.categories:
+                user.categories[name].position = position
+            else:
+                category = _Category(next(self._category_ids), user.tg_id, name, position)
+                user.categories[name] = category
+                self._categories[category.category_id] = category
+
+    # Пользователи
+
+    async def add_user(self, tg_id: int, tg_username: Optional[str] = None) -> None:
+        if tg_id not in self._users:
+            self._users[tg_id] = _User(tg_id, tg_username)
+
+    async def update_user(self, tg_id: int, **kwargs: Any) -> None:
+        user = self._users.get(tg_id)
+        if not kwargs or user is None:
+            return
+        categories = kwargs.pop("categories", None)
+        if categories is not None:
+            if isinstance(categories, str):
+                categories = json.loads(categories)
+            self._replace_categories(user, categories)
+        if "total_sum" in kwargs:
+            kwargs["total_sum"] = to_minor(kwargs["total_sum"])
+        for key, value in kwargs.items():
+            if key not in ("tg_username", "name", "total_sum"):
+                raise ValueError(f"Неизвестное поле пользователя: {key}")
+            setattr(user, key, value)
+
+    async def get_user(self, tg_id: int) -> Optional[Dict[str, Any]]:
+        user = self._users.get(tg_id)
+        if user is None:
+            return None
+        categories = sorted(user.categories.values(), key=lambda c: (c.position, c.category_id))
+        return {
+            "tg_id": user.tg_id,
+            "categories": [category.name for category in categories],
+            "tg_username": user.tg_username,
+            "name": user.name,
+            "total_sum": from_minor(user.total_sum)
+        }
+
+    async def delete_user(self, tg_id: int) -> bool:
+        user = self._users.get(tg_id)
+        if user is None:
+            return True
+        for _, transaction_id in user.keys:
+            del self._transactions[transaction_id]
+        user.keys = []
+        for limit_id in user.limits:
+            del self._limits[limit_id]
+        user.limits = {}
+        for category in user.categories.values():
+            del self._categories[category.category_id]
+        user.categories = {}
+        user.statements = {}
+        user.name = None
+        user.total_sum = 0
+        return True
+
+    async def is_registered(self, tg_id: int) -> bool:
+        user = await self.get_user(tg_id)
+        return bool(user and user.get('name') and user.get('total_sum') is not None)
+
+    # Категории
+
+    async def add_category(self, tg_id: int, category: str) -> None:
+        user = self._user(tg_id)
+        if category in user.categories:
+            raise ValueError("Категория уже существует")
+        position = max((c.position for c in user.categories.values()), default=-1) + 1
+        new = _Category(next(self._category_ids), tg_id, category, position)
+        user.categories[category] = new
+        self._categories[new.category_id] = new
+
+    async def get_categories(self, tg_id: int) -> List[str]:
+        user = await self.get_user(tg_id)
+        if not user:
+            raise ValueError("Пользователь не найден")
+        return user["categories"]
+
+    async def update_categories(self, tg_id: int, new_categories: List[str]) -> None:
+        self._replace_categories(self._user(tg_id), new_categories)
+
+    # Транзакции
+
+    async def add_transaction(self, tg_id: int, type_: int, sum_: float, category: Optional[str] = None,
+                              description: Optional[str] = None, bot: Optional[Bot] = None) -> int:
+        user = self._user(tg_id)
+        transaction_id = self._insert(user, to_epoch(datetime.now()), type_, description,
+                                      self._category(user, category), to_minor(sum_))
+        if type_ == 1 and category and bot:
+            limit = self._active_limit(user, category, _today())
+            if limit:
+                await notify_limit(bot, tg_id, category, limit)
+        return transaction_id
+
+    async def import_transactions(
+        self, tg_id: int, rows: List[Tuple[Any, int, float, Optional[str], Optional[str]]],
+        statement: Optional[str] = None
+    ) -> Dict[str, int]:
+        user = self._user(tg_id)
+        categories = {name.lower(): category for name, category in user.categories.items()}
+        imported = uncategorized = 0
+        for date_time, type_, sum_, category, description in rows:
+            found = categories.get(category.lower()) if category else None
+            if found is None:
+                uncategorized += 1
+            self._insert(user, to_epoch(date_time), type_, description, found, to_minor(sum_))
+            imported += 1
+        if statement:
+            user.statements.setdefault(statement, {"imported": 0, "done": False})["imported"] += imported
+        return {"imported": imported, "uncategorized": uncategorized}
+
+    async def get_statement_import(self, tg_id: int, statement: str) -> Optional[Dict[str, int]]:
+        user = self._users.get(tg_id)
+        progress = user.statements.get(statement) if user else None
+        return dict(progress) if progress else None
+
+    async def finish_statement_import(self, tg_id: int, statement: str) -> None:
+        self._user(tg_id).statements.setdefault(statement, {"imported": 0, "done": False})["done"] = True
+
+    async def get_transactions(self, tg_id: int, limit: int = 10) -> List[Transaction]:
+        user = self._users.get(tg_id)
+        if user is None or limit <= 0:
+            return []
+        return self._records(user.keys[-limit:][::-1])
+
+    async def iter_transactions(self, tg_id: int, chunk_size: int = 1000) -> AsyncIterator[List[Transaction]]:
+        user = self._users.get(tg_id)
+        if user is None:
+            return
+        # Курсор по ключу, как в db_methods: запись между порциями не сдвигает уже выданное
+        index = 0
+        while True:
+            keys = user.keys[index:index + chunk_size]
+            if not keys:
+                return
+            yield self._records(keys)
+            if len(keys) < chunk_size:
+                return
+            index = bisect.bisect_right(user.keys, keys[-1])
+
+    async def get_transactions_by_period(self, tg_id: int, start_date: str, end_date: str) -> List[Transaction]:
+        user = self._users.get(tg_id)
+        if user is None:
+            return []
+        return self._records(_slice(user.keys, to_epoch(start_date), to_epoch(end_date))[::-1])
+
+    async def get_transactions_by_category(self, tg_id: int, category: str, items_per_page: int = 5,
+                                           after_id: Optional[int] = None,
+                                           before_id: Optional[int] = None) -> TransactionPage:
+        user = self._users.get(tg_id)
+        found = user.categories.get(category) if user else None
+        if found is None:
+            return TransactionPage([], 0)
+        keys = found.keys
+        boundary_id = after_id if after_id is not None else before_id
+        if boundary_id is not None:
+            boundary = self._transactions.get(boundary_id)
+            # Граничной транзакции нет - в sqlite сравнение с NULL, страница пустая
+            if boundary is None:
+                return TransactionPage([], len(keys))
+            if after_id is not None:
+                end = bisect.bisect_left(keys, boundary.key)
+                page = keys[max(end - items_per_page, 0):end]
+            else:
+                start = bisect.bisect_right(keys, boundary.key)
+                page = keys[start:start + items_per_page]
+        else:
+            page = keys[-items_per_page:] if items_per_page > 0 else []
+        return TransactionPage(self._records(page[::-1]), len(keys))
+
+    async def get_period_totals(self, tg_id: int, start_date: str, end_date: str) -> Dict[str, Any]:
+        user = self._users.get(tg_id)
+        totals: Dict[Tuple[Optional[int], int], int] = {}
+        if user is not None:
+            for _, transaction_id in _slice(user.keys, to_epoch(start_date[:10]), to_epoch(end_date[:10])):
+                transaction = self._transactions[transaction_id]
+                group = (transaction.category_id, transaction.type)
+                totals[group] = totals.get(group, 0) + transaction.sum
+        income = expenses = 0
+        expenses_by_category = {}
+        for (category_id, type_), total in sorted(totals.items(), key=lambda item: -item[1]):
+            if type_ == 0:
+                income += total
+            else:
+                expenses += total
+                category = self._categories.get(category_id)
+                expenses_by_category[category.name if category else None] = from_minor(total)
+        return {"income": from_minor(income), "expenses": from_minor(expenses), "expenses_by_category": expenses_by_category}
+
+    async def get_balance(self, tg_id: int, end_date: str) -> float:
+        user = self._users.get(tg_id)
+        if user is None:
+            return 0.0
+        end = bisect.bisect_left(user.keys, (to_epoch(end_date[:10]),))
+        balance = 0
+        for _, transaction_id in user.keys[:end]:
+            transaction = self._transactions[transaction_id]
+            balance += transaction.sum if transaction.type == 0 else -transaction.sum
+        return from_minor(balance)
+
+    # Лимиты
+
+    async def add_limit(self, tg_id: int, start_date: str, end_date: str, category: str, limit_sum: float) -> bool:
+        try:
+            user = self._user(tg_id)
+            found = self._category(user, category)
+        except ValueError:
+            return False
+        today = _today()
+        active = [limit for limit in user.limits.values()
+                  if limit.category_id == found.category_id and limit.start_date <= today <= limit.end_date]
+        if active:
+            # Обновляем существующий лимит
+            for limit in active:
+                limit.limit_sum, limit.start_date, limit.end_date = to_minor(limit_sum), start_date, end_date
+        else:
+            limit = _Limit(next(self._limit_ids), tg_id, start_date, end_date, found.category_id, to_minor(limit_sum))
+            user.limits[limit.limit_id] = limit
+            self._limits[limit.limit_id] = limit
+        return True
+
+    async def get_user_limits(self, tg_id: int) -> list:
+        user = self._users.get(tg_id)
+        if user is None:
+            return []
+        today = _utc_date()
+        return [self._limit_dict(limit) for limit in user.limits.values() if limit.end_date >= today]
+
+    async def delete_limit(self, limit_id: int, tg_id: int) -> bool:
+        user = self._users.get(tg_id)
+        if user is not None and limit_id in user.limits:
+            del user.limits[limit_id]
+            del self._limits[limit_id]
+        return True
+
+    async def get_limit_usage(self, tg_id: int, category: str, start_date: str, end_date: str) -> float:
+        user = self._users.get(tg_id)
+        found = user.categories.get(category) if user else None
+        if found is None:
+            return 0.0
+        start, end = _day_range(start_date, end_date)
+        return sum(
+            self._transactions[transaction_id].sum
+            for _, transaction_id in _slice(found.keys, start, end)
+            if self._transactions[transaction_id].type == 1
+        ) / 100.0
+
+    async def check_limit_violation(self, tg_id: int, category: str, amount: float) -> Optional[Dict[str, Any]]:
+        user = self._users.get(tg_id)
+        limit = self._active_limit(user, category, _today()) if user else None
+        if not limit:
+            return None
+        current_spent = float(limit["spent"])
+        new_total = current_spent + amount
+        limit_sum = float(limit["limit_sum"])
+        usage_percent = (new_total / limit_sum) * 100
+        if new_total > limit_sum:
+            return {
+                "status": "violated",
+                "category": category,
+                "limit_sum": limit_sum,
+                "current_spent": current_spent,
+                "new_amount": amount,
+                "end_date": limit["end_date"],
+                "total_amount": new_total,
+                "over_limit": new_total - limit_sum,
+                "usage_percent": usage_percent
+            }
+        elif usage_percent >= 90:
+            return {
+                "status": "approaching",
+                "category": category,
+                "limit_sum": limit_sum,
+                "current_spent": current_spent,
+                "new_amount": amount,
+                "end_date": limit["end_date"],
+                "remaining": limit_sum - new_total,
+                "usage_percent": usage_percent
+            }
+        return None
+
+    async def get_expiring_limits(self) -> List[Dict[str, Any]]:
+        tomorrow = _utc_date(1)
+        return [
+            self._limit_dict(limit, tg_username=self._users[limit.tg_id].tg_username)
+            for limit in self._limits.values() if limit.end_date == tomorrow
+        ]
+
+    async def iter_violated_limits(self) -> AsyncIterator[Dict[str, Any]]:
+        today = _today()
+        for limit in list(self._limits.values()):
+            if not limit.start_date <= today <= limit.end_date:
+                continue
+            if self._spent(limit) > limit.limit_sum:
+                yield self._limit_dict(limit, tg_username=self._users[limit.tg_id].tg_username)
+
+    async def get_violated_limits(self) -> List[Dict[str, Any]]:
+        return [limit async for limit in self.iter_violated_limits()]
+
+    # Обслуживание
+
+    async def archive_transactions(self) -> int:
+        """Архива в памяти нет: все транзакции и так в памяти процесса."""
+        return 0
+
+    async def backup_storage(self) -> List[str]:
+        """Данные в памяти не сохраняются между запусками, копировать нечего."""
+        return []
@@ -1,183 +1,276 @@
-"""Скрипт для миграции данных из резервной копии в новую базу данных"""
+"""Скрипт для миграции данных из резервной копии в новую базу данных
 
+Запуск: python -m database.migrate_data [--source database/data.db.backup] [--target database/data.db]
+    [--chunk-size 10000]
+Строки читаются из копии порциями и вставляются пачками, каждая пачка фиксируется вместе
+с отметкой о ходе миграции. Прерванный запуск продолжается с последней зафиксированной пачки.
+"""
+
+import argparse
 import asyncio
 import aiosqlite
 import json
-from datetime import datetime
-
-# SQL-скрипт для создания структуры базы данных
-SCHEMA = """
--- Таблица пользователей
-CREATE TABLE users (
-    tg_id INTEGER PRIMARY KEY,
-    categories TEXT,
-    tg_username TEXT,
-    name TEXT,
-    total_sum REAL DEFAULT 0.0
-);
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
 
--- Таблица транзакций
-CREATE TABLE transactions (
-    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    tg_id INTEGER,
-    date_time TEXT NOT NULL,
-    type INTEGER NOT NULL,
-    description TEXT,
-    category TEXT,
-    sum REAL NOT NULL CHECK (sum >= 0),
-    FOREIGN KEY (tg_id) REFERENCES users(tg_id) ON DELETE CASCADE
-);
-CREATE INDEX idx_transactions_tg_id ON transactions(tg_id);
-CREATE INDEX idx_transactions_date_time ON transactions(date_time);
-
--- Таблица лимитов
-CREATE TABLE limits (
-    limit_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    tg_id INTEGER,
-    start_date TEXT NOT NULL,
-    end_date TEXT NOT NULL,
-    category TEXT,
-    limit_sum REAL NOT NULL CHECK (limit_sum >= 0),
-    FOREIGN KEY (tg_id) REFERENCES users(tg_id) ON DELETE CASCADE
+from database.balance_checkpoints import rebuild_checkpoints
+from database.config import DB_PATH, DB_PRAGMAS
+from database.migrations import apply_migrations
+from database.units import to_minor, to_epoch
+
+BACKUP_PATH = "database/data.db.backup"
+MIGRATION_CHUNK_SIZE = 10000  # Строк из копии в одной пачке (и в одной транзакции sqlite)
+PROGRESS_INTERVAL = 5.0  # Как часто, в секундах, печатать ход миграции
+
+# Ход миграции: последний перенесенный ключ каждого этапа. Обновляется в той же транзакции,
+# что и пачка строк, поэтому после сбоя перенос продолжается ровно с места остановки.
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS migration_progress (
+    stage TEXT PRIMARY KEY,
+    last_id INTEGER,
+    rows INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0
 );
-CREATE INDEX idx_limits_tg_id ON limits(tg_id);
-CREATE INDEX idx_limits_dates ON limits(start_date, end_date);
-
--- Триггеры для total_sum
-CREATE TRIGGER update_total_sum_after_insert
-AFTER INSERT ON transactions
-BEGIN
-    UPDATE users
-    SET total_sum = total_sum + 
-        CASE NEW.type 
-            WHEN 0 THEN NEW.sum 
-            WHEN 1 THEN -NEW.sum 
-        END
-    WHERE tg_id = NEW.tg_id;
-END;
-
-CREATE TRIGGER update_total_sum_after_delete
-AFTER DELETE ON transactions
-BEGIN
-    UPDATE users
-    SET total_sum = total_sum - 
-        CASE OLD.type 
-            WHEN 0 THEN OLD.sum 
-            WHEN 1 THEN -OLD.sum 
-        END
-    WHERE tg_id = OLD.tg_id;
-END;
-
-CREATE TRIGGER update_total_sum_after_update
-AFTER UPDATE ON transactions
-BEGIN
-    UPDATE users
-    SET total_sum = total_sum - 
-        CASE OLD.type 
-            WHEN 0 THEN OLD.sum 
-            WHEN 1 THEN -OLD.sum 
-        END + 
-        CASE NEW.type 
-            WHEN 0 THEN NEW.sum 
-            WHEN 1 THEN -NEW.sum 
-        END
-    WHERE tg_id = NEW.tg_id;
-END;
-
--- Триггеры для проверки категорий
-CREATE TRIGGER check_transaction_category
-BEFORE INSERT ON transactions
-WHEN NEW.category IS NOT NULL
-BEGIN
-    SELECT RAISE(ABORT, 'Category not found in user categories')
-    WHERE NOT EXISTS (
-        SELECT 1
-        FROM users
-        WHERE tg_id = NEW.tg_id
-        AND json_array_length(json_extract(categories, '$')) > 0
-        AND EXISTS (
-            SELECT 1
-            FROM json_each(categories)
-            WHERE value = NEW.category
+"""
+
+# Этапы переноса: (этап, запрос к копии с курсором по ключу, ключ строки, вставка в новую базу).
+# Категория транзакции и лимита ищется по имени подзапросом к idx_categories_tg_id_name,
+# так что соответствие имен и ID не держится в памяти.
+USERS_QUERY = "SELECT * FROM users WHERE tg_id > ? ORDER BY tg_id LIMIT ?"
+TRANSACTIONS_QUERY = "SELECT * FROM transactions WHERE transaction_id > ? ORDER BY transaction_id LIMIT ?"
+LIMITS_QUERY = "SELECT * FROM limits WHERE limit_id > ? ORDER BY limit_id LIMIT ?"
+
+INSERT_TRANSACTION = """
+    INSERT INTO transactions (transaction_id, tg_id, date_time, type, description, category_id, sum)
+    VALUES (?, ?, ?, ?, ?, (SELECT category_id FROM categories WHERE tg_id = ? AND name = ?), ?)
+"""
+INSERT_LIMIT = """
+    INSERT INTO limits (limit_id, tg_id, start_date, end_date, category_id, limit_sum)
+    SELECT ?, tg_id, ?, ?, category_id, ?
+    FROM categories
+    WHERE tg_id = ? AND name = ?
+"""
+
+
+async def _open_target(db: aiosqlite.Connection) -> Dict[str, aiosqlite.Row]:
+    """
+    подготовка новой базы: схема (см. migrations.py) при первом запуске или отметки хода миграции при продолжении.
+
+    на время переноса в bulk_load лежит строка, и триггеры вставки не трогают агрегаты:
+    total_sum переносится из копии как есть, остальное пересчитывается на последнем этапе.
+
+    возвращает:
+        Dict[str, aiosqlite.Row]: Отметки хода миграции по этапам.
+    """
+    cursor = await db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in await cursor.fetchall()}
+    if "migration_progress" not in tables:
+        if "users" in tables:
+            cursor = await db.execute("SELECT 1 FROM users LIMIT 1")
+            if await cursor.fetchone():
+                raise RuntimeError("новая база уже содержит данные, а отметок о ходе миграции нет")
+        await apply_migrations(db)
+        # Отметки и признак массовой загрузки создаются одной транзакцией
+        await db.executescript("BEGIN;" + PROGRESS_SCHEMA + "INSERT INTO bulk_load (tg_id) VALUES (0); COMMIT;")
+
+    db.row_factory = aiosqlite.Row
+    cursor = await db.execute("SELECT * FROM migration_progress")
+    progress = {row["stage"]: row for row in await cursor.fetchall()}
+    db.row_factory = None
+    return progress
+
+
+async def _save_progress(db: aiosqlite.Connection, stage: str, last_id: Optional[int], rows: int,
+                         done: bool = False) -> None:
+    await db.execute(
+        """
+        INSERT INTO migration_progress (stage, last_id, rows, done) VALUES (?, ?, ?, ?)
+        ON CONFLICT (stage) DO UPDATE
+        SET last_id = excluded.last_id, rows = excluded.rows, done = excluded.done
+        """,
+        (stage, last_id, rows, int(done))
+    )
+
+
+def _report(stage: str, rows: int, elapsed: float) -> None:
+    print(f"{stage}: {rows} строк за {elapsed:.1f} с ({rows / max(elapsed, 1e-9):,.0f} строк/с)")
+
+
+async def _copy_stage(old_db: aiosqlite.Connection, new_db: aiosqlite.Connection,
+                      progress: Dict[str, aiosqlite.Row], stage: str, query: str, key: str,
+                      write: Callable[[aiosqlite.Connection, Sequence[aiosqlite.Row]], Any],
+                      chunk_size: int) -> None:
+    """
+    перенос одной таблицы порциями по chunk_size строк с курсором по ключу key.
+
+    аргументы:
+        stage (str): Имя этапа в migration_progress.
+        query (str): Запрос к копии с параметрами (последний ключ, размер порции).
+        key (str): Колонка ключа, по возрастанию которой идет перенос.
+        write (Callable): Вставка порции в новую базу, без фиксации.
+    """
+    saved = progress.get(stage)
+    if saved is not None and saved["done"]:
+        print(f"{stage}: уже перенесено {saved['rows']} строк")
+        return
+    last_id = saved["last_id"] if saved is not None else -2**63  # меньше любого ключа
+    rows = saved["rows"] if saved is not None else 0
+    if rows:
+        print(f"{stage}: продолжение после {rows} строк")
+
+    started = last_report = time.monotonic()
+    copied = 0
+    while True:
+        cursor = await old_db.execute(query, (last_id, chunk_size))
+        chunk = await cursor.fetchall()
+        if not chunk:
+            break
+        await write(new_db, chunk)
+        last_id = chunk[-1][key]
+        rows += len(chunk)
+        copied += len(chunk)
+        await _save_progress(new_db, stage, last_id, rows)
+        await new_db.commit()
+        if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+            _report(stage, copied, time.monotonic() - started)
+            last_report = time.monotonic()
+        if len(chunk) < chunk_size:
+            break
+
+    await _save_progress(new_db, stage, last_id, rows, done=True)
+    await new_db.commit()
+    _report(stage, copied, time.monotonic() - started)
+
+
+async def _write_users(db: aiosqlite.Connection, users: Sequence[aiosqlite.Row]) -> None:
+    """Пользователи и их категории: JSON-список из копии переносится в таблицу categories."""
+    await db.executemany(
+        "INSERT INTO users (tg_id, tg_username, name, total_sum) VALUES (?, ?, ?, ?)",
+        [(user['tg_id'], user['tg_username'], user['name'], to_minor(user['total_sum'])) for user in users]
+    )
+    await db.executemany(
+        "INSERT OR IGNORE INTO categories (tg_id, name, position) VALUES (?, ?, ?)",
+        [(user['tg_id'], name, position)
+         for user in users
+         for position, name in enumerate(json.loads(user['categories'] or '[]'))]
+    )
+
+
+async def _write_transactions(db: aiosqlite.Connection, transactions: Sequence[aiosqlite.Row]) -> None:
+    """Транзакции: суммы в копейки, время из ISO-строки в секунды от эпохи, категория по имени."""
+    # Категории, которых нет у пользователя, остаются пустыми
+    await db.executemany(
+        INSERT_TRANSACTION,
+        [(trans['transaction_id'], trans['tg_id'], to_epoch(trans['date_time']),
+          trans['type'], trans['description'], trans['tg_id'], trans['category'], to_minor(trans['sum']))
+         for trans in transactions]
+    )
+
+
+async def _write_limits(db: aiosqlite.Connection, limits: Sequence[aiosqlite.Row]) -> None:
+    """Лимиты; лимит на категорию, которой нет у пользователя, пропускается."""
+    cursor = await db.executemany(
+        INSERT_LIMIT,
+        [(limit['limit_id'], limit['start_date'], limit['end_date'], to_minor(limit['limit_sum']),
+          limit['tg_id'], limit['category'])
+         for limit in limits]
+    )
+    # rowcount не учитывает изменения, сделанные триггерами
+    skipped = len(limits) - cursor.rowcount
+    if skipped:
+        print(f"Лимитов пропущено (категории нет у пользователя): {skipped}")
+
+
+async def _finish(db: aiosqlite.Connection, progress: Dict[str, aiosqlite.Row]) -> None:
+    """
+    однократный пересчет агрегатов, которые во время переноса не вели триггеры, и снятие bulk_load.
+
+    все делается в одной транзакции вместе с отметкой об окончании миграции.
+    """
+    if "aggregates" in progress and progress["aggregates"]["done"]:
+        return
+    started = time.monotonic()
+    await db.execute("BEGIN IMMEDIATE")
+    await db.execute("DELETE FROM daily_rollup")
+    await db.execute(
+        """
+        INSERT INTO daily_rollup (tg_id, day, category_id, type, total, count)
+        SELECT tg_id, day, COALESCE(category_id, 0), type, SUM(sum), COUNT(*)
+        FROM transactions
+        GROUP BY tg_id, day, COALESCE(category_id, 0), type
+        """
+    )
+    await db.execute(
+        """
+        UPDATE categories
+        SET transaction_count = (
+            SELECT COUNT(*) FROM transactions WHERE category_id = categories.category_id
         )
-    );
-END;
-
-CREATE TRIGGER check_limit_category
-BEFORE INSERT ON limits
-WHEN NEW.category IS NOT NULL
-BEGIN
-    SELECT RAISE(ABORT, 'Category not found in user categories')
-    WHERE NOT EXISTS (
-        SELECT 1
-        FROM users
-        WHERE tg_id = NEW.tg_id
-        AND json_array_length(json_extract(categories, '$')) > 0
-        AND EXISTS (
-            SELECT 1
-            FROM json_each(categories)
-            WHERE value = NEW.category
+        """
+    )
+    await db.execute(
+        """
+        UPDATE limits
+        SET spent = (
+            SELECT COALESCE(SUM(r.total), 0)
+            FROM daily_rollup r
+            WHERE r.tg_id = limits.tg_id
+            AND r.category_id = limits.category_id
+            AND r.type = 1
+            AND r.day >= limits.start_date AND r.day <= limits.end_date
         )
-    );
-END;
-"""
+        """
+    )
+    # Триггеры остатков по месяцам тоже молчали, пока строился daily_rollup
+    await rebuild_checkpoints(db)
+    await db.execute("DELETE FROM bulk_load")
+    await _save_progress(db, "aggregates", None, 0, done=True)
+    await db.commit()
+    print(f"aggregates: пересчитаны за {time.monotonic() - started:.1f} с")
+
+
+async def migrate_data(source: str = BACKUP_PATH, target: str = DB_PATH,
+                       chunk_size: int = MIGRATION_CHUNK_SIZE):
+    """
+    потоковый перенос пользователей, транзакций и лимитов из резервной копии в новую базу.
 
-async def migrate_data():
+    аргументы:
+        source (str): Путь к резервной копии со старой схемой.
+        target (str): Путь к новой базе; если миграция в нее была прервана, она продолжается.
+        chunk_size (int): Количество строк в одной пачке.
+    """
     try:
-        # Подключаемся к старой базе
-        async with aiosqlite.connect('database/data.db.backup') as old_db:
+        async with aiosqlite.connect(source) as old_db, aiosqlite.connect(target) as new_db:
             old_db.row_factory = aiosqlite.Row
-            
-            # Получаем данные пользователей
-            async with old_db.execute("SELECT * FROM users") as cursor:
-                users = await cursor.fetchall()
-            
-            # Получаем транзакции
-            async with old_db.execute("SELECT * FROM transactions") as cursor:
-                transactions = await cursor.fetchall()
-            
-            # Получаем лимиты
-            async with old_db.execute("SELECT * FROM limits") as cursor:
-                limits = await cursor.fetchall()
-        
-        # Подключаемся к новой базе
-        async with aiosqlite.connect('database/data.db') as new_db:
-            # Создаем таблицы
-            await new_db.executescript(SCHEMA)
-            
-            # Мигрируем пользователей
-            for user in users:
-                await new_db.execute(
-                    "INSERT INTO users (tg_id, categories, tg_username, name, total_sum) VALUES (?, ?, ?, ?, ?)",
-                    (user['tg_id'], user['categories'], user['tg_username'], user['name'], user['total_sum'])
-                )
-            
-            # Мигрируем транзакции
-            for trans in transactions:
-                await new_db.execute(
-                    """INSERT INTO transactions 
-                    (transaction_id, tg_id, date_time, type, description, category, sum) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (trans['transaction_id'], trans['tg_id'], trans['date_time'], 
-                     trans['type'], trans['description'], trans['category'], trans['sum'])
-                )
-            
-            # Мигрируем лимиты
-            for limit in limits:
-                await new_db.execute(
-                    """INSERT INTO limits 
-                    (limit_id, tg_id, start_date, end_date, category, limit_sum) 
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (limit['limit_id'], limit['tg_id'], limit['start_date'], 
-                     limit['end_date'], limit['category'], limit['limit_sum'])
-                )
-            
-            await new_db.commit()
-            print("Миграция данных успешно завершена!")
-            
+            # Профиль PRAGMA бота, кроме внешних ключей: в старой базе они не проверялись,
+            # и транзакция удаленного пользователя не должна останавливать перенос
+            for name, value in DB_PRAGMAS.items():
+                if name != "foreign_keys":
+                    await new_db.execute(f"PRAGMA {name} = {value}")
+
+            progress = await _open_target(new_db)
+            started = time.monotonic()
+            await _copy_stage(old_db, new_db, progress, "users", USERS_QUERY, "tg_id", _write_users, chunk_size)
+            await _copy_stage(old_db, new_db, progress, "transactions", TRANSACTIONS_QUERY, "transaction_id",
+                              _write_transactions, chunk_size)
+            await _copy_stage(old_db, new_db, progress, "limits", LIMITS_QUERY, "limit_id", _write_limits,
+                              chunk_size)
+            await _finish(new_db, progress)
+            print(f"Миграция данных успешно завершена за {time.monotonic() - started:.1f} с!")
+
     except Exception as e:
         print(f"Ошибка при миграции данных: {e}")
         raise
 
+
+async def main():
+    parser = argparse.ArgumentParser(description="Перенос данных из резервной копии в новую базу")
+    parser.add_argument("--source", default=BACKUP_PATH)
+    parser.add_argument("--target", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=MIGRATION_CHUNK_SIZE)
+    args = parser.parse_args()
+    await migrate_data(args.source, args.target, args.chunk_size)
+
+
 if __name__ == "__main__":
-    asyncio.run(migrate_data()) 
\ No newline at end of file
+    asyncio.run(main())
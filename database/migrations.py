@@ -0,0 +1,356 @@
+"""версии схемы базы данных: единственный источник схемы и пошаговые миграции
+
+Запуск: python -m database.migrations [путь_к_базе]
+Печатает текущую версию схемы и применяет недостающие шаги. Бот делает то же при запуске.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+import aiosqlite
+
+from database.archive import ARCHIVE_INFO_SCHEMA
+from database.backfill_rollup import ROLLUP_SCHEMA, rebuild_rollup_online
+from database.balance_checkpoints import BALANCE_CHECKPOINTS_SCHEMA, rebuild_checkpoints
+from database.config import DB_PATH
+from database.limit_spent import LIMIT_SPENT_SCHEMA
+from database.shards import SHARD_INFO_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# Основная схема (шаг 1): таблицы, индексы и триггеры баланса, счетчиков категорий и проверки категорий
+SCHEMA = """
+-- Таблица пользователей
+CREATE TABLE users (
+    tg_id INTEGER PRIMARY KEY,
+    tg_username TEXT,
+    name TEXT,
+    total_sum INTEGER NOT NULL DEFAULT 0  -- копейки
+);
+
+-- Таблица категорий (порядок отображения задается position)
+CREATE TABLE categories (
+    category_id INTEGER PRIMARY KEY,
+    tg_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (tg_id) REFERENCES users(tg_id) ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX idx_categories_tg_id_name ON categories(tg_id, name);
+
+-- Таблица транзакций
+CREATE TABLE transactions (
+    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tg_id INTEGER,
+    date_time INTEGER NOT NULL,  -- секунды от эпохи по местным часам (см. database/units.py)
+    day TEXT GENERATED ALWAYS AS (date(date_time, 'unixepoch')) VIRTUAL,
+    type INTEGER NOT NULL,
+    description TEXT,
+    category_id INTEGER,
+    sum INTEGER NOT NULL CHECK (sum >= 0),  -- копейки
+    FOREIGN KEY (tg_id) REFERENCES users(tg_id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(category_id) ON DELETE SET NULL
+);
+CREATE INDEX idx_transactions_tg_id ON transactions(tg_id, date_time);
+CREATE INDEX idx_transactions_date_time ON transactions(date_time);
+-- Транзакции категории по дате (ключ постраничного вывода: rowid в индексе неявно идет
+-- последним, так что порядок (date_time, transaction_id) берется из индекса без сортировки);
+-- нужен и для ON DELETE SET NULL при удалении категории
+CREATE INDEX idx_transactions_category ON transactions(category_id, date_time);
+
+-- Таблица лимитов
+CREATE TABLE limits (
+    limit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tg_id INTEGER,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    limit_sum INTEGER NOT NULL CHECK (limit_sum >= 0),  -- копейки
+    spent INTEGER NOT NULL DEFAULT 0,  -- копейки
+    FOREIGN KEY (tg_id) REFERENCES users(tg_id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(category_id) ON DELETE CASCADE
+);
+CREATE INDEX idx_limits_tg_id ON limits(tg_id);
+CREATE INDEX idx_limits_dates ON limits(start_date, end_date);
+
+-- Признак массовой загрузки. Строка в таблице существует только внутри транзакции импорта
+-- (см. import_transactions в db_methods.py): пока она есть, построчные триггеры вставки
+-- не обновляют агрегаты, импорт пересчитывает их один раз на пачку.
+CREATE TABLE bulk_load (
+    tg_id INTEGER NOT NULL
+);
+
+-- Триггеры для total_sum
+CREATE TRIGGER update_total_sum_after_insert
+AFTER INSERT ON transactions
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE users
+    SET total_sum = total_sum + 
+        CASE NEW.type 
+            WHEN 0 THEN NEW.sum 
+            WHEN 1 THEN -NEW.sum 
+        END
+    WHERE tg_id = NEW.tg_id;
+END;
+
+CREATE TRIGGER update_total_sum_after_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE users
+    SET total_sum = total_sum - 
+        CASE OLD.type 
+            WHEN 0 THEN OLD.sum 
+            WHEN 1 THEN -OLD.sum 
+        END
+    WHERE tg_id = OLD.tg_id;
+END;
+
+CREATE TRIGGER update_total_sum_after_update
+AFTER UPDATE ON transactions
+BEGIN
+    UPDATE users
+    SET total_sum = total_sum - 
+        CASE OLD.type 
+            WHEN 0 THEN OLD.sum 
+            WHEN 1 THEN -OLD.sum 
+        END + 
+        CASE NEW.type 
+            WHEN 0 THEN NEW.sum 
+            WHEN 1 THEN -NEW.sum 
+        END
+    WHERE tg_id = NEW.tg_id;
+END;
+
+-- Триггеры для categories.transaction_count
+CREATE TRIGGER category_count_after_insert
+AFTER INSERT ON transactions
+WHEN NEW.category_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    UPDATE categories
+    SET transaction_count = transaction_count + 1
+    WHERE category_id = NEW.category_id;
+END;
+
+CREATE TRIGGER category_count_after_delete
+AFTER DELETE ON transactions
+WHEN OLD.category_id IS NOT NULL
+BEGIN
+    UPDATE categories
+    SET transaction_count = transaction_count - 1
+    WHERE category_id = OLD.category_id;
+END;
+
+CREATE TRIGGER category_count_after_update
+AFTER UPDATE OF category_id ON transactions
+WHEN OLD.category_id IS NOT NEW.category_id
+BEGIN
+    UPDATE categories
+    SET transaction_count = transaction_count - 1
+    WHERE category_id = OLD.category_id;
+
+    UPDATE categories
+    SET transaction_count = transaction_count + 1
+    WHERE category_id = NEW.category_id;
+END;
+
+-- Триггеры для проверки категорий
+CREATE TRIGGER check_transaction_category
+BEFORE INSERT ON transactions
+WHEN NEW.category_id IS NOT NULL
+BEGIN
+    SELECT RAISE(ABORT, 'Category not found in user categories')
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM categories
+        WHERE category_id = NEW.category_id
+        AND tg_id = NEW.tg_id
+    );
+END;
+
+CREATE TRIGGER check_limit_category
+BEFORE INSERT ON limits
+BEGIN
+    SELECT RAISE(ABORT, 'Category not found in user categories')
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM categories
+        WHERE category_id = NEW.category_id
+        AND tg_id = NEW.tg_id
+    );
+END;
+"""
+
+VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at INTEGER NOT NULL  -- секунды от эпохи (UTC)
+);
+"""
+
+# Поиск истекающих завтра лимитов (get_expiring_limits): idx_limits_dates начинается со start_date
+LIMITS_END_DATE_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_limits_end_date ON limits(end_date);
+"""
+
+# Загруженные выписки (import_transactions со statement): сколько строк файла уже зафиксировано.
+# Счетчик обновляется в той же транзакции, что и пачка строк, поэтому прерванный импорт продолжается
+# при повторной отправке файла с места остановки, а полностью загруженный файл не импортируется дважды.
+STATEMENT_IMPORTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS statement_imports (
+    tg_id INTEGER NOT NULL,
+    file_hash TEXT NOT NULL,  -- sha256 содержимого файла
+    imported INTEGER NOT NULL DEFAULT 0,  -- строк выписки, уже вставленных в transactions
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tg_id, file_hash),
+    FOREIGN KEY (tg_id) REFERENCES users(tg_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+"""
+
+
+
+class Migration(NamedTuple):
+    """
+    шаг миграции схемы.
+
+    script выполняется одной транзакцией. если задан online, он вызывается после script
+    и работает порциями с фиксацией между ними, не блокируя запись надолго; такой шаг
+    должен быть повторяемым, потому что после сбоя он выполняется заново целиком.
+    номер версии записывается в schema_version после успешного выполнения шага.
+
+    новые индексы добавляются через CREATE INDEX IF NOT EXISTS, колонки - через
+    ALTER TABLE ... ADD COLUMN: sqlite строит индекс одним проходом по таблице
+    и добавляет колонку без перезаписи строк, а читатели в режиме WAL при этом не блокируются.
+    """
+    version: int
+    name: str
+    script: str
+    online: Optional[Callable[[aiosqlite.Connection], Awaitable[object]]] = None
+
+
+async def _recompute_limit_spent(db: aiosqlite.Connection) -> None:
+    """Пересчет spent всех лимитов по daily_rollup одним запросом, то есть атомарно с записью бота."""
+    await db.execute(
+        """
+        UPDATE limits
+        SET spent = (
+            SELECT COALESCE(SUM(r.total), 0)
+            FROM daily_rollup r
+            WHERE r.tg_id = limits.tg_id
+            AND r.category_id = limits.category_id
+            AND r.type = 1
+            AND r.day >= limits.start_date AND r.day <= limits.end_date
+        )
+        """
+    )
+    await db.commit()
+
+
+async def _rebuild_balance_checkpoints(db: aiosqlite.Connection) -> None:
+    """Заполнение остатков по daily_rollup одной транзакцией, то есть атомарно с записью бота."""
+    await db.execute("BEGIN IMMEDIATE")
+    await rebuild_checkpoints(db)
+    await db.commit()
+
+
+# Шаги по возрастанию версии. Уже примененные шаги не меняются: изменение схемы - новый шаг в конце.
+MIGRATIONS = [
+    Migration(1, "core", SCHEMA),
+    Migration(2, "daily_rollup", ROLLUP_SCHEMA, rebuild_rollup_online),
+    Migration(3, "limit_spent", LIMIT_SPENT_SCHEMA, _recompute_limit_spent),
+    Migration(4, "shard_info", SHARD_INFO_SCHEMA),
+    Migration(5, "archive", ARCHIVE_INFO_SCHEMA),
+    Migration(6, "balance_checkpoints", BALANCE_CHECKPOINTS_SCHEMA, _rebuild_balance_checkpoints),
+    Migration(7, "limits_end_date", LIMITS_END_DATE_SCHEMA),
+    Migration(8, "statement_imports", STATEMENT_IMPORTS_SCHEMA),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def get_version(db: aiosqlite.Connection) -> int:
+    """
+    текущая версия схемы: 0 - пустая база.
+
+    база, созданная до появления schema_version, но уже с таблицей categories, считается
+    версией 1: следующие шаги повторяемы и досоздадут и пересчитают все остальное.
+    """
+    cursor = await db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('schema_version', 'users', 'categories')"
+    )
+    tables = {row[0] for row in await cursor.fetchall()}
+    if "schema_version" in tables:
+        cursor = await db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return (await cursor.fetchone())[0]
+    if "categories" in tables:
+        return 1
+    if "users" in tables:
+        raise RuntimeError("база в старом формате (категории в JSON), перенесите данные: "
+                           "python -m database.migrate_data")
+    return 0
+
+
+async def _stamp(db: aiosqlite.Connection, migration: Migration) -> None:
+    await db.execute(
+        "INSERT OR REPLACE INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+        (migration.version, migration.name, int(time.time()))
+    )
+    await db.commit()
+
+
+async def apply_migrations(db: aiosqlite.Connection) -> int:
+    """
+    применение всех шагов, версия которых больше текущей.
+
+    если схема уже последней версии, выполняется один запрос к schema_version.
+
+    аргументы:
+        db (aiosqlite.Connection): Соединение с базой.
+
+    возвращает:
+        int: Количество примененных шагов.
+    """
+    version = await get_version(db)
+    if version >= LATEST_VERSION:
+        return 0
+
+    await db.executescript(VERSION_SCHEMA)
+    if version == 1:
+        # База без schema_version, созданная раньше: отмечаем, что основная схема в ней есть
+        await _stamp(db, MIGRATIONS[0])
+
+    applied = 0
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        started = time.monotonic()
+        # executescript не фиксирует транзакцию, начатую в самом скрипте: без онлайн-части
+        # скрипт и номер версии фиксируются вместе
+        await db.executescript(f"BEGIN;{migration.script}")
+        if migration.online is not None:
+            await db.commit()
+            await migration.online(db)
+        await _stamp(db, migration)
+        applied += 1
+        logger.info("Schema migration %d (%s) applied in %.1f s",
+                    migration.version, migration.name, time.monotonic() - started)
+    return applied
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    async with aiosqlite.connect(db_path) as db:
+        version = await get_version(db)
+        print(f"Версия схемы: {version}, последняя: {LATEST_VERSION}")
+        applied = await apply_migrations(db)
+    if applied:
+        print(f"Применено шагов: {applied}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""проверка планов всех запросов хранилища на настоящих вызовах методов
+
+Запуск: python -m database.plan_guard [--users 20] [--transactions 500] [--seed 1]
+Во временном каталоге создается база, заполняется через fill_random.py, и вызывается каждый метод
+хранилища - до и после переноса старых транзакций в архив. Соединения при этом выполняют
+EXPLAIN QUERY PLAN для каждого нового запроса (query_stats.explain, см. query_stats.py).
+Завершается с кодом 1, если запрос к transactions или limits выполняется полным сканированием.
+Небольшой прогон выполняет тест tests/test_plan_guard.py.
+
+В отличие от check_query_plans.py, который сверяет планы нескольких запросов с ожидаемыми индексами,
+здесь проверяются все запросы, которые методы действительно выполняют, включая собранные из частей.
+Запросы миграций (open_storage) и планы внутри триггеров не проверяются.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+
+async def exercise(tg_ids: list, today: date) -> None:
+    """Вызов каждого метода хранилища для пользователей tg_ids."""
+    from database import storage
+
+    start = today.replace(day=1)
+    year_ago = start.replace(year=start.year - 1)
+    for tg_id in tg_ids:
+        categories = await storage.get_categories(tg_id)
+        category = categories[0]
+        await storage.get_user(tg_id)
+        await storage.is_registered(tg_id)
+        await storage.add_transaction(tg_id, 1, 150.5, category, "plan guard")
+        await storage.add_transaction(tg_id, 0, 1000, None, "plan guard")
+        await storage.import_transactions(tg_id, [(today.isoformat(), 1, 99.9, category, "plan guard")], "plan-guard")
+        await storage.get_statement_import(tg_id, "plan-guard")
+        await storage.finish_statement_import(tg_id, "plan-guard")
+        await storage.get_transactions(tg_id, 10)
+        async for _ in storage.iter_transactions(tg_id, chunk_size=100):
+            pass
+        await storage.get_transactions_by_period(tg_id, year_ago.isoformat(), today.isoformat())
+        page = await storage.get_transactions_by_category(tg_id, category, 5)
+        if page:
+            older = await storage.get_transactions_by_category(tg_id, category, 5, after_id=page[-1].transaction_id)
+            if older:
+                await storage.get_transactions_by_category(tg_id, category, 5, before_id=older[0].transaction_id)
+        await storage.get_period_totals(tg_id, year_ago.isoformat(), today.isoformat())
+        await storage.get_balance(tg_id, today.isoformat())
+        await storage.get_balance(tg_id, year_ago.isoformat())
+        await storage.add_limit(tg_id, start.isoformat(), (start + timedelta(days=27)).isoformat(), category, 5000)
+        limits = await storage.get_user_limits(tg_id)
+        await storage.get_limit_usage(tg_id, category, start.isoformat(), today.isoformat())
+        await storage.check_limit_violation(tg_id, category, 100)
+        if limits:
+            await storage.delete_limit(limits[-1]["limit_id"], tg_id)
+    await storage.get_expiring_limits()
+    await storage.get_violated_limits()
+
+
+async def run(users: int, transactions: int, seed: int) -> bool:
+    from database import storage
+    from database.fill_random import fill
+    from database.query_stats import query_stats
+
+    await storage.open_storage()
+    try:
+        query_stats.explain = True
+        await fill(users, transactions, 24, seed, 1)
+        tg_ids = list(range(1, users + 1))
+        today = date.today()
+        await exercise(tg_ids, today)
+        archived = await storage.archive_transactions()
+        await exercise(tg_ids, today)
+        # Методы, меняющие пользователя целиком, - в конце
+        categories = await storage.get_categories(tg_ids[0])
+        await storage.add_category(tg_ids[0], "Проверка планов")
+        await storage.update_categories(tg_ids[0], list(reversed(categories)))
+        await storage.update_user(tg_ids[0], name="plan guard")
+        await storage.delete_user(tg_ids[-1])
+    finally:
+        await storage.close_storage()
+
+    print(f"Проверено запросов: {len(query_stats.explained)}, перенесено в архив транзакций: {archived}")
+    for sql, plan in query_stats.full_scans.items():
+        print(f"FAIL {sql}\n     план: {'; '.join(plan)}")
+    return not query_stats.full_scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка планов всех запросов хранилища")
+    parser.add_argument("--users", type=int, default=20, help="пользователей в проверочной базе")
+    parser.add_argument("--transactions", type=int, default=500, help="транзакций на пользователя")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генерации базы")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        # Хранилище читает настройки при импорте: база и архив задаются до него
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["DB_PATH"] = os.path.join(directory, "plan_guard.db")
+        os.environ.setdefault("DB_ARCHIVE_AFTER_DAYS", "90")
+        os.environ["DB_QUERY_STATS"] = "1"
+        ok = asyncio.run(run(args.users, args.transactions, args.seed))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
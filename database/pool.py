@@ -0,0 +1,237 @@
+"""пул постоянных соединений aiosqlite, открываемый при старте бота и закрываемый при остановке"""
+
+import asyncio
+import logging
+import time
+import urllib.parse
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+
+from database import query_stats
+
+logger = logging.getLogger(__name__)
+
+# Числовые значения, которые sqlite возвращает при чтении PRAGMA, и их символьные имена
+_PRAGMA_NAMES = {
+    "synchronous": {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"},
+    "temp_store": {0: "DEFAULT", 1: "FILE", 2: "MEMORY"},
+    "foreign_keys": {0: "OFF", 1: "ON"},
+}
+
+
+def _normalize_pragma(name: str, value: Any) -> str:
+    """Приведение значения PRAGMA к виду, в котором его можно сравнить с настройкой."""
+    value = _PRAGMA_NAMES.get(name, {}).get(value, value)
+    return str(value).upper()
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не освободилось за отведенное время."""
+
+
+class ConnectionPool:
+    """
+    пул соединений с базой sqlite.
+
+    каждое соединение aiosqlite держит свой рабочий поток, поэтому соединения открываются
+    один раз и переиспользуются между вызовами. перед выдачей соединение, простаивавшее
+    дольше health_check_interval, проверяется запросом SELECT 1 и пересоздается при ошибке.
+    к каждому новому соединению применяется профиль pragmas (см. DB_PRAGMAS в config.py).
+
+    attach - подключаемые к каждому соединению базы {имя схемы: путь}, например архив.
+    при readonly=True файл открывается в режиме mode=ro и с PRAGMA query_only: такие соединения
+    только читают и в режиме WAL не ждут пишущее соединение. при instrument=True соединения
+    открываются через query_stats.connect и замеряют каждый запрос. вызовы acquire(), которым не хватило
+    соединения, ждут в очереди по порядку; глубину очереди и время ожидания отдает stats().
+    """
+
+    def __init__(self, path: str, size: int = 5, acquire_timeout: float = 10.0,
+                 health_check_interval: float = 60.0, pragmas: Optional[Dict[str, Any]] = None,
+                 readonly: bool = False, attach: Optional[Dict[str, str]] = None,
+                 instrument: bool = False) -> None:
+        if size < 1:
+            raise ValueError("Размер пула должен быть положительным")
+        self.path = path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(pragmas or {})
+        self.readonly = readonly
+        self.attach = dict(attach or {})
+        self.instrument = instrument
+        self.waiting = 0  # Вызовов acquire(), ждущих соединение (глубина очереди)
+        self.max_waiting = 0
+        self.acquired = 0  # Выдано соединений
+        self.wait_time = 0.0  # Суммарное ожидание соединения, сек
+        self.max_wait = 0.0
+        self._idle: Optional[asyncio.LifoQueue] = None
+        self._connections: List[aiosqlite.Connection] = []
+        self._last_used: dict = {}
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._idle is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открытие нового соединения."""
+        connect = query_stats.connect if self.instrument else aiosqlite.connect
+        if self.readonly:
+            db = await connect(f"file:{urllib.parse.quote(self.path)}?mode=ro", uri=True)
+        else:
+            db = await connect(self.path)
+        try:
+            # Подключаем до PRAGMA: journal_mode без имени схемы применяется ко всем подключенным базам
+            for schema, path in self.attach.items():
+                if self.readonly:
+                    path = f"file:{urllib.parse.quote(path)}?mode=ro"
+                await db.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            for name, value in self.pragmas.items():
+                await db.execute(f"PRAGMA {name} = {value}")
+            if self.readonly:
+                await db.execute("PRAGMA query_only = ON")
+        except Exception:
+            await db.close()
+            raise
+        self._last_used[id(db)] = time.monotonic()
+        return db
+
+    async def open(self) -> None:
+        """Открытие всех соединений пула. Повторный вызов ничего не делает."""
+        async with self._open_lock:
+            if self.is_open:
+                return
+            idle = asyncio.LifoQueue()
+            for _ in range(self.size):
+                db = await self._connect()
+                self._connections.append(db)
+                idle.put_nowait(db)
+            self._idle = idle
+
+    async def verify_pragmas(self) -> Dict[str, Any]:
+        """
+        чтение фактически действующих PRAGMA и запись их в лог.
+
+        sqlite может молча не применить настройку (например, mmap_size ограничен при сборке,
+        а journal_mode=WAL недоступен на сетевой ФС), поэтому расхождения логируются как предупреждения.
+
+        возвращает:
+            Dict[str, Any]: Действующие значения PRAGMA из профиля.
+        """
+        effective = {}
+        async with self.acquire() as db:
+            for name in self.pragmas:
+                cursor = await db.execute(f"PRAGMA {name}")
+                row = await cursor.fetchone()
+                effective[name] = row[0] if row else None
+
+        for name, wanted in self.pragmas.items():
+            actual = effective[name]
+            if _normalize_pragma(name, actual) == _normalize_pragma(name, wanted):
+                logger.info("PRAGMA %s = %s", name, _PRAGMA_NAMES.get(name, {}).get(actual, actual))
+            else:
+                logger.warning("PRAGMA %s = %s (в профиле указано %s)", name, actual, wanted)
+        return effective
+
+    async def close(self) -> None:
+        """Закрытие всех соединений пула."""
+        async with self._open_lock:
+            connections, self._connections = self._connections, []
+            self._idle = None
+            self._last_used.clear()
+            for db in connections:
+                try:
+                    await db.close()
+                except Exception as e:
+                    logger.warning("Error closing connection: %s", e)
+
+    async def _replace(self, db: aiosqlite.Connection) -> aiosqlite.Connection:
+        """Закрытие неисправного соединения и открытие нового на его месте."""
+        try:
+            await db.close()
+        except Exception:
+            pass
+        self._last_used.pop(id(db), None)
+        new_db = await self._connect()
+        self._connections = [new_db if conn is db else conn for conn in self._connections]
+        return new_db
+
+    async def _check(self, db: aiosqlite.Connection) -> aiosqlite.Connection:
+        """Проверка соединения, простаивавшего дольше health_check_interval."""
+        if time.monotonic() - self._last_used.get(id(db), 0.0) < self.health_check_interval:
+            return db
+        try:
+            await db.execute("SELECT 1")
+            return db
+        except Exception as e:
+            logger.warning("Pool connection failed health check, reconnecting: %s", e)
+            return await self._replace(db)
+
+    async def _release(self, db: aiosqlite.Connection) -> None:
+        """Возврат соединения в пул в чистом состоянии."""
+        try:
+            # Незавершенная транзакция не должна достаться следующему вызову
+            if db.in_transaction:
+                await db.rollback()
+            db.row_factory = None
+        except Exception as e:
+            logger.warning("Pool connection is broken, reconnecting: %s", e)
+            db = await self._replace(db)
+        self._last_used[id(db)] = time.monotonic()
+        if self._idle is not None and db in self._connections:
+            self._idle.put_nowait(db)
+        else:
+            # Пул закрыли, пока соединение было занято
+            await db.close()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        получение соединения из пула на время блока async with.
+
+        если пул еще не открыт (например, при запуске отдельного скрипта), он открывается автоматически.
+
+        исключения:
+            PoolTimeoutError: если за acquire_timeout секунд не освободилось ни одного соединения.
+        """
+        if not self.is_open:
+            await self.open()
+        started = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            db = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(
+                f"Нет свободных соединений с базой за {self.acquire_timeout} с (размер пула {self.size})"
+            ) from None
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+        try:
+            db = await self._check(db)
+        except BaseException:
+            self._idle.put_nowait(db)
+            raise
+        try:
+            yield db
+        finally:
+            await self._release(db)
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди ожидающих вызовов, занятые соединения и время ожидания соединения."""
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            "size": self.size,
+            "in_use": len(self._connections) - idle,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "acquired": self.acquired,
+            "avg_wait_ms": self.wait_time / self.acquired * 1000 if self.acquired else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
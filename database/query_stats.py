@@ -0,0 +1,406 @@
+"""учет времени выполнения запросов sqlite: гистограммы по запросам, число строк и лог медленных запросов
+
+При DB_QUERY_STATS=1 (см. config.py) соединения пула открываются через connect() из этого модуля:
+время каждого запроса замеряется в рабочем потоке aiosqlite, вместе с чтением строк из курсора,
+и складывается в query_stats по тексту запроса (одинаковые запросы с разными значениями параметров
+учитываются вместе). Запросы дольше DB_SLOW_QUERY_MS пишутся в лог с типами параметров, но без значений.
+Сводку отдает query_stats.summary(), при остановке бота она пишется в лог.
+
+При query_stats.explain = True для каждого нового запроса сначала выполняется EXPLAIN QUERY PLAN,
+а полные сканирования transactions и limits собираются в query_stats.full_scans (см. plan_guard.py).
+"""
+
+import bisect
+import logging
+import re
+import sqlite3
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+try:
+    from aiosqlite.context import contextmanager
+except ImportError:  # другая версия aiosqlite: замер не включается, см. connect()
+    def contextmanager(method: Callable) -> Callable:
+        return method
+
+logger = logging.getLogger(__name__)
+
+# InstrumentedConnection опирается на внутренние методы aiosqlite (_execute, _conn, context.contextmanager),
+# проверенные на этой версии (она же закреплена в requirements.txt); с другой версией соединения
+# открываются без замера
+SUPPORTED_AIOSQLITE = "0.21."
+
+# Верхние границы корзин гистограммы, мс; последняя корзина - все, что дольше
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Таблицы, полное сканирование которых считается регрессией плана
+GUARDED_TABLES = {"transactions", "limits"}
+
+# Список из нескольких "?" (IN (?, ?, ?)) сворачивается, чтобы запрос с любым числом значений учитывался один раз
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+# Таблица после FROM/JOIN и ее псевдоним: в плане запроса таблица называется псевдонимом
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(?:(\w+)\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {
+    "where", "join", "left", "inner", "cross", "on", "using", "group", "order", "limit", "union",
+    "set", "natural", "window", "having", "values", "indexed", "not",
+}
+# Операторы, для которых есть план выполнения
+_EXPLAINED = ("select", "with", "insert", "update", "delete", "replace")
+
+_NORMALIZED_CACHE_SIZE = 1000
+
+
+def param_shape(parameters: Any) -> str:
+    """
+    описание параметров запроса без значений: типы позиционных или имена и типы именованных.
+
+    строки описываются длиной: по ней видно, например, длинный список или описание.
+    """
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{name}: {_value_shape(value)}" for name, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_value_shape(value) for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _value_shape(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return f"str[{len(value)}]"
+    if isinstance(value, bytes):
+        return f"bytes[{len(value)}]"
+    return type(value).__name__
+
+
+def _many_shape(parameters: Any) -> str:
+    """Описание параметров executemany: число наборов и форма первого."""
+    if isinstance(parameters, (list, tuple)):
+        return f"{len(parameters)} x {param_shape(parameters[0])}" if parameters else "0 x ()"
+    return f"{type(parameters).__name__} x ?"
+
+
+def full_scans(sql: str, plan: List[str]) -> List[str]:
+    """
+    строки плана с полным сканированием таблиц из GUARDED_TABLES (в том числе архивной transactions).
+
+    SCAN по индексу (USING INDEX) - тоже обход всей таблицы и считается сканированием.
+    сканирование подзапроса, CTE и SCAN CONSTANT ROW не учитываются: таблицы внутри них
+    описаны в плане отдельными строками.
+    """
+    names = set(GUARDED_TABLES)
+    for _schema, table, alias in _TABLE_ALIAS.findall(sql):
+        if table.lower() in GUARDED_TABLES and alias and alias.lower() not in _NOT_ALIAS:
+            names.add(alias.lower())
+    scans = []
+    for line in plan:
+        match = re.match(r"SCAN (\w+)", line)
+        if match and match.group(1).lower() in names:
+            scans.append(line)
+    return scans
+
+
+class _Statement:
+    """Накопленные замеры одного запроса."""
+    __slots__ = ("calls", "errors", "rows", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0  # сек
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля q (0-100) в мс: верхняя граница корзины, в которую он попадает."""
+        rank = q / 100 * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max * 1000
+        return 0.0
+
+
+class _Execution:
+    """Выполнение запроса: время копится, пока из курсора читаются строки."""
+    __slots__ = ("sql", "parameters", "many", "elapsed", "rows")
+
+    def __init__(self, sql: str, parameters: Any, elapsed: float, rows: int = 0, many: bool = False) -> None:
+        self.sql = sql
+        self.parameters = parameters
+        self.many = many
+        self.elapsed = elapsed
+        self.rows = rows
+
+    @property
+    def shape(self) -> str:
+        # Описание параметров строится только для лога, чтобы не замедлять каждый запрос
+        return _many_shape(self.parameters) if self.many else param_shape(self.parameters)
+
+
+class QueryStats:
+    """
+    реестр замеров запросов по нормализованному тексту.
+
+    slow_ms - порог лога медленных запросов в мс (0 - не логировать).
+    при explain=True соединения перед первым выполнением каждого запроса получают его план
+    и складывают полные сканирования в full_scans {запрос: строки плана}.
+    """
+
+    def __init__(self, slow_ms: float = 100.0) -> None:
+        self.slow_ms = slow_ms
+        self.explain = False
+        self.statements: Dict[str, _Statement] = {}
+        self.full_scans: Dict[str, List[str]] = {}
+        self.explained: set = set()
+        self._normalized: Dict[str, str] = {}
+
+    def normalize(self, sql: str) -> str:
+        """Текст запроса в одну строку, со свернутыми списками параметров."""
+        key = self._normalized.get(sql)
+        if key is None:
+            key = _PLACEHOLDER_LIST.sub("?, ...", " ".join(sql.split()))
+            if len(self._normalized) >= _NORMALIZED_CACHE_SIZE:
+                self._normalized.clear()
+            self._normalized[sql] = key
+        return key
+
+    def _statement(self, sql: str) -> _Statement:
+        key = self.normalize(sql)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = _Statement()
+        return statement
+
+    def record(self, execution: _Execution) -> None:
+        """Учет завершенного выполнения и запись в лог, если оно медленное."""
+        statement = self._statement(execution.sql)
+        ms = execution.elapsed * 1000
+        statement.calls += 1
+        statement.rows += execution.rows
+        statement.total += execution.elapsed
+        statement.max = max(statement.max, execution.elapsed)
+        statement.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        if self.slow_ms and ms >= self.slow_ms:
+            logger.warning("Slow query: %.1f ms, %d rows, params %s: %s",
+                           ms, execution.rows, execution.shape, self.normalize(execution.sql))
+
+    def record_error(self, execution: _Execution, error: Exception) -> None:
+        """
+        учет запроса, завершившегося ошибкой sqlite.
+
+        нарушения ограничений (IntegrityError) - обычная ветка вызывающего кода, например
+        повторное add_category: они только считаются и пишутся в лог на уровне DEBUG.
+        """
+        self._statement(execution.sql).errors += 1
+        level = logging.DEBUG if isinstance(error, sqlite3.IntegrityError) else logging.ERROR
+        logger.log(level, "Query failed (%s: %s), params %s: %s",
+                   type(error).__name__, error, execution.shape, self.normalize(execution.sql))
+
+    def record_plan(self, sql: str, plan: List[str]) -> None:
+        """Проверка плана запроса на полное сканирование transactions и limits."""
+        key = self.normalize(sql)
+        scans = full_scans(sql, plan)
+        if scans:
+            self.full_scans[key] = plan
+            logger.error("Full scan (%s): %s", "; ".join(scans), key)
+
+    def summary(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        замеры запросов, отсортированные по суммарному времени.
+
+        возвращает:
+            List[Dict[str, Any]]: По запросу: sql, calls, errors, rows, total_ms, mean_ms, max_ms,
+            оценки p50_ms/p99_ms по гистограмме и сама гистограмма histogram {"<=граница": число}.
+        """
+        items = sorted(self.statements.items(), key=lambda item: item[1].total, reverse=True)
+        result = []
+        for sql, statement in items[:top]:
+            labels = [f"<={bound}" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+            result.append({
+                "sql": sql,
+                "calls": statement.calls,
+                "errors": statement.errors,
+                "rows": statement.rows,
+                "total_ms": round(statement.total * 1000, 3),
+                "mean_ms": round(statement.total * 1000 / statement.calls, 3) if statement.calls else 0.0,
+                "max_ms": round(statement.max * 1000, 3),
+                "p50_ms": statement.percentile(50),
+                "p99_ms": statement.percentile(99),
+                "histogram": {label: count for label, count in zip(labels, statement.buckets) if count},
+            })
+        return result
+
+    def log_summary(self, top: int = 10) -> None:
+        """Запись в лог самых затратных запросов."""
+        for item in self.summary(top):
+            logger.info("Query %.1f ms total, %d calls (%d errors), p50 <=%s ms, p99 <=%s ms, max %.1f ms, "
+                        "%d rows: %s", item["total_ms"], item["calls"], item["errors"], item["p50_ms"],
+                        item["p99_ms"], item["max_ms"], item["rows"], item["sql"][:200])
+
+    def reset(self) -> None:
+        """Сброс замеров и найденных сканирований."""
+        self.statements.clear()
+        self.full_scans.clear()
+        self.explained.clear()
+
+
+# Общий реестр всех соединений процесса
+query_stats = QueryStats()
+
+
+def _timed(function: Callable, *args: Any) -> Tuple[Any, float]:
+    """Вызов в рабочем потоке соединения с замером времени."""
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def _timed_execute(function: Callable, *args: Any) -> Tuple[sqlite3.Cursor, float, bool, int]:
+    """Выполнение запроса в рабочем потоке: курсор, время, возвращает ли запрос строки, rowcount."""
+    started = time.perf_counter()
+    cursor = function(*args)
+    elapsed = time.perf_counter() - started
+    return cursor, elapsed, cursor.description is not None, cursor.rowcount
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters: Any) -> List[tuple]:
+    """План запроса в рабочем потоке; row_factory соединения (например, transaction_factory) не применяется."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+
+
+class InstrumentedCursor(aiosqlite.Cursor):
+    """Курсор, время чтения строк которого добавляется к выполнению его запроса."""
+
+    def __init__(self, conn: "InstrumentedConnection", cursor: sqlite3.Cursor, execution: _Execution) -> None:
+        super().__init__(conn, cursor)
+        self._execution = execution
+
+    def _read(self, elapsed: float, rows: int, done: bool) -> None:
+        self._execution.elapsed += elapsed
+        self._execution.rows += rows
+        if done:
+            self._conn._finish(self._execution)
+
+    async def fetchone(self) -> Optional[sqlite3.Row]:
+        # Обычно запрос одной строки: выполнение учитывается сразу после чтения
+        row, elapsed = await self._execute(_timed, self._cursor.fetchone)
+        self._read(elapsed, row is not None, done=True)
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None) -> List[sqlite3.Row]:
+        args = () if size is None else (size,)
+        rows, elapsed = await self._execute(_timed, self._cursor.fetchmany, *args)
+        self._read(elapsed, len(rows), done=len(rows) < (size or self.arraysize))
+        return rows
+
+    async def fetchall(self) -> List[sqlite3.Row]:
+        rows, elapsed = await self._execute(_timed, self._cursor.fetchall)
+        self._read(elapsed, len(rows), done=True)
+        return rows
+
+
+class InstrumentedConnection(aiosqlite.Connection):
+    """
+    соединение aiosqlite с замером execute и executemany (executescript не замеряется).
+
+    выполнение запроса, возвращающего строки, учитывается, когда из курсора прочитаны все строки
+    или fetchone, а если курсор брошен недочитанным - при следующем запросе, commit, rollback или close.
+    """
+
+    def __init__(self, connector: Callable[[], sqlite3.Connection], iter_chunk_size: int,
+                 stats: QueryStats = query_stats) -> None:
+        super().__init__(connector, iter_chunk_size)
+        self._stats = stats
+        self._pending: Optional[_Execution] = None
+
+    def _finish(self, execution: Optional[_Execution] = None) -> None:
+        """Учет незавершенного выполнения (или только указанного, если оно еще не учтено)."""
+        pending = self._pending
+        if pending is not None and (execution is None or execution is pending):
+            self._pending = None
+            self._stats.record(pending)
+
+    async def _explain(self, sql: str, parameters: Any) -> None:
+        if not sql.lstrip().lower().startswith(_EXPLAINED):
+            return
+        key = self._stats.normalize(sql)
+        if key in self._stats.explained:
+            return
+        self._stats.explained.add(key)
+        rows = await self._execute(_explain, self._conn, sql, parameters)
+        self._stats.record_plan(sql, [row[3] for row in rows])
+
+    async def _timed_call(self, function: Callable, execution: _Execution) -> tuple:
+        try:
+            return await self._execute(_timed_execute, function, execution.sql, execution.parameters)
+        except sqlite3.Error as e:
+            self._stats.record_error(execution, e)
+            raise
+
+    @contextmanager
+    async def execute(self, sql: str, parameters: Optional[Any] = None) -> InstrumentedCursor:
+        if parameters is None:
+            parameters = []
+        self._finish()
+        if self._stats.explain:
+            await self._explain(sql, parameters)
+        execution = _Execution(sql, parameters, 0.0)
+        cursor, execution.elapsed, returns_rows, rowcount = await self._timed_call(self._conn.execute, execution)
+        if returns_rows:
+            self._pending = execution
+        else:
+            execution.rows = max(rowcount, 0)
+            self._stats.record(execution)
+        return InstrumentedCursor(self, cursor, execution)
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters: Any) -> InstrumentedCursor:
+        self._finish()
+        if isinstance(parameters, (list, tuple)) and parameters and self._stats.explain:
+            await self._explain(sql, parameters[0])
+        execution = _Execution(sql, parameters, 0.0, many=True)
+        cursor, execution.elapsed, _, rowcount = await self._timed_call(self._conn.executemany, execution)
+        execution.rows = max(rowcount, 0)
+        self._stats.record(execution)
+        return InstrumentedCursor(self, cursor, execution)
+
+    async def commit(self) -> None:
+        self._finish()
+        await super().commit()
+
+    async def rollback(self) -> None:
+        self._finish()
+        await super().rollback()
+
+    async def close(self) -> None:
+        self._finish()
+        await super().close()
+
+
+_supported = getattr(aiosqlite, "__version__", "").startswith(SUPPORTED_AIOSQLITE)
+_warned = False  # Предупреждение о неподходящей версии пишется один раз
+
+
+def connect(database: str, iter_chunk_size: int = 64, **kwargs: Any) -> aiosqlite.Connection:
+    """
+    аналог aiosqlite.connect: соединение с замером запросов в общем реестре query_stats.
+
+    если версия aiosqlite не проверена (см. SUPPORTED_AIOSQLITE), возвращается обычное соединение.
+    """
+    global _warned
+    if not _supported:
+        if not _warned:
+            _warned = True
+            logger.warning("Query stats disabled: aiosqlite %s is not supported (expected %sx)",
+                           getattr(aiosqlite, "__version__", "?"), SUPPORTED_AIOSQLITE)
+        return aiosqlite.connect(database, iter_chunk_size=iter_chunk_size, **kwargs)
+    return InstrumentedConnection(partial(sqlite3.connect, database, **kwargs), iter_chunk_size)
+
@@ -0,0 +1,48 @@
+"""компактные записи результатов запросов: кортежи с доступом к полям по имени, как у словаря"""
+
+import sqlite3
+from typing import Any, NamedTuple, Optional
+
+
+class Transaction(NamedTuple):
+    """
+    транзакция из выборки.
+
+    хранится как кортеж без словаря атрибутов; t.sum и t["sum"] равнозначны, поэтому
+    обработчики, написанные под словари, продолжают работать.
+    """
+
+    transaction_id: int
+    date_time: str
+    type: int
+    description: Optional[str]
+    category: Optional[str]
+    sum: float
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self) -> tuple:
+        return self._fields
+
+
+def transaction_factory(cursor: sqlite3.Cursor, row: tuple) -> Transaction:
+    """row_factory для выборок с колонками TRANSACTION_COLUMNS."""
+    return Transaction._make(row)
+
+
+class TransactionPage(list):
+    """Страница транзакций с общим количеством транзакций в выборке."""
+
+    __slots__ = ("total_count",)
+
+    def __init__(self, transactions: list, total_count: int) -> None:
+        super().__init__(transactions)
+        self.total_count = total_count
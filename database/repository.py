@@ -0,0 +1,89 @@
+"""интерфейс хранилища: методы для пользователей, транзакций, категорий и лимитов, общие для всех реализаций
+
+реализации: модуль db_methods (sqlite) и MemoryRepository (memory_repository.py). обработчики
+получают методы выбранной реализации из database.storage. суммы на входе и выходе в рублях,
+время - местное время бота (см. units.py), ошибки те же: ValueError при неизвестной категории
+или пользователе.
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Protocol, Tuple
+
+from aiogram import Bot
+
+from database.records import Transaction, TransactionPage
+
+
+class Repository(Protocol):
+    """Методы хранилища; описание аргументов и поведения - у одноименных функций в db_methods.py."""
+
+    # Жизненный цикл: вызываются при старте и остановке бота
+    async def open_storage(self) -> None: ...
+
+    async def close_storage(self) -> None: ...
+
+    # Пользователи
+    async def add_user(self, tg_id: int, tg_username: Optional[str] = None) -> None: ...
+
+    async def update_user(self, tg_id: int, **kwargs: Any) -> None: ...
+
+    async def get_user(self, tg_id: int) -> Optional[Dict[str, Any]]: ...
+
+    async def delete_user(self, tg_id: int) -> bool: ...
+
+    async def is_registered(self, tg_id: int) -> bool: ...
+
+    # Категории
+    async def add_category(self, tg_id: int, category: str) -> None: ...
+
+    async def get_categories(self, tg_id: int) -> List[str]: ...
+
+    async def update_categories(self, tg_id: int, new_categories: List[str]) -> None: ...
+
+    # Транзакции
+    async def add_transaction(self, tg_id: int, type_: int, sum_: float, category: Optional[str] = None,
+                              description: Optional[str] = None, bot: Optional[Bot] = None) -> int: ...
+
+    async def import_transactions(
+        self, tg_id: int, rows: List[Tuple[Any, int, float, Optional[str], Optional[str]]],
+        statement: Optional[str] = None
+    ) -> Dict[str, int]: ...
+
+    async def get_statement_import(self, tg_id: int, statement: str) -> Optional[Dict[str, int]]: ...
+
+    async def finish_statement_import(self, tg_id: int, statement: str) -> None: ...
+
+    async def get_transactions(self, tg_id: int, limit: int = 10) -> List[Transaction]: ...
+
+    def iter_transactions(self, tg_id: int, chunk_size: int = 1000) -> AsyncIterator[List[Transaction]]: ...
+
+    async def get_transactions_by_period(self, tg_id: int, start_date: str, end_date: str) -> List[Transaction]: ...
+
+    async def get_transactions_by_category(self, tg_id: int, category: str, items_per_page: int = 5,
+                                           after_id: Optional[int] = None,
+                                           before_id: Optional[int] = None) -> TransactionPage: ...
+
+    async def get_period_totals(self, tg_id: int, start_date: str, end_date: str) -> Dict[str, Any]: ...
+
+    async def get_balance(self, tg_id: int, end_date: str) -> float: ...
+
+    # Лимиты
+    async def add_limit(self, tg_id: int, start_date: str, end_date: str, category: str, limit_sum: float) -> bool: ...
+
+    async def get_user_limits(self, tg_id: int) -> list: ...
+
+    async def delete_limit(self, limit_id: int, tg_id: int) -> bool: ...
+
+    async def get_limit_usage(self, tg_id: int, category: str, start_date: str, end_date: str) -> float: ...
+
+    async def check_limit_violation(self, tg_id: int, category: str, amount: float) -> Optional[Dict[str, Any]]: ...
+
+    async def get_expiring_limits(self) -> List[Dict[str, Any]]: ...
+
+    def iter_violated_limits(self) -> AsyncIterator[Dict[str, Any]]: ...
+
+    async def get_violated_limits(self) -> List[Dict[str, Any]]: ...
+
+    # Обслуживание
+    async def archive_transactions(self) -> int: ...
+
+    async def backup_storage(self) -> List[str]: ...
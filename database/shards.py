@@ -0,0 +1,192 @@
+"""шардирование по пользователям: данные каждого пользователя целиком лежат в одном из нескольких файлов sqlite"""
+
+import asyncio
+import os
+import zlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import aiosqlite
+
+from database.archive import archive_path
+from database.pool import ConnectionPool
+
+T = TypeVar("T")
+
+# Номер шарда и их общее число, с которыми файл создан (шаг 4 в migrations.py).
+# Пользователь закреплен за шардом по хэшу tg_id, поэтому при другом DB_SHARDS
+# пользователи "потеряются" - это проверяется при запуске (ShardedPool.check_layout).
+SHARD_INFO_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shard_info (
+    shard INTEGER NOT NULL,
+    shards INTEGER NOT NULL
+);
+"""
+
+
+def shard_index(tg_id: int, shards: int) -> int:
+    """Номер шарда пользователя: crc32 от tg_id, не зависит от процесса и версии Python."""
+    if shards == 1:
+        return 0
+    return zlib.crc32(tg_id.to_bytes(8, "little", signed=True)) % shards
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """
+    пути к файлам шардов: database/data.db -> database/data.0.db, database/data.1.db, ...
+
+    при одном шарде используется сам db_path, то есть база без шардирования.
+    """
+    if shards < 1:
+        raise ValueError("Количество шардов должно быть положительным")
+    if shards == 1:
+        return [db_path]
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.{i}{ext or '.db'}" for i in range(shards)]
+
+
+async def merge_streams(streams: Iterable[AsyncIterator[T]], buffer: int = 100) -> AsyncIterator[T]:
+    """
+    слияние нескольких асинхронных потоков в один по мере готовности элементов.
+
+    потоки читаются одновременно; очередь ограничена buffer элементами, поэтому медленный
+    потребитель приостанавливает чтение, и в памяти не копится весь результат.
+    """
+    streams = list(streams)
+    if len(streams) == 1:
+        async for item in streams[0]:
+            yield item
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    done = object()
+
+    async def pump(stream: AsyncIterator[T]) -> None:
+        # Элементы идут парами (элемент, ошибка); done - поток закончился. При отмене
+        # задача ничего не кладет в очередь, чтобы не ждать места в ней
+        try:
+            async for item in stream:
+                await queue.put((item, None))
+        except Exception as e:
+            await queue.put((done, e))
+        else:
+            await queue.put((done, None))
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ShardedPool:
+    """
+    пулы соединений по два на файл шарда: одно пишущее соединение и пул соединений только для чтения.
+
+    методы, работающие с одним пользователем, берут соединение шарда этого пользователя:
+    для записи через acquire(tg_id), для чтения через read(tg_id). записи шарда идут через
+    единственное соединение по очереди, поэтому не ждут друг друга на блокировке sqlite, а
+    долгие чтения (отчеты, анализ) в режиме WAL идут параллельно и не задерживают commit.
+    запросы по всем пользователям выполняются на всех шардах одновременно через fan_out()
+    или по спискам pools и readers. ID транзакций, категорий и лимитов уникальны только
+    внутри шарда, поэтому обращаться к ним можно только вместе с tg_id.
+    """
+
+    def __init__(self, paths: List[str], size: int = 5, archive: bool = False, **pool_options: Any) -> None:
+        # Архив шарда (см. archive.py) подключается к каждому соединению как схема archive
+        attach = [{"archive": archive_path(path)} if archive else None for path in paths]
+        # Пишущие соединения, по одному на шард; вызовы acquire() ждут его в очереди
+        self.pools = [ConnectionPool(path, size=1, attach=attach[i], **pool_options) for i, path in enumerate(paths)]
+        # Соединения для чтения (mode=ro, query_only), size на шард
+        self.readers = [
+            ConnectionPool(path, size=size, readonly=True, attach=attach[i], **pool_options)
+            for i, path in enumerate(paths)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.pools)
+
+    def index(self, tg_id: int) -> int:
+        """Номер шарда пользователя."""
+        return shard_index(tg_id, len(self.pools))
+
+    def for_user(self, tg_id: int) -> ConnectionPool:
+        """Пул пишущего соединения шарда пользователя."""
+        return self.pools[self.index(tg_id)]
+
+    @asynccontextmanager
+    async def acquire(self, tg_id: int) -> AsyncIterator[aiosqlite.Connection]:
+        """Пишущее соединение с шардом пользователя (см. ConnectionPool.acquire)."""
+        async with self.for_user(tg_id).acquire() as db:
+            yield db
+
+    @asynccontextmanager
+    async def read(self, tg_id: int) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение только для чтения с шардом пользователя."""
+        reader = self.readers[self.index(tg_id)]
+        if not reader.is_open:
+            # Файл базы создает пишущее соединение, поэтому оно открывается первым
+            await self.open()
+        async with reader.acquire() as db:
+            yield db
+
+    async def fan_out(self, func: Callable[[ConnectionPool], Awaitable[T]],
+                      pools: Optional[List[ConnectionPool]] = None) -> List[T]:
+        """
+        одновременный вызов func(pool) для каждого шарда; результаты в порядке шардов.
+
+        по умолчанию func получает пулы пишущих соединений; для запросов на чтение передается pools=readers.
+        """
+        return list(await asyncio.gather(*(func(pool) for pool in (self.pools if pools is None else pools))))
+
+    async def open(self) -> None:
+        await self.fan_out(lambda pool: pool.open())
+        await self.fan_out(lambda pool: pool.open(), self.readers)
+
+    async def verify_pragmas(self) -> None:
+        for pool in self.pools + self.readers:
+            await pool.verify_pragmas()
+
+    async def close(self) -> None:
+        await self.fan_out(lambda pool: pool.close(), self.readers)
+        await self.fan_out(lambda pool: pool.close())
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Счетчики пулов по шардам: очередь к пишущему соединению (writer) и к соединениям чтения (readers)."""
+        return {
+            "writer": [pool.stats() for pool in self.pools],
+            "readers": [pool.stats() for pool in self.readers],
+        }
+
+    async def check_layout(self) -> None:
+        """
+        проверка, что каждый файл создан для того же номера шарда и того же их числа.
+
+        при первом запуске номер записывается в shard_info. таблица создается миграциями,
+        поэтому вызывать после apply_migrations.
+
+        исключения:
+            RuntimeError: если файл создан при другом DB_SHARDS или лежит не на своем месте.
+        """
+        for index, pool in enumerate(self.pools):
+            async with pool.acquire() as db:
+                cursor = await db.execute("SELECT shard, shards FROM shard_info")
+                row = await cursor.fetchone()
+                if row is None:
+                    await db.execute("INSERT INTO shard_info (shard, shards) VALUES (?, ?)", (index, len(self.pools)))
+                    await db.commit()
+                elif tuple(row) != (index, len(self.pools)):
+                    raise RuntimeError(
+                        f"{pool.path} - шард {row[0]} из {row[1]}, а ожидался шард {index} из {len(self.pools)}: "
+                        f"DB_SHARDS нельзя менять без переноса данных"
+                    )
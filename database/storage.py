@@ -0,0 +1,63 @@
+"""хранилище, выбранное настройкой STORAGE_BACKEND; обработчики импортируют методы отсюда, а не из реализации"""
+
+from database.config import STORAGE_BACKEND
+from database.repository import Repository
+
+
+def create_repository(backend: str = STORAGE_BACKEND) -> Repository:
+    """
+    реализация хранилища по имени.
+
+    аргументы:
+        backend (str): "sqlite" - модуль db_methods, "memory" - новый пустой MemoryRepository.
+
+    исключения:
+        ValueError: если имя хранилища неизвестно.
+    """
+    # Импорт по требованию: хранилище в памяти не создает пулы соединений sqlite
+    if backend == "sqlite":
+        from database import db_methods
+        return db_methods
+    if backend == "memory":
+        from database.memory_repository import MemoryRepository
+        return MemoryRepository()
+    raise ValueError(f"Неизвестное хранилище STORAGE_BACKEND={backend!r}, ожидается sqlite или memory")
+
+
+repository = create_repository()
+
+open_storage = repository.open_storage
+close_storage = repository.close_storage
+
+add_user = repository.add_user
+update_user = repository.update_user
+get_user = repository.get_user
+delete_user = repository.delete_user
+is_registered = repository.is_registered
+
+add_category = repository.add_category
+get_categories = repository.get_categories
+update_categories = repository.update_categories
+
+add_transaction = repository.add_transaction
+import_transactions = repository.import_transactions
+get_statement_import = repository.get_statement_import
+finish_statement_import = repository.finish_statement_import
+get_transactions = repository.get_transactions
+iter_transactions = repository.iter_transactions
+get_transactions_by_period = repository.get_transactions_by_period
+get_transactions_by_category = repository.get_transactions_by_category
+get_period_totals = repository.get_period_totals
+get_balance = repository.get_balance
+
+add_limit = repository.add_limit
+get_user_limits = repository.get_user_limits
+delete_limit = repository.delete_limit
+get_limit_usage = repository.get_limit_usage
+check_limit_violation = repository.check_limit_violation
+get_expiring_limits = repository.get_expiring_limits
+iter_violated_limits = repository.iter_violated_limits
+get_violated_limits = repository.get_violated_limits
+
+archive_transactions = repository.archive_transactions
+backup_storage = repository.backup_storage
@@ -0,0 +1,36 @@
+"""перевод сумм и времени между видом для обработчиков и видом хранения в базе
+
+суммы хранятся целым числом копеек, время - целым числом секунд от эпохи. время по-прежнему
+местное время бота без часового пояса (как и прежние ISO-строки): секунды считаются так,
+будто часы бота идут по UTC. поэтому date(date_time, 'unixepoch') дает местную дату
+и может быть детерминированным генерируемым столбцом.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+
+def to_minor(amount: Optional[float]) -> Optional[int]:
+    """Рубли -> копейки с округлением до ближайшей копейки."""
+    if amount is None:
+        return None
+    return int(round(amount * 100))
+
+
+def from_minor(amount: Optional[int]) -> Optional[float]:
+    """Копейки -> рубли."""
+    if amount is None:
+        return None
+    return amount / 100
+
+
+def to_epoch(value: Union[str, datetime]) -> int:
+    """Местное время (datetime или ISO-строка, в том числе просто дата) -> секунды от эпохи."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def from_epoch(value: int) -> str:
+    """Секунды от эпохи -> местное время ISO-строкой."""
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None).isoformat()
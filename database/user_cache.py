@@ -0,0 +1,74 @@
+"""кэш записей пользователей в памяти процесса: ограниченный размер, вытеснение LRU и время жизни"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Признак промаха: None - допустимое значение в кэше (пользователь не найден)
+MISSING = object()
+
+
+class UserCache:
+    """
+    кэш записей пользователей по tg_id.
+
+    записи живут не дольше ttl секунд, при переполнении вытесняется давно не читавшаяся.
+    кэшируется и отсутствие пользователя (None), поэтому после add_user запись нужно сбросить.
+    чтобы чтение, начатое до записи в базу, не положило в кэш устаревшие данные,
+    invalidate() увеличивает номер поколения, а put() с устаревшим поколением игнорируется.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[int, Tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Номер поколения; запоминается перед чтением из базы и передается в put()."""
+        return self._generation
+
+    def get(self, tg_id: int) -> Any:
+        """Запись из кэша или MISSING, если ее нет или она устарела."""
+        entry = self._entries.get(tg_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[tg_id]
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(tg_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tg_id: int, value: Any, generation: int) -> None:
+        """Сохранение записи, прочитанной из базы в поколении generation."""
+        if generation != self._generation or self.max_size < 1:
+            return
+        self._entries[tg_id] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(tg_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tg_id: Optional[int] = None) -> None:
+        """Сброс записи пользователя (или всего кэша, если tg_id не передан)."""
+        self._generation += 1
+        if tg_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(tg_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов, доля попаданий и текущий размер."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
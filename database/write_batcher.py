@@ -0,0 +1,125 @@
+"""групповая фиксация записей: вставки из многих вызовов выполняются одной транзакцией"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import aiosqlite
+
+from database.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Запись одной строки внутри общей транзакции: write(db, *args) -> результат для вызывающего
+WriteFunc = Callable[..., Awaitable[Any]]
+
+
+class WriteBatcher:
+    """
+    очередь записей с групповой фиксацией.
+
+    вызовы submit() ставятся в очередь, а фоновая задача забирает их пачками (до max_rows
+    записей или max_delay_ms миллисекунд с первой записи пачки) и выполняет одной транзакцией
+    с одним commit. записи выполняются строго в порядке постановки, поэтому порядок транзакций
+    каждого пользователя сохраняется, а триггеры срабатывают на каждую строку как обычно.
+    каждая запись выполняется в своей точке сохранения: ошибка одной записи возвращается только
+    ее вызывающему и не откатывает остальные записи пачки.
+    """
+
+    def __init__(self, pool: ConnectionPool, write: WriteFunc, max_rows: int = 100,
+                 max_delay_ms: float = 20.0) -> None:
+        if max_rows < 1:
+            raise ValueError("Размер пачки должен быть положительным")
+        self.pool = pool
+        self.write = write
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.batches = 0  # Выполнено пачек
+        self.rows = 0  # Выполнено записей
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, *args: Any) -> Any:
+        """
+        постановка записи в очередь и ожидание ее фиксации.
+
+        возвращает:
+            Any: Результат write(db, *args) после commit пачки (например, ID вставленной строки).
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((args, future))
+        return await future
+
+    async def close(self) -> None:
+        """Фиксация уже поставленных записей и остановка фоновой задачи."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        """Сбор пачек из очереди до получения признака остановки (None)."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[tuple, asyncio.Future]]) -> None:
+        """Выполнение пачки записей одной транзакцией и передача результатов вызывающим."""
+        results = []
+        try:
+            async with self.pool.acquire() as db:
+                await db.execute("BEGIN IMMEDIATE")
+                for args, future in batch:
+                    results.append(await self._write_one(db, args))
+                await db.commit()
+        except Exception as e:
+            logger.warning("Write batch of %d rows failed: %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), (result, error) in zip(batch, results):
+            if future.done():
+                continue  # Вызывающий перестал ждать
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _write_one(self, db: aiosqlite.Connection, args: tuple) -> Tuple[Any, Optional[Exception]]:
+        """Выполнение одной записи в своей точке сохранения."""
+        await db.execute("SAVEPOINT batch_item")
+        try:
+            result = await self.write(db, *args)
+        except Exception as e:
+            await db.execute("ROLLBACK TO batch_item")
+            await db.execute("RELEASE batch_item")
+            return None, e
+        await db.execute("RELEASE batch_item")
+        return result, None
@@ -10,7 +10,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from keyboards.for_analysys import get_period_kb, get_retry_kb
-from database.db_methods import get_transactions_by_period, get_user, get_user_limits
+from database.storage import get_period_totals, get_user, get_user_limits
 from keyboards.for_start import get_menu_kb
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
@@ -181,17 +181,16 @@ async def show_analysis(callback: types.CallbackQuery, state: FSMContext):
         end_date = datetime.fromisoformat(data['end_date']).date()
         period = data['period']
 
-        # Получение транзакций
-        transactions = await get_transactions_by_period(tg_id, start_date.isoformat(), end_date.isoformat())
+        # Получение итогов за период по дневным итогам
+        totals = await get_period_totals(tg_id, start_date.isoformat(), end_date.isoformat())
 
         # Расчет доходов и расходов по категориям
-        income = sum(t['sum'] for t in transactions if t['type'] == 0)
-        expenses = sum(t['sum'] for t in transactions if t['type'] == 1)
+        income = totals['income']
+        expenses = totals['expenses']
         expenses_by_category = {}
-        for t in transactions:
-            if t['type'] == 1:
-                category = t['category'] or 'Без категории'
-                expenses_by_category[category] = expenses_by_category.get(category, 0) + t['sum']
+        for category, total in totals['expenses_by_category'].items():
+            category = category or 'Без категории'
+            expenses_by_category[category] = expenses_by_category.get(category, 0) + total
 
         # Проверяем наличие лимитов у пользователя
         user_limits = await get_user_limits(tg_id)
@@ -12,7 +12,7 @@ from aiogram.fsm.state import State, StatesGroup
 
 from keyboards.for_start import get_menu_kb
 from keyboards.for_categories import get_add_category_kb, get_categories_kb, get_add_more_kb, get_category_actions_kb
-from database.db_methods import (
+from database.storage import (
     get_categories, 
     add_category, 
     update_user, 
@@ -169,10 +169,17 @@ async def process_add_more_choice(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("cat_trans_"))
 async def show_category_transactions(callback: CallbackQuery, state: FSMContext):
     """Показать транзакции для выбранной категории."""
-    # Получаем индекс категории и страницу из callback_data
-    _, _, cat_idx, page = callback.data.split("_")
-    cat_idx = int(cat_idx)
-    page = int(page)
+    # Получаем индекс категории, номер страницы и курсор из callback_data:
+    # cat_trans_{idx}_{page}[_a{id последней транзакции} | _b{id первой транзакции}]
+    parts = callback.data.split("_")
+    cat_idx = int(parts[2])
+    page = int(parts[3])
+    after_id = before_id = None
+    if len(parts) > 4:
+        if parts[4][0] == "a":
+            after_id = int(parts[4][1:])
+        else:
+            before_id = int(parts[4][1:])
     
     # Получаем категорию из словаря
     category = categories_dict.get(f"category_{cat_idx}")
@@ -181,13 +188,15 @@ async def show_category_transactions(callback: CallbackQuery, state: FSMContext)
         return
     
     # Получаем транзакции для категории
-    transactions = await get_transactions_by_category(callback.from_user.id, category, page)
+    transactions = await get_transactions_by_category(
+        callback.from_user.id, category, after_id=after_id, before_id=before_id
+    )
     if not transactions:
         await callback.answer("Нет транзакций в этой категории")
         return
     
     # Формируем текст с транзакциями
-    total_count = transactions[0]["total_count"]
+    total_count = transactions.total_count
     total_pages = (total_count + 4) // 5  # Округление вверх
     
     text = f"Транзакции в категории {category}:\n\n"
@@ -209,10 +218,12 @@ async def show_category_transactions(callback: CallbackQuery, state: FSMContext)
     # Навигация по страницам
     if total_pages > 1:  # Показываем навигацию только если есть больше одной страницы
         if page > 0:
-            nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"cat_trans_{cat_idx}_{page-1}"))
+            # На первую страницу возвращаемся без курсора, чтобы увидеть и новые транзакции
+            prev_cursor = f"_b{transactions[0]['transaction_id']}" if page > 1 else ""
+            nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"cat_trans_{cat_idx}_{page-1}{prev_cursor}"))
         nav_row.append(InlineKeyboardButton(text=f"[{page + 1}/{total_pages}]", callback_data="decorate"))
         if (page + 1) < total_pages:
-            nav_row.append(InlineKeyboardButton(text="➡️", callback_data=f"cat_trans_{cat_idx}_{page+1}"))
+            nav_row.append(InlineKeyboardButton(text="➡️", callback_data=f"cat_trans_{cat_idx}_{page+1}_a{transactions[-1]['transaction_id']}"))
         
         if nav_row:
             kb.append(nav_row)
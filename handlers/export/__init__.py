@@ -0,0 +1 @@
+from .export import router
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""обработчик выгрузки всех транзакций пользователя в CSV или JSON Lines, сжатой gzip"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import IO, AsyncGenerator
+
+import yaml
+from aiogram import Router, Bot
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, InputFile
+
+from database.storage import is_registered, iter_transactions
+
+router = Router()
+
+# Путь к messages.yaml в той же папке
+MESSAGES_PATH = os.path.join(os.path.dirname(__file__), 'messages.yaml')
+
+# Загрузка сообщений
+with open(MESSAGES_PATH, 'r', encoding='utf-8') as file:
+    MESSAGES = yaml.safe_load(file)
+
+EXPORT_CHUNK_SIZE = 1000  # Транзакций в одном запросе к базе
+MAX_FILE_SIZE = 50 * 1024 * 1024  # Bot API принимает от ботов файлы до 50 МБ
+SPOOL_SIZE = 1024 * 1024  # Выгрузки больше этого размера собираются на диске, а не в памяти
+COMPRESS_LEVEL = 6  # Как у утилиты gzip: уровень 9 в разы медленнее и держит цикл событий
+FORMATS = ("csv", "jsonl")
+
+# Заголовок CSV совпадает с колонками, которые понимает /import, так что выгрузку можно загрузить обратно
+CSV_HEADER = ["Дата", "Тип", "Сумма", "Категория", "Описание"]
+TYPE_NAMES = {0: "Доход", 1: "Расход"}
+
+
+class SpooledInputFile(InputFile):
+    """Загрузка в Telegram из уже открытого файла (например, SpooledTemporaryFile) порциями по chunk_size."""
+
+    def __init__(self, file: IO[bytes], filename: str, **kwargs) -> None:
+        super().__init__(filename=filename, **kwargs)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+async def write_export(tg_id: int, fmt: str, output: IO[bytes]) -> int:
+    """
+    потоковая запись транзакций пользователя в output со сжатием gzip.
+
+    транзакции читаются из базы порциями по EXPORT_CHUNK_SIZE и сразу кодируются,
+    поэтому память не зависит от длины истории.
+
+    аргументы:
+        tg_id (int): Telegram ID пользователя.
+        fmt (str): Формат выгрузки: "csv" или "jsonl".
+        output (IO[bytes]): Файл, открытый на запись в двоичном режиме.
+
+    возвращает:
+        int: Количество выгруженных транзакций.
+    """
+    count = 0
+    with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=COMPRESS_LEVEL) as archive, \
+            io.TextIOWrapper(archive, encoding="utf-8", newline="") as text:
+        writer = csv.writer(text, delimiter=";") if fmt == "csv" else None
+        if writer:
+            writer.writerow(CSV_HEADER)
+        async for chunk in iter_transactions(tg_id, EXPORT_CHUNK_SIZE):
+            if writer:
+                writer.writerows(
+                    (t.date_time.replace("T", " "), TYPE_NAMES.get(t.type, t.type), f"{t.sum:.2f}",
+                     t.category or "", t.description or "")
+                    for t in chunk
+                )
+            else:
+                text.writelines(json.dumps(t._asdict(), ensure_ascii=False) + "\n" for t in chunk)
+            count += len(chunk)
+    return count
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Обработчик команды /export [csv|jsonl]: отправка файла со всеми транзакциями."""
+    tg_id = message.from_user.id
+    if not await is_registered(tg_id):
+        await message.answer(MESSAGES['not_registered'])
+        return
+
+    fmt = (command.args or "csv").strip().lower()
+    if fmt not in FORMATS:
+        await message.answer(MESSAGES['wrong_format'])
+        return
+
+    progress = await message.answer(MESSAGES['export_started'])
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as output:
+        count = await write_export(tg_id, fmt, output)
+        if not count:
+            await progress.edit_text(MESSAGES['export_empty'])
+            return
+        if output.tell() > MAX_FILE_SIZE:
+            await progress.edit_text(MESSAGES['export_too_big'])
+            return
+        filename = f"transactions_{datetime.now().strftime('%Y-%m-%d')}.{fmt}.gz"
+        await message.answer_document(
+            SpooledInputFile(output, filename),
+            caption=MESSAGES['export_caption'].format(count=count)
+        )
+    await progress.delete()
@@ -9,7 +9,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database.db_methods import add_limit, get_user_limits, delete_limit, get_categories
+from database.storage import add_limit, get_user_limits, delete_limit, get_categories
 from keyboards.for_limits import (
     get_period_keyboard,
     get_limit_actions_keyboard,
@@ -11,7 +11,7 @@ from aiogram.fsm.state import State, StatesGroup
 
 from keyboards.for_profile import get_profile_kb, get_settings_kb, get_confirm_reset_kb, get_back_kb
 from keyboards.for_start import get_menu_kb, get_start_kb  # Импортируем клавиатуру меню и для регистрации
-from database.db_methods import get_user, update_user, delete_user, is_registered, get_transactions_by_period
+from database.storage import get_user, update_user, delete_user, is_registered, get_transactions_by_period
 from datetime import datetime, timedelta
 
 router = Router()
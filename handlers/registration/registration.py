@@ -10,7 +10,7 @@ from aiogram.fsm.context import FSMContext
 
 from keyboards.for_start import get_start_kb
 from keyboards.for_registration import *  # импортируем клавиатуры
-from database.db_methods import get_user, add_user, update_user
+from database.storage import get_user, add_user, update_user
 from handlers.categories.categories import AddCategory
 
 # создание роутера
@@ -10,7 +10,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from keyboards.for_report import get_period_kb, get_navigation_kb
-from database.db_methods import get_transactions_by_period, get_user
+from database.storage import get_period_totals, get_balance, get_user
 from keyboards.for_start import get_menu_kb
 
 router = Router()
@@ -129,28 +129,17 @@ async def show_report(callback: types.CallbackQuery, state: FSMContext):
     period = data['period']
     today = datetime.now().date()
 
-    # Получение транзакций до конца выбранного периода
-    transactions = await get_transactions_by_period(tg_id, "2000-01-01", end_date.isoformat())
-
-    # Расчет баланса на конец периода
-    total_sum = 0
-    for t in transactions:
-        if t['type'] == 0:  # доход
-            total_sum += t['sum']
-        else:  # расход
-            total_sum -= t['sum']
-
-    # Получение транзакций только за выбранный период для отчета
-    period_transactions = [t for t in transactions if datetime.fromisoformat(t['date_time']).date() >= start_date]
+    # Расчет баланса на конец периода по остатку на конец месяца и дневным итогам
+    total_sum = await get_balance(tg_id, end_date.isoformat())
 
     # Расчет доходов и расходов за период
-    income = sum(t['sum'] for t in period_transactions if t['type'] == 0)
-    expenses = sum(t['sum'] for t in period_transactions if t['type'] == 1)
+    totals = await get_period_totals(tg_id, start_date.isoformat(), end_date.isoformat())
+    income = totals['income']
+    expenses = totals['expenses']
     expenses_by_category = {}
-    for t in period_transactions:
-        if t['type'] == 1:
-            category = t['category'] or 'Без категории'
-            expenses_by_category[category] = expenses_by_category.get(category, 0) + t['sum']
+    for category, total in totals['expenses_by_category'].items():
+        category = category or 'Без категории'
+        expenses_by_category[category] = expenses_by_category.get(category, 0) + total
 
     # Генерация человекочитаемого названия периода
     period_display = get_period_display(period, start_date, today)
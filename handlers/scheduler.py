@@ -1,10 +1,44 @@
-"""планировщик ежедневных проверок лимитов расходов и отправки уведомлений пользователям"""
+"""планировщик ежедневных проверок лимитов расходов, уведомлений пользователям и резервных копий базы"""
 
 from datetime import datetime
 import asyncio
+import logging
 import pytz
 from aiogram import Bot
-from database.db_methods import get_expiring_limits, get_violated_limits
+from aiogram.exceptions import TelegramRetryAfter
+from database.backup import latest_snapshot_age
+from database.config import DB_PATH, DB_SHARDS, DB_BACKUP_DIR, DB_BACKUP_INTERVAL_HOURS
+from database.shards import shard_paths
+from database.storage import get_expiring_limits, iter_violated_limits, archive_transactions, backup_storage
+
+logger = logging.getLogger(__name__)
+
+
+async def notify(bot: Bot, tg_id: int, text: str) -> bool:
+    """
+    отправка уведомления пользователю; ошибка отправки не прерывает рассылку остальным.
+
+    аргументы:
+        bot: экземпляр бота
+        tg_id: id пользователя в телеграм
+        text: текст уведомления
+
+    возвращает:
+        True, если сообщение отправлено
+    """
+    try:
+        try:
+            await bot.send_message(tg_id, text)
+        except TelegramRetryAfter as e:
+            # Телеграм ограничил частоту отправки: ждем, сколько он просит, и пробуем еще раз
+            await asyncio.sleep(e.retry_after)
+            await bot.send_message(tg_id, text)
+    except Exception as e:
+        # Бот заблокирован, чат удален и т.п. - пропускаем пользователя
+        logger.warning("Notification to %s failed: %s", tg_id, e)
+        return False
+    return True
+
 
 async def check_limits(bot: Bot):
     """performs daily limit checks and sends notifications for expiring and violated limits."""
@@ -23,24 +57,48 @@ async def check_limits(bot: Bot):
         # Проверка истекающих лимитов
         expiring_limits = await get_expiring_limits()
         for limit in expiring_limits:
-            await bot.send_message(
+            await notify(
+                bot,
                 limit["tg_id"],
                 f"⚠️ Напоминание: завтра истекает лимит!\n\n"
                 f"Категория: {limit['category']}\n"
                 f"Лимит: {limit['limit_sum']}₽"
             )
         
-        # Проверка нарушенных лимитов
-        violated_limits = await get_violated_limits()
-        for limit in violated_limits:
-            await bot.send_message(
+        # Проверка нарушенных лимитов: читаются порциями, соединение с базой не держится во время отправки
+        async for limit in iter_violated_limits():
+            await notify(
+                bot,
                 limit["tg_id"],
                 f"🚫 Внимание! Превышен лимит расходов!\n\n"
                 f"Категория: {limit['category']}\n"
                 f"Установленный лимит: {limit['limit_sum']}₽\n"
-                f"Текущие расходы: {limit['current_spent']}₽\n"
-                f"Превышение: {limit['current_spent'] - limit['limit_sum']}₽"
+                f"Текущие расходы: {limit['spent']}₽\n"
+                f"Превышение: {limit['spent'] - limit['limit_sum']}₽"
             )
+
+        # Перенос старых транзакций в архив (если включен DB_ARCHIVE_AFTER_DAYS)
+        try:
+            await archive_transactions()
+        except Exception:
+            logger.exception("Nightly archive_transactions failed")
         
         # Ждем 24 часа перед следующей проверкой
-        await asyncio.sleep(24 * 60 * 60) 
\ No newline at end of file
+        await asyncio.sleep(24 * 60 * 60) 
+
+
+async def run_backups():
+    """снимает резервные копии базы каждые DB_BACKUP_INTERVAL_HOURS часов (0 - копии выключены)."""
+    if DB_BACKUP_INTERVAL_HOURS <= 0:
+        return
+    interval = DB_BACKUP_INTERVAL_HOURS * 60 * 60
+    # Первая копия - когда истечет интервал с последнего снимка, а не при каждом перезапуске бота
+    age = latest_snapshot_age(DB_BACKUP_DIR, shard_paths(DB_PATH, DB_SHARDS)[0])
+    await asyncio.sleep(max(interval - age, 0) if age is not None else 0)
+    while True:
+        try:
+            await backup_storage()
+        except Exception:
+            logger.exception("Scheduled backup_storage failed")
+
+        await asyncio.sleep(interval)
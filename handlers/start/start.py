@@ -8,7 +8,7 @@ from aiogram.filters.command import Command
 from aiogram.fsm.context import FSMContext
 
 from keyboards.for_start import get_start_kb, get_menu_kb
-from database.db_methods import get_user, add_user, is_registered  # импорт из database/
+from database.storage import get_user, add_user, is_registered  # импорт из database/
 
 # создание роутера
 router = Router()
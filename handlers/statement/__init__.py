@@ -0,0 +1 @@
+from .statement import router
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""потоковый разбор выписок в CSV: общий формат и выгрузки российских банков (Т-Банк, Альфа, Сбер и др.)"""
+
+import codecs
+import csv
+import io
+import re
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# Варианты заголовков колонок (в нижнем регистре) для каждого поля.
+# Первый найденный в файле вариант и будет колонкой поля.
+COLUMN_ALIASES: Dict[str, List[str]] = {
+    "date": ["дата операции", "дата и время операции", "дата", "date", "date_time"],
+    "amount": ["сумма операции", "сумма в валюте счета", "сумма", "amount", "sum"],
+    "income": ["приход", "зачисление", "поступление", "income"],
+    "expense": ["расход", "списание", "expense"],
+    "type": ["тип операции", "тип", "type"],
+    "category": ["категория", "category"],
+    "description": ["описание", "назначение платежа", "комментарий", "description"],
+    "status": ["статус", "status"],
+}
+
+# Значения колонки "тип" для расходов и доходов
+EXPENSE_TYPES = {"расход", "списание", "покупка", "оплата", "expense", "debit", "1"}
+INCOME_TYPES = {"доход", "пополнение", "зачисление", "поступление", "income", "credit", "0"}
+
+# Статусы операций, которые не попали на счет (например, FAILED в выписке Т-Банка)
+SKIP_STATUSES = {"failed", "отклонена", "отменена"}
+
+DATE_FORMATS = ("%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d %H:%M:%S")
+
+# (date_time, type_, sum_, category, description) - формат строк для import_transactions
+StatementRow = Tuple[datetime, int, float, Optional[str], Optional[str]]
+
+
+class StatementFormatError(ValueError):
+    """Файл не похож на выписку: нет колонок с датой и суммой."""
+
+
+def _detect_encoding(sample: bytes) -> str:
+    """Банки выгружают CSV в UTF-8 (часто с BOM) или в cp1251."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # Образец мог оборваться посреди многобайтового символа
+        if e.start >= len(sample) - 3:
+            return "utf-8"
+        return "cp1251"
+
+
+def _find_columns(header: List[str]) -> Dict[str, int]:
+    """Сопоставление полей с номерами колонок по заголовку."""
+    names = [name.strip().strip('"').lower() for name in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if "date" not in columns or not ({"amount", "income", "expense"} & columns.keys()):
+        raise StatementFormatError("Не найдены колонки с датой и суммой")
+    return columns
+
+
+def _check_groups(integer: str, separator: str, value: str) -> None:
+    """Целая часть с разделителем тысяч: группы ровно по три цифры ('1.234.567')."""
+    if not re.fullmatch(rf"\d{{1,3}}(?:{re.escape(separator)}\d{{3}})+", integer):
+        raise ValueError(f"Некорректная сумма: {value}")
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """
+    сумма из выписки: '-1 234,56', '1234.56', '1,234.56', '1.234,56', '1 234,56 ₽'. пустое значение - None.
+
+    если в сумме есть и точка, и запятая, дробная часть отделена последним из них, а другой
+    разделяет тысячи. один разделитель, повторенный несколько раз, - разделитель тысяч. одиночный
+    разделитель с тремя цифрами после него ('1,234') неоднозначен: это может быть и 1234, и 1.234.
+
+    исключения:
+        ValueError: если сумму нельзя разобрать однозначно.
+    """
+    value = value.replace("\xa0", "").replace(" ", "").replace("₽", "").replace("RUB", "").strip()
+    if not value:
+        return None
+    digits = value.lstrip("+-")
+    sign = -1 if value.startswith("-") else 1
+    if not re.fullmatch(r"[\d.,]*\d[\d.,]*", digits):
+        raise ValueError(f"Некорректная сумма: {value}")
+
+    separators = [char for char in digits if char in ".,"]
+    if not separators:
+        return sign * float(digits)
+    decimal = separators[-1]
+    if len(set(separators)) == 2:
+        if separators.count(decimal) > 1:
+            raise ValueError(f"Некорректная сумма: {value}")
+        integer, fraction = digits.split(decimal)
+        thousands = "," if decimal == "." else "."
+        _check_groups(integer, thousands, value)
+        integer = integer.replace(thousands, "")
+    elif len(separators) > 1:
+        _check_groups(digits, decimal, value)
+        integer, fraction = digits.replace(decimal, ""), "0"
+    else:
+        integer, fraction = digits.split(decimal)
+        if len(fraction) == 3:
+            raise ValueError(f"Неоднозначная сумма: {value}")
+    return sign * float(f"{integer or 0}.{fraction or 0}")
+
+
+def parse_date(value: str) -> datetime:
+    """Дата операции в одном из форматов DATE_FORMATS или ISO."""
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return datetime.fromisoformat(value)
+
+
+def _cell(row: List[str], columns: Dict[str, int], field: str) -> str:
+    index = columns.get(field)
+    if index is None or index >= len(row):
+        return ""
+    return row[index].strip()
+
+
+def _parse_row(row: List[str], columns: Dict[str, int]) -> Optional[StatementRow]:
+    """Разбор одной строки; None - строку нужно пропустить (отклоненная операция, нулевая сумма)."""
+    if _cell(row, columns, "status").lower() in SKIP_STATUSES:
+        return None
+
+    date_time = parse_date(_cell(row, columns, "date"))
+    if "amount" in columns:
+        amount = parse_amount(_cell(row, columns, "amount"))
+    else:
+        # Отдельные колонки прихода и расхода
+        income = parse_amount(_cell(row, columns, "income")) or 0.0
+        expense = parse_amount(_cell(row, columns, "expense")) or 0.0
+        amount = income - abs(expense)
+    if not amount:
+        return None
+
+    # Тип берется из колонки "тип", если она понятна, иначе по знаку суммы
+    type_text = _cell(row, columns, "type").lower()
+    if type_text in EXPENSE_TYPES:
+        type_ = 1
+    elif type_text in INCOME_TYPES:
+        type_ = 0
+    else:
+        type_ = 1 if amount < 0 else 0
+
+    category = _cell(row, columns, "category") or None
+    description = _cell(row, columns, "description") or None
+    return date_time, type_, abs(amount), category, description
+
+
+def iter_statement(file: BinaryIO, stats: Dict[str, int]) -> Iterator[StatementRow]:
+    """
+    потоковый разбор выписки: строки читаются и отдаются по одной, файл целиком в память не грузится.
+
+    кодировка и разделитель (';', ',' или табуляция) определяются по началу файла.
+
+    аргументы:
+        file (BinaryIO): Файл выписки, открытый в двоичном режиме.
+        stats (Dict[str, int]): Счетчики, дополняемые по ходу разбора: skipped - пропущенные строки,
+            errors - строки, которые не удалось разобрать.
+
+    исключения:
+        StatementFormatError: если в заголовке нет колонок с датой и суммой.
+    """
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    encoding = _detect_encoding(sample)
+    text_sample = sample.decode(encoding, errors="ignore")
+    try:
+        dialect = csv.Sniffer().sniff(text_sample.split("\n", 1)[0], delimiters=";,\t")
+        delimiter = dialect.delimiter
+    except csv.Error:
+        delimiter = ";"
+
+    reader = csv.reader(io.TextIOWrapper(file, encoding=encoding, errors="replace", newline=""),
+                        delimiter=delimiter)
+    header = next(reader, None)
+    if not header:
+        raise StatementFormatError("Файл пуст")
+    columns = _find_columns(header)
+
+    stats.setdefault("skipped", 0)
+    stats.setdefault("errors", 0)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            parsed = _parse_row(row, columns)
+        except ValueError:
+            stats["errors"] += 1
+            continue
+        if parsed is None:
+            stats["skipped"] += 1
+            continue
+        yield parsed
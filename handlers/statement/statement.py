@@ -0,0 +1,125 @@
+"""обработчик импорта транзакций из выписки банка, присланной файлом CSV"""
+
+import hashlib
+import itertools
+import logging
+import os
+import tempfile
+import time
+from typing import BinaryIO
+
+import yaml
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message
+
+from database.storage import is_registered, import_transactions, get_statement_import, finish_statement_import
+from handlers.statement.parser import iter_statement, StatementFormatError
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Путь к messages.yaml в той же папке
+MESSAGES_PATH = os.path.join(os.path.dirname(__file__), 'messages.yaml')
+
+# Загрузка сообщений
+with open(MESSAGES_PATH, 'r', encoding='utf-8') as file:
+    MESSAGES = yaml.safe_load(file)
+
+IMPORT_BATCH_SIZE = 2000  # Строк в одной транзакции sqlite; между пачками успевают записи других пользователей
+PROGRESS_INTERVAL = 2.0  # Не чаще, чем раз в столько секунд, обновляем сообщение о ходе импорта
+MAX_FILE_SIZE = 20 * 1024 * 1024  # Bot API отдает ботам файлы до 20 МБ
+SPOOL_SIZE = 1024 * 1024  # Файлы больше этого размера скачиваются на диск, а не в память
+STATEMENT_EXTENSIONS = (".csv", ".txt")
+
+
+def file_hash(file: BinaryIO) -> str:
+    """sha256 содержимого файла; файл читается порциями и перематывается в начало."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(SPOOL_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class ImportState(StatesGroup):
+    """Состояние FSM: ждем файл выписки после /import"""
+    WAITING_FOR_FILE = State()
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    """Обработчик команды /import: описание формата выписки и ожидание файла."""
+    if not await is_registered(message.from_user.id):
+        await message.answer(MESSAGES['not_registered'])
+        return
+    await state.set_state(ImportState.WAITING_FOR_FILE)
+    await message.answer(MESSAGES['import_help'])
+
+
+@router.message(ImportState.WAITING_FOR_FILE, F.document.file_name.lower().endswith(STATEMENT_EXTENSIONS))
+async def process_statement(message: Message, state: FSMContext):
+    """Импорт выписки из присланного после /import документа пачками с сообщением о ходе загрузки."""
+    tg_id = message.from_user.id
+    # Один файл на одну команду /import
+    await state.clear()
+
+    document = message.document
+    if document.file_size and document.file_size > MAX_FILE_SIZE:
+        await message.answer(MESSAGES['file_too_big'])
+        return
+
+    progress = await message.answer(MESSAGES['import_started'])
+    stats = {"imported": 0, "uncategorized": 0}
+    last_update = time.monotonic()
+    saved = 0
+
+    async def flush(batch):
+        nonlocal last_update
+        # Счетчик строк выписки фиксируется вместе с пачкой (см. statement_imports в migrations.py)
+        result = await import_transactions(tg_id, batch, statement)
+        stats["imported"] += result["imported"]
+        stats["uncategorized"] += result["uncategorized"]
+        if time.monotonic() - last_update >= PROGRESS_INTERVAL:
+            await progress.edit_text(MESSAGES['import_progress'].format(imported=saved + stats["imported"]))
+            last_update = time.monotonic()
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as file:
+        await message.bot.download(document, destination=file)
+        statement = file_hash(file)
+        previous = await get_statement_import(tg_id, statement)
+        if previous and previous["done"]:
+            await progress.edit_text(MESSAGES['already_imported'])
+            return
+        if previous and previous["imported"]:
+            # Прошлая попытка прервалась: разбор того же файла дает те же строки, уже загруженные пропускаем
+            saved = previous["imported"]
+            await progress.edit_text(MESSAGES['import_resumed'].format(imported=saved))
+
+        batch = []
+        try:
+            for row in itertools.islice(iter_statement(file, stats), saved, None):
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await flush(batch)
+                    batch = []
+            if batch:
+                await flush(batch)
+        except StatementFormatError as e:
+            await progress.edit_text(MESSAGES['wrong_format'].format(error=e))
+            return
+        except Exception:
+            logger.exception("Statement import failed for user %s", tg_id)
+            await progress.edit_text(MESSAGES['import_failed'].format(imported=saved + stats["imported"]))
+            return
+
+    await finish_statement_import(tg_id, statement)
+    await progress.edit_text(MESSAGES['import_done'].format(**stats))
+
+@router.message(ImportState.WAITING_FOR_FILE, F.document)
+async def process_wrong_file(message: Message):
+    """Документ другого формата после /import: ждем файл CSV дальше."""
+    await message.answer(MESSAGES['wrong_file'])
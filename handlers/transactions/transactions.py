@@ -8,7 +8,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from keyboards.for_transactions import get_categories_kb, get_confirm_kb
-from database.db_methods import (
+from database.storage import (
     get_categories,
     add_transaction,
     check_limit_violation
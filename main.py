@@ -3,15 +3,19 @@
 from aiogram.client.default import DefaultBotProperties
 from aiogram import Bot, Dispatcher
 
-from handlers import start, registration, categories, profile, transactions, report, analysys, limits, forecast
-from handlers.scheduler import check_limits
+from handlers import start, registration, categories, profile, transactions, report, analysys, limits, forecast, statement, export
+from handlers.scheduler import check_limits, run_backups
+from database.storage import open_storage, close_storage
 import asyncio
+import logging
 from dotenv import load_dotenv
 import os
 
 # загрузка переменных из .env
 load_dotenv()
 
+logging.basicConfig(level=logging.INFO)
+
 # получение токена из переменной окружения
 BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
@@ -38,14 +42,24 @@ dp.include_routers(
     analysys.router,
     limits.router,
     forecast.router,
+    statement.router,
+    export.router,
 )
 
 
 async def main():
-    # Запуск планировщика проверки лимитов в отдельной задаче
-    asyncio.create_task(check_limits(bot))
-    # запуск бота
-    await dp.start_polling(bot)
+    # Открытие хранилища (пулы соединений и миграции схемы для sqlite) до приема первых апдейтов
+    await open_storage()
+    try:
+        # Запуск планировщика проверки лимитов в отдельной задаче
+        asyncio.create_task(check_limits(bot))
+        # Резервные копии базы по расписанию (DB_BACKUP_INTERVAL_HOURS)
+        asyncio.create_task(run_backups())
+        # запуск бота
+        await dp.start_polling(bot)
+    finally:
+        # Сначала фиксируются записи, ожидающие в очереди групповой фиксации, затем закрываются соединения
+        await close_storage()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+"""проверка планов всех запросов хранилища (database/plan_guard.py) и распознавание полного сканирования"""
+
+import os
+import subprocess
+import sys
+
+from database.query_stats import full_scans
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_full_scans_resolves_aliases():
+    sql = "SELECT * FROM transactions t LEFT JOIN categories c ON c.category_id = t.category_id"
+    assert full_scans(sql, ["SCAN t", "SEARCH c USING INTEGER PRIMARY KEY (rowid=?)"]) == ["SCAN t"]
+    assert full_scans("SELECT * FROM archive.transactions AS a", ["SCAN a USING INDEX idx_archive_tg_id"])
+    assert full_scans("SELECT * FROM limits WHERE spent > 0", ["SCAN limits"]) == ["SCAN limits"]
+
+
+def test_full_scans_ignores_other_tables_and_subqueries():
+    sql = "SELECT * FROM (SELECT * FROM transactions t WHERE t.tg_id = ?) JOIN categories c"
+    plan = ["CO-ROUTINE (subquery-1)", "SEARCH t USING INDEX idx_transactions_tg_id (tg_id=?)",
+            "SCAN (subquery-1)", "SCAN c", "SCAN CONSTANT ROW"]
+    assert full_scans(sql, plan) == []
+
+
+def test_storage_queries_do_not_scan_transactions_or_limits():
+    # Отдельный процесс: хранилище читает DB_PATH и другие настройки при импорте
+    result = subprocess.run(
+        [sys.executable, "-m", "database.plan_guard", "--users", "3", "--transactions", "200"],
+        cwd=ROOT, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,18 @@
+"""планы горячих запросов лимитов и транзакций: поиск по ожидаемым индексам, без полного сканирования"""
+
+import asyncio
+
+import pytest
+
+from database.check_query_plans import CHECKS, collect_plans, plan_ok
+
+
+@pytest.fixture(scope="module")
+def plans():
+    # Пустая база в памяти по текущей схеме из migrations.py, как в python -m database.check_query_plans
+    return asyncio.run(collect_plans())
+
+
+@pytest.mark.parametrize("name, expected", [(name, expected) for name, _query, _params, expected in CHECKS])
+def test_query_plan(plans, name, expected):
+    assert plan_ok(name, plans[name], expected), f"{'; '.join(plans[name])} (ожидалось: {expected})"
@@ -0,0 +1,27 @@
+"""разбор сумм из банковских выписок"""
+
+import pytest
+
+from handlers.statement.parser import parse_amount
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("-1 234,56", -1234.56),
+    ("1 234,56 ₽", 1234.56),
+    ("1234.56", 1234.56),
+    ("1,234.56", 1234.56),
+    ("1.234,56", 1234.56),
+    ("1.234.567,89", 1234567.89),
+    ("1,234,567", 1234567.0),
+    ("+500", 500.0),
+    ("0,5", 0.5),
+    ("", None),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1,234", "1.234", "1 234,567", "1,23,4.5", "1,234.567,8", "1.2.3", "abc"])
+def test_parse_amount_rejects_ambiguous(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)